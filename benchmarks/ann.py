@@ -0,0 +1,124 @@
+"""
+Recall and speed of the local vector store's IVF index against its exact
+search.
+
+Inserts synthetic clustered embeddings (or a `.npy` matrix of real ones)
+into a LocalVectorStore with an IVF index, in batches, so the index is
+trained part way and the remaining rows are added incrementally. Then runs
+held-out queries one at a time through the exact search and through the
+index at each `nprobe`, and reports recall@k, queries per second and the
+median and 99th percentile latency.
+
+Usage:
+    python -m benchmarks.ann --documents 200000 --dimension 384 --pq-m 48
+    python -m benchmarks.ann --vectors embeddings.npy --nprobe 8 16 32 64
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from ragnarok.embedders import EmbeddingBatch
+from ragnarok.vectorstores.local_store import LocalVectorStore
+
+from .quantization import synthetic_vectors
+
+
+def run_queries(store: LocalVectorStore, queries: np.ndarray, k: int, search_params: dict) -> Dict:
+    found: List[List[int]] = []
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        hits = store.search(query, k=k, search_params=search_params)
+        latencies.append(time.perf_counter() - started)
+        found.append([hit.id for hit in hits])
+    latencies = np.array(latencies)
+    return {
+        "found": found,
+        "qps": len(queries) / latencies.sum(),
+        "p50_ms": 1000 * float(np.percentile(latencies, 50)),
+        "p99_ms": 1000 * float(np.percentile(latencies, 99)),
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", help="A .npy matrix of embeddings to use instead of the synthetic corpus")
+    parser.add_argument("--documents", type=int, default=200_000, help="Synthetic vectors")
+    parser.add_argument("--dimension", type=int, default=384, help="Synthetic vector dimension")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=10_000, help="Rows per insert")
+    parser.add_argument("--nlist", type=int, help="IVF lists, 4 * sqrt(rows) by default")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16, 32, 64])
+    parser.add_argument("--pq-m", type=int, help="Product quantization bytes per vector")
+    parser.add_argument("--rerank", type=int, default=10)
+    parser.add_argument("--train-fraction", type=float, default=0.5, help="Fraction of rows inserted before training")
+    parser.add_argument("--path", help="Store directory, a temporary one by default")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results to a JSON file")
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    if args.vectors:
+        vectors = np.load(args.vectors).astype(np.float32)
+    else:
+        vectors = synthetic_vectors(args.documents, args.dimension, rng)
+    order = rng.permutation(len(vectors))
+    queries, vectors = vectors[order[:args.queries]], vectors[order[args.queries:]]
+
+    index_config = {
+        "nlist": args.nlist,
+        "pq_m": args.pq_m,
+        "rerank": args.rerank,
+        "min_train_rows": max(1, int(len(vectors) * args.train_fraction)),
+    }
+    store = LocalVectorStore({
+        "path": args.path or tempfile.mkdtemp(prefix="ragnarok-ann-"),
+        "sync": False,
+        "index": index_config,
+    })
+    started = time.perf_counter()
+    for start in range(0, len(vectors), args.batch_size):
+        part = vectors[start:start + args.batch_size]
+        store.insert(EmbeddingBatch(part, [""] * len(part)))
+    insert_seconds = time.perf_counter() - started
+    print(f"Inserted and indexed {len(vectors)} vectors in {insert_seconds:.1f}s {store.stats()['index']}", file=sys.stderr)
+
+    exact = run_queries(store, queries, args.k, {"exact": True})
+    results = [{
+        "search": "exact",
+        "recall": 1.0,
+        "qps": exact["qps"],
+        "p50_ms": exact["p50_ms"],
+        "p99_ms": exact["p99_ms"],
+    }]
+    for nprobe in args.nprobe:
+        approximate = run_queries(store, queries, args.k, {"nprobe": nprobe})
+        recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(approximate["found"], exact["found"])])
+        results.append({
+            "search": f"ivf nprobe={nprobe}",
+            "recall": float(recall),
+            "qps": approximate["qps"],
+            "p50_ms": approximate["p50_ms"],
+            "p99_ms": approximate["p99_ms"],
+        })
+    store.close()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"parameters": vars(args), "insert_seconds": insert_seconds, "results": results}, f, indent=2)
+        print(f"Results written to {args.output}", file=sys.stderr)
+    for result in results:
+        print(
+            f"{result['search']:<18} recall@{args.k} {result['recall']:.3f} "
+            f"{result['qps']:>8.1f} qps  p50 {result['p50_ms']:.2f} ms  p99 {result['p99_ms']:.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import os
+import random
+from typing import List
+
+# A fixed vocabulary keeps generated documents reproducible across runs.
+WORDS = (
+    "vector index embedding query document chunk retrieval latency throughput "
+    "batch cache shard replica cluster segment token model search ranking "
+    "recall precision memory disk network request response pipeline stage "
+    "worker queue insert delete update schema collection metadata filter"
+).split()
+
+
+def make_paragraphs(rng: random.Random, count: int, sentences: int = 6) -> List[str]:
+    paragraphs = []
+    for _ in range(count):
+        paragraph = []
+        for _ in range(sentences):
+            words = [rng.choice(WORDS) for _ in range(rng.randint(8, 18))]
+            paragraph.append(" ".join(words).capitalize() + ".")
+        paragraphs.append(" ".join(paragraph))
+    return paragraphs
+
+
+def make_pdfs(directory: str, count: int, pages: int, seed: int = 0) -> List[str]:
+    """
+    Write `count` synthetic PDFs of `pages` pages each and return their paths.
+    """
+    import pymupdf
+
+    rng = random.Random(seed)
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"document_{i:04d}.pdf")
+        with pymupdf.open() as doc:
+            for _ in range(pages):
+                page = doc.new_page()
+                text = "\n\n".join(make_paragraphs(rng, 4))
+                page.insert_textbox(page.rect + (50, 50, -50, -50), text, fontsize=10)
+            doc.save(path)
+        paths.append(path)
+    return paths
+
+
+def make_site(directory: str, pages: int, links: int = 5, seed: int = 0) -> str:
+    """
+    Write a static site of `pages` interlinked HTML pages under `directory`
+    and return the path of its entry page, relative to `directory`.
+    """
+    rng = random.Random(seed)
+    os.makedirs(os.path.join(directory, "docs"), exist_ok=True)
+    for i in range(pages):
+        targets = sorted(rng.sample(range(pages), min(links, pages)))
+        nav = "".join(f'<li><a href="/docs/page_{t:04d}.html">Page {t}</a></li>' for t in targets)
+        body = "".join(f"<p>{paragraph}</p>" for paragraph in make_paragraphs(rng, 6))
+        html = (
+            f"<html><head><title>Page {i}</title>"
+            f'<meta name="description" content="Synthetic page {i}"></head>'
+            f"<body><nav><ul>{nav}</ul></nav><h1>Page {i}</h1>{body}</body></html>"
+        )
+        with open(os.path.join(directory, "docs", f"page_{i:04d}.html"), "w") as f:
+            f.write(html)
+
+    nav = "".join(f'<li><a href="/docs/page_{i:04d}.html">Page {i}</a></li>' for i in range(pages))
+    with open(os.path.join(directory, "docs", "index.html"), "w") as f:
+        f.write(f"<html><head><title>Index</title></head><body><h1>Index</h1><ul>{nav}</ul></body></html>")
+    return "docs/"
@@ -0,0 +1,136 @@
+import hashlib
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from ragnarok.embedders import BaseEmbedder
+from ragnarok.vectorstores.base import BaseVectorStore, VectorStoreOutput
+
+
+class FakeEmbedder(BaseEmbedder):
+    """
+    Deterministic offline embedder. Every text maps to the same pseudo-random
+    vector on every run, and each request sleeps to simulate network latency.
+
+    Config keys:
+        dimension (int): Vector size. Defaults to 256.
+        latency (float): Seconds per request. Defaults to 0.
+        latency_per_item (float): Additional seconds per embedded text. Defaults to 0.
+    """
+
+    def __init__(self, config: dict):
+        super().__init__(config)
+        self.dimension = self.config.get("dimension", 256)
+        self.latency = self.config.get("latency", 0.0)
+        self.latency_per_item = self.config.get("latency_per_item", 0.0)
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def vector(self, text: str) -> np.ndarray:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        rng = np.random.default_rng(seed)
+        return rng.uniform(-1, 1, self.dimension).astype(np.float32)
+
+    def embed(self, text: str) -> List[float]:
+        return self.embed_matrix([text])[0].tolist()
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_matrix(texts).tolist()
+
+    def embed_matrix(self, texts: List[str]) -> np.ndarray:
+        matrix = np.empty((len(texts), self.dimension), dtype=np.float32)
+        start = 0
+        for batch in self.iter_batches(texts):
+            with self._lock:
+                self.requests += 1
+            time.sleep(self.latency + self.latency_per_item * len(batch))
+            for text in batch:
+                matrix[start] = self.vector(text)
+                start += 1
+        return matrix
+
+    @classmethod
+    def from_config(cls, config: dict) -> "FakeEmbedder":
+        return cls(config)
+
+
+class InMemoryVectorStore(BaseVectorStore):
+    """
+    Local stand-in for a vector store. Rows are kept in a dict and each
+    insert call sleeps to simulate a round trip.
+
+    Config keys:
+        latency (float): Seconds per insert call. Defaults to 0.
+    """
+
+    def __init__(self, config: dict):
+        self.config = config or {}
+        self.latency = self.config.get("latency", 0.0)
+        self.rows = {}
+        self._lock = threading.Lock()
+
+    def insert(self, embeddings) -> List[VectorStoreOutput]:
+        time.sleep(self.latency)
+        results = []
+        with self._lock:
+            for embedding in embeddings:
+                id = str(uuid.uuid4())
+                self.rows[id] = embedding
+                results.append(
+                    VectorStoreOutput(
+                        text=embedding.text,
+                        metadata=embedding.metadata,
+                        vector=embedding.vector,
+                        id=id,
+                        status="success",
+                    )
+                )
+        return results
+
+    def search(
+        self, query_vector: List[float], k: int = 5, filter: Optional[Dict[str, Any]] = None, *args, **kwargs
+    ) -> List[VectorStoreOutput]:
+        """
+        Exact cosine search over all rows, or the rows matching a dict filter.
+        """
+        with self._lock:
+            rows = [(id, row) for id, row in self.rows.items() if self._matches(row, filter)]
+        if not rows:
+            return []
+        matrix = np.stack([np.asarray(row.vector, dtype=np.float32) for _, row in rows])
+        query = np.asarray(query_vector, dtype=np.float32)
+        scores = matrix @ query / np.maximum(np.linalg.norm(matrix, axis=1) * np.linalg.norm(query), 1e-12)
+        best = np.argsort(-scores, kind="stable")[:k]
+        return [
+            VectorStoreOutput(
+                text=rows[i][1].text,
+                metadata=rows[i][1].metadata,
+                vector=rows[i][1].vector,
+                id=rows[i][0],
+                status="success",
+                score=float(scores[i]),
+            )
+            for i in best
+        ]
+
+    def delete(self, ids: List[str], filter: Optional[Dict[str, Any]] = None) -> None:
+        with self._lock:
+            if filter:
+                ids = [id for id, row in self.rows.items() if self._matches(row, filter)]
+            for id in ids:
+                self.rows.pop(id, None)
+
+    @staticmethod
+    def _matches(row, filter: Optional[Dict[str, Any]]) -> bool:
+        # Dict filters only, with a value or a list of values per key.
+        return not filter or all(
+            (row.metadata or {}).get(key) in (value if isinstance(value, list) else [value])
+            for key, value in filter.items()
+        )
+
+    @classmethod
+    def from_config(cls, config: dict) -> "InMemoryVectorStore":
+        return cls(config)
@@ -0,0 +1,126 @@
+"""
+Recall, size and search time of reduced-dimension and quantized embeddings.
+
+Generates synthetic dense embeddings (or loads a `.npy` matrix of real
+ones), then compares exact top-k search over every EmbeddingQuantizer
+setting with exact search over the full float32 vectors: recall@k, bytes
+per vector and brute-force search time per query.
+
+The synthetic vectors are clustered points of a low-rank subspace, like
+real embeddings, but recall on real vectors is what counts; truncation in
+particular only preserves quality for Matryoshka-trained models such as
+OpenAI's text-embedding-3. Pass their vectors with `--vectors`.
+
+Usage:
+    python -m benchmarks.quantization --documents 20000 --queries 200
+    python -m benchmarks.quantization --vectors embeddings.npy --dimensions 1536 512 256
+"""
+import argparse
+import json
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from ragnarok.embedders.quantization import EmbeddingQuantizer
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def synthetic_vectors(
+    count: int, dimension: int, rng: np.random.Generator, rank: int = 64, clusters: int = 200
+) -> np.ndarray:
+    """
+    Unit vectors around random cluster centers in a `rank`-dimensional
+    subspace, plus a little full-rank noise.
+    """
+    centers = rng.normal(size=(clusters, rank))
+    latent = centers[rng.integers(clusters, size=count)] + 0.5 * rng.normal(size=(count, rank))
+    vectors = latent @ rng.normal(size=(rank, dimension)) + 0.5 * rng.normal(size=(count, dimension))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+
+def scores(quantized: np.ndarray, queries: np.ndarray, kind: str) -> np.ndarray:
+    """
+    Similarity of every query to every stored vector, higher is closer.
+    """
+    if kind == "binary":
+        # Negated Hamming distance.
+        popcount = getattr(np, "bitwise_count", None) or (lambda bits: _POPCOUNT[bits])
+        return -np.stack(
+            [popcount(np.bitwise_xor(quantized, query)).sum(axis=1, dtype=np.int32) for query in queries]
+        )
+    return queries.astype(np.float32) @ quantized.astype(np.float32).T
+
+
+def top_k(similarities: np.ndarray, k: int) -> np.ndarray:
+    return np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+
+
+def measure(vectors: np.ndarray, queries: np.ndarray, truth: np.ndarray, config: dict, k: int) -> Dict:
+    quantizer = EmbeddingQuantizer(config)
+    quantized = quantizer.quantize(vectors)
+    quantized_queries = quantizer.quantize(queries)
+    started = time.perf_counter()
+    found = top_k(scores(quantized, quantized_queries, quantizer.type), k)
+    elapsed = time.perf_counter() - started
+    recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(found, truth)])
+    return {
+        "config": config,
+        "bytes_per_vector": quantized.nbytes // len(quantized),
+        "recall": float(recall),
+        "ms_per_query": 1000 * elapsed / len(queries),
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", help="A .npy matrix of embeddings to use instead of the synthetic corpus")
+    parser.add_argument("--documents", type=int, default=50_000, help="Synthetic vectors")
+    parser.add_argument("--dimension", type=int, default=768, help="Synthetic vector dimension")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dimensions", type=int, nargs="*", default=[], help="Truncated sizes to measure")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results to a JSON file")
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    if args.vectors:
+        vectors = np.load(args.vectors).astype(np.float32)
+    else:
+        vectors = synthetic_vectors(args.documents, args.dimension, rng)
+    # Queries are held-out vectors, searched against the rest.
+    order = rng.permutation(len(vectors))
+    queries, vectors = vectors[order[:args.queries]], vectors[order[args.queries:]]
+
+    exact = EmbeddingQuantizer()
+    truth = top_k(scores(exact.quantize(vectors), exact.quantize(queries), "float"), args.k)
+
+    configs: List[dict] = [{"type": "float"}, {"type": "int8"}, {"type": "binary"}]
+    for dimensions in args.dimensions:
+        configs += [
+            {"type": "float", "dimensions": dimensions},
+            {"type": "int8", "dimensions": dimensions},
+            {"type": "binary", "dimensions": dimensions},
+        ]
+    results = [measure(vectors, queries, truth, config, args.k) for config in configs]
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"parameters": vars(args), "results": results}, f, indent=2)
+        print(f"Results written to {args.output}", file=sys.stderr)
+    for result in results:
+        config = result["config"]
+        print(
+            f"{config['type']:<7} {str(config.get('dimensions', vectors.shape[1])):>5} dims "
+            f"{result['bytes_per_vector']:>6} bytes "
+            f"recall@{args.k} {result['recall']:.3f} "
+            f"{result['ms_per_query']:.2f} ms/query"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark of the OpenAI embedder's request scheduler against a local
+stand-in server that enforces requests and tokens per minute quotas.
+
+Reports the throughput reached as a fraction of the quota, and how many
+requests were rejected with 429 on the way. No network access or API key is
+needed.
+
+Usage:
+    python -m benchmarks.rate_limit --requests-per-minute 600 --tokens-per-minute 200000
+    python -m benchmarks.rate_limit --no-client-quota  # rely on 429s and Retry-After only
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from ragnarok.embedders.openai_embedder import OpenAIEmbedder
+
+from .server import serve_embeddings
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=20_000)
+    parser.add_argument("--words", type=int, default=60, help="Words per text")
+    parser.add_argument("--batch-size", type=int, default=16, help="Texts per request")
+    parser.add_argument("--requests-per-minute", type=float, default=1200)
+    parser.add_argument("--tokens-per-minute", type=float, default=1_000_000)
+    parser.add_argument("--latency", type=float, default=0.2, help="Server seconds per request")
+    parser.add_argument("--capacity", type=int, default=32, help="Concurrent requests served at full speed")
+    parser.add_argument("--concurrency", type=int, default=4, help="Initial client concurrency")
+    parser.add_argument("--max-concurrency", type=int, default=64)
+    parser.add_argument("--no-client-quota", action="store_true", help="Do not tell the client the quotas")
+    parser.add_argument("--use-async", action="store_true", help="Use aembed_matrix instead of embed_matrix")
+    parser.add_argument("--output", help="Write the results to a JSON file")
+    args = parser.parse_args(argv)
+
+    texts = [" ".join(f"word{i}-{j}" for j in range(args.words)) for i in range(args.texts)]
+    with serve_embeddings(
+        requests_per_minute=args.requests_per_minute,
+        tokens_per_minute=args.tokens_per_minute,
+        latency=args.latency,
+        capacity=args.capacity,
+    ) as (base_url, server_stats):
+        config = {
+            "api_key": "test",
+            "model": "text-embedding-3-small",
+            "base_url": base_url,
+            "batch_size": args.batch_size,
+            "concurrency": args.concurrency,
+            "max_concurrency": args.max_concurrency,
+        }
+        if not args.no_client_quota:
+            config["requests_per_minute"] = args.requests_per_minute
+            config["tokens_per_minute"] = args.tokens_per_minute
+        embedder = OpenAIEmbedder(config)
+
+        started = time.perf_counter()
+        if args.use_async:
+            matrix = asyncio.run(embedder.aembed_matrix(texts))
+        else:
+            matrix = embedder.embed_matrix(texts)
+        elapsed = time.perf_counter() - started
+        embedder.close()
+
+    minutes = elapsed / 60
+    results = {
+        "texts": len(matrix),
+        "elapsed": elapsed,
+        "requests_per_minute": server_stats["succeeded"] / minutes,
+        "tokens_per_minute": server_stats["tokens"] / minutes,
+        "request_quota_used": server_stats["succeeded"] / minutes / args.requests_per_minute,
+        "token_quota_used": server_stats["tokens"] / minutes / args.tokens_per_minute,
+        "server": dict(server_stats),
+        "client": embedder.stats(),
+        "parameters": vars(args),
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}", file=sys.stderr)
+
+    print(
+        f"{results['texts']} texts in {elapsed:.1f}s: "
+        f"{results['requests_per_minute']:.0f} requests/min ({results['request_quota_used']:.0%} of quota), "
+        f"{results['tokens_per_minute']:.0f} tokens/min ({results['token_quota_used']:.0%} of quota), "
+        f"{server_stats['throttled']} requests throttled, "
+        f"final concurrency {results['client']['concurrency']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Offline benchmark of the RAGnarok ingestion pipeline.
+
+Generates a synthetic corpus, ingests it with a deterministic fake embedder
+and an in-memory vector store, and writes throughput, per-stage latency
+percentiles and peak RSS to a JSON file. No network access is needed; the
+crawl scenario serves a synthetic site from a local HTTP server and needs a
+Playwright browser to be installed.
+
+Usage:
+    python -m benchmarks.run --scenarios process stream many --output bench.json
+    python -m benchmarks.run --compare baseline.json --output bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import psutil
+
+from ragnarok import RAGnarok
+from ragnarok.config import ChunkerConfig, CrawlerConfig, PipelineConfig, RAGnarokConfig
+
+from .corpus import make_pdfs, make_site
+from .fakes import FakeEmbedder, InMemoryVectorStore
+from .server import serve_directory
+
+SCENARIOS = ["process", "stream", "many", "crawl"]
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    values = sorted(values)
+
+    def rank(p: float) -> float:
+        return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+    return {
+        "p50": rank(50),
+        "p90": rank(90),
+        "p99": rank(99),
+        "max": values[-1],
+        "mean": sum(values) / len(values),
+    }
+
+
+class StageRecorder:
+    """
+    Metrics hook that keeps the latency of every stage call and the highest
+    RSS observed after a call of each stage.
+    """
+
+    def __init__(self):
+        self.process = psutil.Process()
+        self.latencies: Dict[str, List[float]] = {}
+        self.peak_rss: Dict[str, int] = {}
+
+    def __call__(self, event) -> None:
+        self.latencies.setdefault(event.stage, []).append(event.wall_time)
+        rss = self.process.memory_info().rss
+        self.peak_rss[event.stage] = max(self.peak_rss.get(event.stage, 0), rss)
+
+
+def build(args: argparse.Namespace) -> RAGnarok:
+    config = RAGnarokConfig(
+        log_level="WARNING",
+        chunker=ChunkerConfig(
+            chunker_type="fixed_size",
+            config={"chunk_size": args.chunk_size, "overlap": args.overlap},
+        ),
+        crawler=CrawlerConfig(config={"proxies": [], "browser": args.browser}),
+        pipeline=PipelineConfig(
+            extract_workers=args.workers,
+            embed_workers=args.embed_workers,
+            queue_size=args.queue_size,
+        ),
+    )
+    embedder = FakeEmbedder(
+        {
+            "dimension": args.dimension,
+            "latency": args.embed_latency,
+            "batch_size": args.embed_batch_size,
+        }
+    )
+    vectorstore = InMemoryVectorStore({"latency": args.insert_latency})
+    return RAGnarok(config, embedder=embedder, vectorstore=vectorstore)
+
+
+def run_scenario(name: str, args: argparse.Namespace, pdfs: List[str], site_url: str) -> Dict[str, Any]:
+    rag = build(args)
+    recorder = StageRecorder()
+    rag.metrics.add_hook(recorder)
+
+    started = time.perf_counter()
+    if name == "process":
+        for path in pdfs:
+            rag.process(path)
+        pages = len(pdfs) * args.pages
+    elif name == "stream":
+        for _ in rag.process_stream(pdfs):
+            pass
+        pages = len(pdfs) * args.pages
+    elif name == "many":
+        rag.process_many(pdfs, workers=args.workers)
+        pages = len(pdfs) * args.pages
+    elif name == "crawl":
+        extracted = rag.extract(site_url, depth=1)
+        for item in extracted:
+            rag.insert(rag.embed(rag.chunk(item.text, item.metadata)))
+        pages = len(extracted)
+    else:
+        raise ValueError(f"Unknown scenario: {name}")
+    elapsed = time.perf_counter() - started
+
+    snapshot = rag.metrics.snapshot()["stages"]
+    chunks = snapshot.get("chunk", {}).get("items", 0)
+    vectors = len(rag.vectorstore.rows)
+    stages = {}
+    for stage, totals in snapshot.items():
+        wall_time = totals["wall_time"]
+        stages[stage] = {
+            "calls": totals["calls"],
+            "items": totals["items"],
+            "bytes": totals["bytes"],
+            "tokens": totals["tokens"],
+            "errors": totals["errors"],
+            "wall_time": wall_time,
+            "items_per_second": totals["items"] / wall_time if wall_time else None,
+            "max_queue_depth": totals["max_queue_depth"],
+            "latency": percentiles(recorder.latencies.get(stage, [])),
+            "peak_rss_bytes": recorder.peak_rss.get(stage),
+        }
+
+    return {
+        "elapsed": elapsed,
+        "pages": pages,
+        "chunks": chunks,
+        "vectors": vectors,
+        "embed_requests": rag.embedder.requests,
+        "pages_per_second": pages / elapsed,
+        "chunks_per_second": chunks / elapsed,
+        "vectors_per_second": vectors / elapsed,
+        "stages": stages,
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return "unknown"
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    print(f"{'scenario':<10} {'metric':<20} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous or "error" in current or "error" in previous:
+            continue
+        for metric in ("pages_per_second", "chunks_per_second", "vectors_per_second"):
+            before, after = previous[metric], current[metric]
+            change = (after - before) / before * 100 if before else float("nan")
+            print(f"{name:<10} {metric:<20} {before:>12.1f} {after:>12.1f} {change:>7.1f}%")
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=["process", "stream", "many"])
+    parser.add_argument("--documents", type=int, default=20, help="Number of synthetic PDFs")
+    parser.add_argument("--pages", type=int, default=10, help="Pages per PDF")
+    parser.add_argument("--site-pages", type=int, default=50, help="Pages of the synthetic site")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--overlap", type=int, default=100)
+    parser.add_argument("--dimension", type=int, default=256)
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="Seconds per embedding request")
+    parser.add_argument("--embed-batch-size", type=int, default=64)
+    parser.add_argument("--insert-latency", type=float, default=0.01, help="Seconds per insert call")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--embed-workers", type=int, default=4)
+    parser.add_argument("--queue-size", type=int, default=16)
+    parser.add_argument("--browser", default="firefox")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    results = {
+        "timestamp": time.time(),
+        "revision": git_revision(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "parameters": vars(args),
+        "scenarios": {},
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        pdfs = make_pdfs(directory, args.documents, args.pages, seed=args.seed)
+        entry = make_site(directory, args.site_pages, seed=args.seed)
+        with serve_directory(directory) as base_url:
+            for name in args.scenarios:
+                print(f"Running {name} ...", file=sys.stderr)
+                try:
+                    results["scenarios"][name] = run_scenario(name, args, pdfs, base_url + entry)
+                except Exception as e:
+                    print(f"Scenario {name} failed: {e}", file=sys.stderr)
+                    results["scenarios"][name] = {"error": str(e)}
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    scale = 1 if sys.platform == "darwin" else 1024
+    results["peak_rss_bytes"] = usage.ru_maxrss * scale
+    results["children_peak_rss_bytes"] = children.ru_maxrss * scale
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+    for name, result in results["scenarios"].items():
+        if "error" in result:
+            print(f"{name:<10} error: {result['error']}")
+        else:
+            print(
+                f"{name:<10} {result['pages_per_second']:>8.1f} pages/s "
+                f"{result['chunks_per_second']:>8.1f} chunks/s "
+                f"{result['vectors_per_second']:>8.1f} vectors/s"
+            )
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import base64
+import functools
+import hashlib
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, Tuple
+
+import numpy as np
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def serve_directory(directory: str) -> Iterator[str]:
+    """
+    Serve a directory over HTTP on a free local port for the duration of the
+    context, yielding the base URL.
+    """
+    handler = functools.partial(QuietHandler, directory=directory)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class QuotaSimulator:
+    """
+    Requests and tokens per minute quotas enforced like the OpenAI API: each
+    quota is a bucket that refills continuously and holds `burst_seconds` of
+    quota, and a request that does not fit is rejected with the time until it
+    would.
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float, burst_seconds: float = 1.0):
+        self.limits = {"requests": requests_per_minute, "tokens": tokens_per_minute}
+        self.capacities = {name: max(1.0, limit * burst_seconds / 60) for name, limit in self.limits.items()}
+        self.levels = dict(self.capacities)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self, tokens: int) -> Tuple[bool, float, Dict[str, float]]:
+        """
+        Returns whether the request is admitted, else the seconds until it
+        would be, and the remaining quotas.
+        """
+        needed = {"requests": 1, "tokens": tokens}
+        with self.lock:
+            now = time.monotonic()
+            for name, limit in self.limits.items():
+                self.levels[name] = min(
+                    self.capacities[name], self.levels[name] + (now - self.updated) * limit / 60
+                )
+            self.updated = now
+            wait = max(
+                (min(needed[name], self.capacities[name]) - self.levels[name]) * 60 / self.limits[name]
+                for name in self.limits
+            )
+            if wait > 0:
+                return False, wait, dict(self.levels)
+            for name in self.limits:
+                # Requests larger than the burst are admitted into debt.
+                self.levels[name] -= needed[name]
+            return True, 0.0, dict(self.levels)
+
+
+class EmbeddingsHandler(BaseHTTPRequestHandler):
+    """
+    Stand-in for `POST /v1/embeddings` with simulated quotas and latency.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        tokens = sum(len(text) // 4 + 1 for text in inputs)
+
+        admitted, wait, remaining = server.quota.take(tokens)
+        with server.lock:
+            server.stats["requests"] += 1
+            if not admitted:
+                server.stats["throttled"] += 1
+        if not admitted:
+            self._send(
+                429,
+                {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                {"retry-after-ms": str(int(wait * 1000) + 1)},
+            )
+            return
+
+        with server.lock:
+            server.active += 1
+            # Requests beyond the server's capacity queue up behind others.
+            overload = max(1.0, server.active / server.capacity)
+        try:
+            time.sleep((server.latency + server.latency_per_token * tokens) * overload)
+        finally:
+            with server.lock:
+                server.active -= 1
+                server.stats["succeeded"] += 1
+                server.stats["tokens"] += tokens
+
+        # Shortened vectors are the first components, renormalized.
+        dimension = body.get("dimensions") or server.dimension
+        data = []
+        for index, text in enumerate(inputs):
+            seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+            vector = np.random.default_rng(seed).uniform(-1, 1, server.dimension).astype(np.float32)
+            vector = vector[:dimension] / np.linalg.norm(vector[:dimension])
+            if body.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vector.tobytes()).decode("ascii")
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+        self._send(
+            200,
+            {
+                "object": "list",
+                "data": data,
+                "model": body.get("model"),
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            },
+            {
+                "x-ratelimit-remaining-requests": str(int(remaining["requests"])),
+                "x-ratelimit-remaining-tokens": str(int(remaining["tokens"])),
+            },
+        )
+
+    def _send(self, status: int, payload: dict, headers: Dict[str, str]) -> None:
+        content = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+
+@contextmanager
+def serve_embeddings(
+    requests_per_minute: float = 3000,
+    tokens_per_minute: float = 1_000_000,
+    latency: float = 0.05,
+    latency_per_token: float = 0.0,
+    capacity: int = 16,
+    dimension: int = 256,
+    burst_seconds: float = 1.0,
+) -> Iterator[Tuple[str, Dict[str, int]]]:
+    """
+    Serve a local stand-in for the OpenAI embeddings API for the duration of
+    the context. Yields the base URL to configure the OpenAI embedder with,
+    and live counters of requests, throttled requests, successes and tokens.
+
+    Args:
+        requests_per_minute (float): Simulated request quota.
+        tokens_per_minute (float): Simulated token quota.
+        latency (float): Seconds per request.
+        latency_per_token (float): Additional seconds per input token.
+        capacity (int): Concurrent requests served at full speed; more slow
+            every request down proportionally.
+        dimension (int): Vector size.
+        burst_seconds (float): Seconds of quota that may be used at once.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), EmbeddingsHandler)
+    server.daemon_threads = True
+    server.quota = QuotaSimulator(requests_per_minute, tokens_per_minute, burst_seconds)
+    server.latency = latency
+    server.latency_per_token = latency_per_token
+    server.capacity = capacity
+    server.dimension = dimension
+    server.active = 0
+    server.lock = threading.Lock()
+    server.stats = {"requests": 0, "throttled": 0, "succeeded": 0, "tokens": 0}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/v1", server.stats
+    finally:
+        server.shutdown()
+        server.server_close()
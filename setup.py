@@ -14,6 +14,7 @@ setup(
     install_requires=get_requires(),
     extras_require={
         "openai": ["openai"],
+        "tiktoken": ["tiktoken"],
         "sentence_transformers": ["sentence-transformers"],
         "ollama": ["ollama"],
         "milvus": ["pymilvus"],
@@ -22,6 +23,7 @@ setup(
         "qdrant": ["qdrant-client"],
         "all": [
             "openai",
+            "tiktoken",
             "sentence-transformers",
             "ollama",
             "pymilvus",
@@ -5,6 +5,12 @@ from .config import (
     VectorStoreConfig,
     ChunkerConfig,
     CrawlerConfig,
+    PipelineConfig,
+    IncrementalConfig,
+    DedupConfig,
+    LexicalConfig,
+    QueryConfig,
+    JournalConfig,
 )
 
 __all__ = [
@@ -14,4 +20,10 @@ __all__ = [
     "VectorStoreConfig",
     "ChunkerConfig",
     "CrawlerConfig",
+    "PipelineConfig",
+    "IncrementalConfig",
+    "DedupConfig",
+    "LexicalConfig",
+    "QueryConfig",
+    "JournalConfig",
 ]
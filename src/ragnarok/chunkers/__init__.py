@@ -1,21 +1,26 @@
 from .base import BaseChunker, ChunkOutput
 from .fixed_size import FixedSizeChunker
-# from .semantic import SemanticChunker, SemanticChunkerConfig
-# from .hybrid import HybridChunker, HybridChunkerConfig
+from .token_size import TokenSizeChunker
+from .semantic import SemanticChunker
+from .hybrid import HybridChunker
+from .parallel import ParallelChunker
 
 CHUNKER_MAP = {
     'fixed_size': FixedSizeChunker,
-    # 'semantic': SemanticChunker,
-    # 'hybrid': HybridChunker
+    'token_size': TokenSizeChunker,
+    'semantic': SemanticChunker,
+    'hybrid': HybridChunker,
 }
 
-def get_chunker(chunker_type: str, config: dict) -> BaseChunker:
+def get_chunker(chunker_type: str, config: dict, embedder=None) -> BaseChunker:
     """
     Factory function to get the appropriate chunker based on the chunker type.
     
     Args:
-        chunker_type (str): The type of chunker ('fixed_size', 'semantic', or 'hybrid')
+        chunker_type (str): The type of chunker ('fixed_size', 'token_size', 'semantic', or 'hybrid')
         config (ChunkerConfig): The configuration for the chunker
+        embedder (BaseEmbedder): Embedder for chunkers that embed sentences,
+            such as 'semantic' and 'hybrid'. Ignored by the others.
     
     Returns:
         BaseChunker: An instance of the appropriate chunker
@@ -27,6 +32,8 @@ def get_chunker(chunker_type: str, config: dict) -> BaseChunker:
     if chunker_class is None:
         raise ValueError(f"No chunker available for type: {chunker_type}")
     
+    if chunker_class.requires_embedder:
+        return chunker_class(config, embedder=embedder)
     return chunker_class(config)
 
 __all__ = [
@@ -34,9 +41,9 @@ __all__ = [
     # 'ChunkerConfig',
     'ChunkOutput',
     'FixedSizeChunker',
-    # 'SemanticChunker',
-    # 'SemanticChunkerConfig',
-    # 'HybridChunker',
-    # 'HybridChunkerConfig',
+    'TokenSizeChunker',
+    'SemanticChunker',
+    'HybridChunker',
+    'ParallelChunker',
     'get_chunker',
 ]
\ No newline at end of file
@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from pydantic import BaseModel
 
@@ -17,9 +18,62 @@ class ChunkOutput(JSONSerializable):
 
 
 class BaseChunker(ABC):
+    # Chunkers that embed text take the pipeline's embedder as a keyword
+    # argument, see `get_chunker`.
+    requires_embedder: bool = False
+    # Whether `chunk_parallel` splits the work, see `ParallelChunker`.
+    supports_parallel: bool = False
+
     def __init__(self, config: ChunkerConfig):
         self.config = config
 
     @abstractmethod
     def chunk(self, text: str) -> List[str]:
         pass
+
+    def iter_chunks(self, text: str) -> Iterator[Tuple[str, Optional[int], Optional[int]]]:
+        """
+        Lazily yield the chunks of a text with their character offsets.
+
+        The default implementation locates the output of `chunk` in the text;
+        offsets are `None` for chunks that are not substrings of it.
+
+        Args:
+            text (str): The text to chunk.
+
+        Yields:
+            Tuple[str, Optional[int], Optional[int]]: The chunk text and its
+                start and end offsets in `text`.
+        """
+        cursor = 0
+        for chunk in self.chunk(text):
+            start = text.find(chunk, cursor)
+            if start == -1:
+                yield chunk, None, None
+            else:
+                yield chunk, start, start + len(chunk)
+                cursor = start
+
+    def chunk_stream(self, blocks: Iterable[str]) -> Iterator[Tuple[str, Optional[int], Optional[int]]]:
+        """
+        Chunk a text that arrives as an iterable of consecutive blocks, e.g.
+        the pages of a document as they are extracted. Yields the same chunks
+        and offsets as `iter_chunks` on the concatenated text.
+
+        The default implementation concatenates the blocks first. Chunkers
+        that can work on a bounded window override it to start yielding
+        before the input is exhausted.
+        """
+        return self.iter_chunks("".join(blocks))
+
+    def chunk_parallel(
+        self, text: str, submit: Callable[..., Future], segment_size: int
+    ) -> Iterator[Tuple[str, Optional[int], Optional[int]]]:
+        """
+        Chunk a large text in segments of about `segment_size` characters,
+        using `submit(method, *args)` to call methods of this chunker in
+        worker processes. Yields the same chunks as `iter_chunks`.
+
+        The default implementation chunks in the calling process.
+        """
+        return self.iter_chunks(text)
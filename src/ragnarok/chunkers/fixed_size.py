@@ -1,39 +1,174 @@
 from .base import BaseChunker
-from typing import List
+from concurrent.futures import Future
+from typing import Callable, Iterable, Iterator, List, Tuple
 
 class FixedSizeChunker(BaseChunker):
+    supports_parallel = True
+
     def __init__(self, config: dict):
         super().__init__(config)
         self.chunk_size = config.get('chunk_size', 1000)
         self.overlap = config.get('overlap', 100)
+        if self.chunk_size <= 0:
+            raise ValueError("chunk_size must be greater than 0")
+        if self.overlap < 0:
+            raise ValueError("overlap must be greater than or equal to 0")
 
     def chunk(self, text: str) -> List[str]:
-        chunks = []
+        return [text[start:end] for start, end in self.iter_spans(text)]
+
+    def iter_chunks(self, text: str) -> Iterator[Tuple[str, int, int]]:
+        for start, end in self.iter_spans(text):
+            yield text[start:end], start, end
+
+    def iter_spans(self, text: str) -> Iterator[Tuple[int, int]]:
+        """
+        Lazily yield the (start, end) character offsets of the chunks of a
+        text, without copying it.
+        """
         start = 0
         text_length = len(text)
 
         while start < text_length:
-            end = start + self.chunk_size
+            span, start = self._next_span(text, start, text_length)
+            yield span
+
+    def chunk_stream(self, blocks: Iterable[str]) -> Iterator[Tuple[str, int, int]]:
+        # Only the text from the current chunk start up to one chunk ahead is
+        # buffered, so memory stays bounded by the block and chunk sizes.
+        blocks = iter(blocks)
+        parts = []
+        buffer = ""
+        offset = 0  # Offset of buffer[0] in the whole text
+        buffered = 0  # Length of buffer plus pending parts
+        exhausted = False
+        start = 0
 
-            if end >= text_length:
-                chunks.append(text[start:])
+        while True:
+            # Buffer past the end of the next chunk, to know whether it is
+            # the last one.
+            while not exhausted and offset + buffered <= start + self.chunk_size:
+                block = next(blocks, None)
+                if block is None:
+                    exhausted = True
+                else:
+                    parts.append(block)
+                    buffered += len(block)
+            if parts:
+                buffer = "".join([buffer] + parts)
+                parts = []
+
+            if start >= offset + len(buffer):
                 break
 
-            # Find the last period or newline within the chunk
-            last_period = text.rfind(".", start, end)
-            last_newline = text.rfind("\n", start, end)
-            split_point = max(last_period, last_newline)
+            text_length = offset + len(buffer) if exhausted else offset + len(buffer) + 1
+            (span_start, span_end), start = self._next_span(buffer, start - offset, text_length - offset)
+            yield buffer[span_start:span_end], offset + span_start, offset + span_end
+            start += offset
+
+            # Drop consumed text once it makes up half of the buffer, so
+            # trimming stays linear overall.
+            consumed = start - offset
+            if consumed > len(buffer) // 2:
+                buffer = buffer[consumed:]
+                offset = start
+            buffered = len(buffer)
+
+    def chunk_parallel(
+        self, text: str, submit: Callable[..., Future], segment_size: int
+    ) -> Iterator[Tuple[str, int, int]]:
+        # Every chunk start depends only on the previous one. Each segment's
+        # chain is followed from the segment start in a worker; the
+        # sequential chain from the previous segment is then extended here
+        # until it reaches a start of the segment's chain, from which on both
+        # are identical. Chains meet as soon as they pick the same split
+        # point, so usually within a chunk or two.
+        bounds = [0]
+        for target in range(segment_size, len(text), segment_size):
+            # Start segments where a chunk would start after a split point.
+            split_point = max(
+                text.rfind(".", target - self.chunk_size, target),
+                text.rfind("\n", target - self.chunk_size, target),
+            )
+            cut = split_point - self.overlap if split_point != -1 else target
+            if cut <= bounds[-1]:
+                cut = target
+            bounds.append(cut)
+        bounds.append(len(text))
+        segments = list(zip(bounds, bounds[1:]))
+
+        futures = [
+            submit(
+                "segment_spans",
+                text[seg_start:seg_end + self.chunk_size],
+                seg_end - seg_start,
+                seg_end + self.chunk_size < len(text),
+            )
+            for seg_start, seg_end in segments
+        ]
+
+        start = 0
+        for (seg_start, seg_end), future in zip(segments, futures):
+            spans = future.result()
+            indexes = {seg_start + span_start: i for i, (span_start, _, _) in enumerate(spans)}
+            while start < seg_end and start not in indexes:
+                (span_start, span_end), start = self._next_span(text, start, len(text))
+                yield text[span_start:span_end], span_start, span_end
+            if start < seg_end:
+                for span_start, span_end, _ in spans[indexes[start]:]:
+                    yield text[seg_start + span_start:seg_start + span_end], seg_start + span_start, seg_start + span_end
+                start = seg_start + spans[-1][2]
+
+    def segment_spans(self, text: str, stop: int, more: bool) -> List[Tuple[int, int, int]]:
+        """
+        Follow the chunks of a segment from its first character until one
+        starts at or after `stop`. `more` tells whether the whole text
+        continues after `text`.
+
+        Returns:
+            List[Tuple[int, int, int]]: The start and end of every chunk and
+                the start of the next one.
+        """
+        spans = []
+        start = 0
+        text_length = len(text) + 1 if more else len(text)
+        while start < stop:
+            (span_start, span_end), start = self._next_span(text, start, text_length)
+            spans.append((span_start, span_end, start))
+        return spans
+
+    def _next_span(self, text: str, start: int, text_length: int) -> Tuple[Tuple[int, int], int]:
+        """
+        Compute the chunk starting at `start`. `text_length` may exceed
+        len(text) to signal that more text follows the buffered part.
+
+        Returns:
+            Tuple[Tuple[int, int], int]: The chunk span and the start of the
+                next chunk, which is always past `start`.
+        """
+        end = start + self.chunk_size
+
+        if end >= text_length:
+            return (start, text_length), text_length
+
+        # Find the last period or newline within the chunk
+        last_period = text.rfind(".", start, end)
+        last_newline = text.rfind("\n", start, end)
+        split_point = max(last_period, last_newline)
+
+        if split_point == -1 or split_point <= start:
+            split_point = (
+                end  # If no suitable split point, just split at chunk_size
+            )
 
-            if split_point == -1 or split_point <= start:
-                split_point = (
-                    end  # If no suitable split point, just split at chunk_size
-                )
+        # Move back by overlap amount, but always move forward: stepping back
+        # to or before `start` would repeat the same chunk forever.
+        next_start = split_point - self.overlap
+        if next_start <= start:
+            next_start = split_point
 
-            chunks.append(text[start:split_point])
-            start = split_point - self.overlap  # Move back by overlap amount
+        return (start, split_point), next_start
 
-        return chunks
-    
     @classmethod
     def from_config(cls, config: dict) -> 'FixedSizeChunker':
-        return cls(config)
\ No newline at end of file
+        return cls(config)
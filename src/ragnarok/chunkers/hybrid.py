@@ -1,24 +1,34 @@
-from .base import BaseChunker, ChunkerConfig
-from .fixed_size import FixedSizeChunker, FixedSizeChunkerConfig
-from .semantic import SemanticChunker, SemanticChunkerConfig
-from typing import List
-
-class HybridChunkerConfig(ChunkerConfig):
-    fixed_size_config: FixedSizeChunkerConfig
-    semantic_config: SemanticChunkerConfig
+from .base import BaseChunker
+from .fixed_size import FixedSizeChunker
+from .semantic import SemanticChunker
+from typing import Iterator, List, Tuple
 
 class HybridChunker(BaseChunker):
-    def __init__(self, config: HybridChunkerConfig):
+    """
+    Splits text into fixed-size sections first, then splits every section
+    at its topic changes with a SemanticChunker. Bounds the number of
+    sentences embedded at once for very long texts.
+
+    Config keys:
+        fixed_size_config (dict): Config of the FixedSizeChunker.
+        semantic_config (dict): Config of the SemanticChunker.
+    """
+
+    requires_embedder = True
+
+    def __init__(self, config: dict, embedder=None):
         super().__init__(config)
-        self.fixed_size_chunker = FixedSizeChunker(config.fixed_size_config)
-        self.semantic_chunker = SemanticChunker(config.semantic_config)
+        self.fixed_size_chunker = FixedSizeChunker(config.get('fixed_size_config') or {})
+        self.semantic_chunker = SemanticChunker(config.get('semantic_config') or {}, embedder=embedder)
 
     def chunk(self, text: str) -> List[str]:
-        fixed_size_chunks = self.fixed_size_chunker.chunk(text)
-        final_chunks = []
+        return [chunk for chunk, _, _ in self.iter_chunks(text)]
 
-        for chunk in fixed_size_chunks:
-            semantic_chunks = self.semantic_chunker.chunk(chunk)
-            final_chunks.extend(semantic_chunks)
+    def iter_chunks(self, text: str) -> Iterator[Tuple[str, int, int]]:
+        for start, end in self.fixed_size_chunker.iter_spans(text):
+            for chunk, chunk_start, chunk_end in self.semantic_chunker.iter_chunks(text[start:end]):
+                yield chunk, start + chunk_start, start + chunk_end
 
-        return final_chunks
\ No newline at end of file
+    @classmethod
+    def from_config(cls, config: dict, embedder=None) -> 'HybridChunker':
+        return cls(config, embedder=embedder)
@@ -0,0 +1,69 @@
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Iterator, Optional, Tuple
+
+from .base import BaseChunker
+
+# Chunker of a pool worker process, set up once by `_init_worker` so large
+# chunker state such as tokenizer vocabularies is not sent with every task.
+_worker_chunker: Optional[BaseChunker] = None
+
+
+def _init_worker(chunker: BaseChunker) -> None:
+    global _worker_chunker
+    _worker_chunker = chunker
+
+
+def _call(method: str, *args):
+    return getattr(_worker_chunker, method)(*args)
+
+
+class ParallelChunker:
+    """
+    Chunks very large texts in a pool of worker processes.
+
+    The text is cut into segments at boundaries the chunker can resume from,
+    the segments are chunked concurrently, and the results are stitched back
+    together so the output is identical to `chunker.iter_chunks(text)`,
+    including overlap across segment boundaries. Texts shorter than
+    `min_size` characters, and chunkers that do not support parallel
+    chunking, are chunked in the calling process.
+
+    Args:
+        chunker (BaseChunker): The chunker. It is sent to every worker once.
+        processes (Optional[int]): Worker processes. Defaults to the number
+            of CPUs.
+        min_size (int): Minimum text length, in characters, to chunk in
+            parallel.
+    """
+
+    def __init__(self, chunker: BaseChunker, processes: Optional[int] = None, min_size: int = 1_000_000):
+        self.chunker = chunker
+        self.processes = processes or os.cpu_count() or 1
+        self.min_size = min_size
+        self._executor = None
+
+    def iter_chunks(self, text: str) -> Iterator[Tuple[str, int, int]]:
+        if len(text) < self.min_size or not self.chunker.supports_parallel or self.processes < 2:
+            return self.chunker.iter_chunks(text)
+        # Several segments per process, so an uneven segment does not leave
+        # the other processes idle.
+        segment_size = -(-len(text) // (self.processes * 4))
+        return self.chunker.chunk_parallel(text, self.submit, segment_size)
+
+    def submit(self, method: str, *args) -> Future:
+        """
+        Call a method of the chunker in a worker process.
+        """
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processes,
+                initializer=_init_worker,
+                initargs=(self.chunker,),
+            )
+        return self._executor.submit(_call, method, *args)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
@@ -1,30 +1,163 @@
-# from .base import BaseChunker, ChunkerConfig
-# from typing import List
-# import nltk
+import re
+from typing import Iterator, List, Tuple
 
-# nltk.download('punkt')
+import numpy as np
 
-# class SemanticChunkerConfig(ChunkerConfig):
-#     min_chunk_size: int = 100
-#     max_chunk_size: int = 1000
+from .base import BaseChunker
+from .fixed_size import FixedSizeChunker
 
-# class SemanticChunker(BaseChunker):
-#     def __init__(self, config: SemanticChunkerConfig):
-#         super().__init__(config)
+# Sentence ends: terminal punctuation, optionally followed by closing quotes
+# or brackets, then whitespace; or a blank line.
+_SENTENCE_END = re.compile(r"[.!?][\"')\]]*\s+|\n\s*\n\s*")
+_LAST_WORD = re.compile(r"(\S+)$")
+_ABBREVIATIONS = {
+    "e.g.", "i.e.", "etc.", "vs.", "cf.", "al.", "fig.", "no.", "mr.", "mrs.",
+    "ms.", "dr.", "prof.", "sr.", "jr.", "st.", "inc.", "ltd.", "co.", "approx.",
+}
 
-#     def chunk(self, text: str) -> List[str]:
-#         sentences = nltk.sent_tokenize(text)
-#         chunks = []
-#         current_chunk = ""
 
-#         for sentence in sentences:
-#             if len(current_chunk) + len(sentence) > self.config.max_chunk_size and len(current_chunk) >= self.config.min_chunk_size:
-#                 chunks.append(current_chunk.strip())
-#                 current_chunk = sentence
-#             else:
-#                 current_chunk += " " + sentence
+def split_sentences(text: str) -> List[Tuple[int, int]]:
+    """
+    Split a text into sentences with a regular expression, without language
+    models or downloads. Periods after common abbreviations and initials do
+    not end a sentence.
 
-#         if current_chunk:
-#             chunks.append(current_chunk.strip())
+    Returns:
+        List[Tuple[int, int]]: The (start, end) offsets of every sentence,
+            without surrounding whitespace.
+    """
+    spans = []
+    start = 0
+    for match in _SENTENCE_END.finditer(text):
+        if text[match.start()] == ".":
+            word = _LAST_WORD.search(text, start, match.start() + 1)
+            if word and (
+                word.group(1).lower() in _ABBREVIATIONS
+                or re.fullmatch(r"[A-Z]\.", word.group(1))
+            ):
+                continue
+        spans.append((start, match.end()))
+        start = match.end()
+    spans.append((start, len(text)))
 
-#         return chunks
\ No newline at end of file
+    stripped = []
+    for start, end in spans:
+        sentence = text[start:end]
+        left = len(sentence) - len(sentence.lstrip())
+        right = len(sentence.rstrip())
+        if right > left:
+            stripped.append((start + left, start + right))
+    return stripped
+
+
+class SemanticChunker(BaseChunker):
+    """
+    Splits text where the topic changes.
+
+    Sentences are embedded in batches through the embedder, and the cosine
+    distance between consecutive windows of sentences is computed for the
+    whole sentence matrix at once. A chunk ends where the distance exceeds
+    the `breakpoint_percentile` of all distances, once it holds at least
+    `min_chunk_size` characters, or before it would exceed `max_chunk_size`.
+
+    Config keys:
+        min_chunk_size (int): Minimum characters per chunk. Defaults to 100.
+        max_chunk_size (int): Maximum characters per chunk. Defaults to 1000.
+        window (int): Sentences averaged on each side of a candidate
+            breakpoint. Defaults to 1.
+        breakpoint_percentile (float): Percentile of the distances above
+            which a breakpoint is placed. Defaults to 95.
+        threshold (float): Fixed cosine distance to use instead of the
+            percentile.
+        embedder_type (str), embedder_config (dict): Embedder to build when
+            none is passed in.
+    """
+
+    requires_embedder = True
+
+    def __init__(self, config: dict, embedder=None):
+        super().__init__(config)
+        self.min_chunk_size = config.get('min_chunk_size', 100)
+        self.max_chunk_size = config.get('max_chunk_size', 1000)
+        self.window = config.get('window', 1)
+        self.breakpoint_percentile = config.get('breakpoint_percentile', 95)
+        self.threshold = config.get('threshold')
+        if self.max_chunk_size <= 0:
+            raise ValueError("max_chunk_size must be greater than 0")
+        if self.window < 1:
+            raise ValueError("window must be at least 1")
+
+        if embedder is None:
+            if 'embedder_type' not in config:
+                raise ValueError("SemanticChunker needs an embedder or an embedder_type")
+            from ..embedders import get_embedder
+
+            embedder = get_embedder(config['embedder_type'], config.get('embedder_config') or {})
+        self.embedder = embedder
+        # Splits single sentences longer than max_chunk_size.
+        self.splitter = FixedSizeChunker({'chunk_size': self.max_chunk_size, 'overlap': 0})
+
+    def chunk(self, text: str) -> List[str]:
+        return [chunk for chunk, _, _ in self.iter_chunks(text)]
+
+    def iter_chunks(self, text: str) -> Iterator[Tuple[str, int, int]]:
+        sentences = split_sentences(text)
+        if not sentences:
+            return
+
+        distances = self.distances([text[start:end] for start, end in sentences])
+        threshold = self.threshold
+        if threshold is None and len(distances):
+            threshold = np.percentile(distances, self.breakpoint_percentile)
+        # breaks[i] is True if a topic change follows sentence i.
+        breaks = np.zeros(len(sentences), dtype=bool)
+        if len(distances):
+            breaks[:-1] = distances > threshold
+
+        chunk_start, chunk_end = sentences[0]
+        for i in range(1, len(sentences)):
+            start, end = sentences[i]
+            topic_change = breaks[i - 1] and chunk_end - chunk_start >= self.min_chunk_size
+            if topic_change or end - chunk_start > self.max_chunk_size:
+                yield from self._emit(text, chunk_start, chunk_end)
+                chunk_start = start
+            chunk_end = end
+        yield from self._emit(text, chunk_start, chunk_end)
+
+    def distances(self, sentences: List[str]) -> np.ndarray:
+        """
+        Cosine distance between the windows of sentences before and after
+        every sentence boundary.
+
+        Returns:
+            np.ndarray: `len(sentences) - 1` distances.
+        """
+        if len(sentences) < 2:
+            return np.zeros(0, dtype=np.float32)
+
+        vectors = self.embedder.embed_matrix(sentences)
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+        # Window sums from a cumulative sum: before[i] covers sentences
+        # (i - window, i], after[i] covers (i, i + window].
+        n = len(sentences)
+        cumulative = np.vstack([np.zeros((1, vectors.shape[1]), dtype=np.float32), np.cumsum(vectors, axis=0)])
+        boundaries = np.arange(1, n)
+        before = cumulative[boundaries] - cumulative[np.maximum(boundaries - self.window, 0)]
+        after = cumulative[np.minimum(boundaries + self.window, n)] - cumulative[boundaries]
+
+        dots = np.einsum("ij,ij->i", before, after)
+        norms = np.linalg.norm(before, axis=1) * np.linalg.norm(after, axis=1)
+        return 1.0 - dots / np.maximum(norms, 1e-12)
+
+    def _emit(self, text: str, start: int, end: int) -> Iterator[Tuple[str, int, int]]:
+        if end - start <= self.max_chunk_size:
+            yield text[start:end], start, end
+            return
+        segment = text[start:end]
+        for span_start, span_end in self.splitter.iter_spans(segment):
+            yield segment[span_start:span_end], start + span_start, start + span_end
+
+    @classmethod
+    def from_config(cls, config: dict, embedder=None) -> 'SemanticChunker':
+        return cls(config, embedder=embedder)
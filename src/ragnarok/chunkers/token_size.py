@@ -0,0 +1,161 @@
+import re
+from concurrent.futures import Future
+from itertools import accumulate
+from typing import Callable, Iterator, List, Tuple
+
+from ..utils.tokenizers import get_tokenizer
+from .base import BaseChunker
+
+# A piece ends after sentence punctuation followed by whitespace, or after a
+# run of newlines.
+_PIECE_END = re.compile(r"[.!?][\"')\]]*\s+|\n\s*")
+_WORD = re.compile(r"\s*\S+\s*")
+
+
+class TokenSizeChunker(BaseChunker):
+    """
+    Packs text into chunks of up to `chunk_size` tokens.
+
+    The text is split into sentences (or lines) whose tokens are counted
+    once; chunks are then packed greedily from the running totals, so no
+    candidate window is ever re-tokenized. Sentences longer than a chunk are
+    split at words, and words longer than a chunk at characters.
+
+    Config keys:
+        chunk_size (int): Maximum tokens per chunk. Defaults to 8191, the
+            input limit of the OpenAI embedding models.
+        overlap (int): Maximum tokens of trailing sentences repeated at the
+            start of the next chunk. Defaults to 0.
+        tokenizer: "approximate" (default), "tiktoken", a BaseTokenizer or a
+            function returning the token count of a text.
+        encoding, bpe_file, pattern, chars_per_token: Passed on to the
+            tokenizer, see `ragnarok.utils.tokenizers`.
+    """
+
+    supports_parallel = True
+
+    def __init__(self, config: dict):
+        super().__init__(config)
+        self.chunk_size = config.get('chunk_size', 8191)
+        self.overlap = config.get('overlap', 0)
+        if self.chunk_size <= 0:
+            raise ValueError("chunk_size must be greater than 0")
+        if self.overlap < 0:
+            raise ValueError("overlap must be greater than or equal to 0")
+        self.tokenizer = get_tokenizer(config.get('tokenizer'), config)
+
+    def chunk(self, text: str) -> List[str]:
+        return [text[start:end] for start, end in self.iter_spans(text)]
+
+    def iter_chunks(self, text: str) -> Iterator[Tuple[str, int, int]]:
+        for start, end in self.iter_spans(text):
+            yield text[start:end], start, end
+
+    def iter_spans(self, text: str) -> Iterator[Tuple[int, int]]:
+        """
+        Lazily yield the (start, end) character offsets of the chunks of a
+        text.
+        """
+        return self._pack(list(self._pieces(text)))
+
+    def chunk_parallel(
+        self, text: str, submit: Callable[..., Future], segment_size: int
+    ) -> Iterator[Tuple[str, int, int]]:
+        # Pieces only depend on their own text, so segments cut at piece
+        # boundaries are tokenized in workers and packed here.
+        bounds = [0]
+        for target in range(segment_size, len(text), segment_size):
+            if target <= bounds[-1]:
+                continue
+            match = _PIECE_END.search(text, target)
+            if match is None or match.end() >= len(text):
+                break
+            bounds.append(match.end())
+        bounds.append(len(text))
+
+        futures = [
+            submit("segment_pieces", text[seg_start:seg_end])
+            for seg_start, seg_end in zip(bounds, bounds[1:])
+        ]
+        pieces = [
+            (seg_start + start, seg_start + end, tokens)
+            for seg_start, future in zip(bounds, futures)
+            for start, end, tokens in future.result()
+        ]
+        for start, end in self._pack(pieces):
+            yield text[start:end], start, end
+
+    def segment_pieces(self, text: str) -> List[Tuple[int, int, int]]:
+        return list(self._pieces(text))
+
+    def _pack(self, pieces: List[Tuple[int, int, int]]) -> Iterator[Tuple[int, int]]:
+        """
+        Greedily pack consecutive pieces into chunks of at most `chunk_size`
+        tokens.
+        """
+        if not pieces:
+            return
+        # totals[i] is the token count of pieces[:i].
+        totals = [0] + list(accumulate(tokens for _, _, tokens in pieces))
+
+        first = 0
+        while first < len(pieces):
+            # Pieces never exceed chunk_size, so at least one always fits.
+            last = first + 1
+            while last < len(pieces) and totals[last + 1] - totals[first] <= self.chunk_size:
+                last += 1
+            yield pieces[first][0], pieces[last - 1][1]
+            if last == len(pieces):
+                break
+
+            # Step back over trailing pieces for the overlap, but always
+            # move forward.
+            next_first = last
+            while next_first - 1 > first and totals[last] - totals[next_first - 1] <= self.overlap:
+                next_first -= 1
+            first = next_first
+
+    def _pieces(self, text: str) -> Iterator[Tuple[int, int, int]]:
+        """
+        Split a text into contiguous (start, end, tokens) pieces of at most
+        `chunk_size` tokens.
+        """
+        start = 0
+        for match in _PIECE_END.finditer(text):
+            yield from self._fit(text, start, match.end())
+            start = match.end()
+        if start < len(text):
+            yield from self._fit(text, start, len(text))
+
+    def _fit(self, text: str, start: int, end: int) -> Iterator[Tuple[int, int, int]]:
+        tokens = self.tokenizer.count(text[start:end])
+        if tokens <= self.chunk_size:
+            yield start, end, tokens
+            return
+
+        words = [(m.start(), m.end()) for m in _WORD.finditer(text, start, end)]
+        if len(words) > 1:
+            # Keep leading whitespace with the first word.
+            words[0] = (start, words[0][1])
+            words[-1] = (words[-1][0], end)
+            for word_start, word_end in words:
+                yield from self._fit(text, word_start, word_end)
+            return
+
+        # A single word longer than a chunk: split at characters, sized from
+        # its average characters per token.
+        while start < end:
+            length = min(end - start, max(1, (end - start) * self.chunk_size // tokens))
+            while True:
+                piece_tokens = self.tokenizer.count(text[start:start + length])
+                if piece_tokens <= self.chunk_size or length == 1:
+                    break
+                length = max(1, length * self.chunk_size // piece_tokens)
+            yield start, start + length, piece_tokens
+            start += length
+            if start < end:
+                tokens = max(1, self.tokenizer.count(text[start:end]))
+
+    @classmethod
+    def from_config(cls, config: dict) -> 'TokenSizeChunker':
+        return cls(config)
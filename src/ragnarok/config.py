@@ -11,6 +11,10 @@ class ChunkerConfig(BaseModel):
 class EmbedderConfig(BaseModel):
     embedder_type: str
     config: Optional[dict] = None
+    cache: Optional[Dict[str, Any]] = None
+    # Truncation and int8 or binary quantization of the vectors before they
+    # are stored, see EmbeddingQuantizer.
+    quantization: Optional[Dict[str, Any]] = None
 
 
 class VectorStoreConfig(BaseModel):
@@ -23,14 +27,84 @@ class CrawlerConfig(BaseModel):
     config: Optional[Dict[str, Any]] = {"proxies": [], "browser": "firefox"}
 
 
+class PipelineConfig(BaseModel):
+    extract_workers: int = 1
+    chunk_workers: int = 1
+    embed_workers: int = 2
+    insert_workers: int = 1
+    insert_batch_size: int = 256
+    queue_size: int = 16
+    # Texts of at least parallel_chunk_min_size characters are chunked in a
+    # pool of chunk_processes processes; 0 disables parallel chunking.
+    chunk_processes: int = 0
+    parallel_chunk_min_size: int = 1_000_000
+
+
+class IncrementalConfig(BaseModel):
+    state_path: str = "ragnarok_state.db"
+
+
+class DedupConfig(BaseModel):
+    method: str = "minhash"
+    threshold: float = 0.9
+    num_perm: int = 128
+    max_distance: int = 3
+    shingle_size: int = 3
+
+
+class LexicalConfig(BaseModel):
+    path: str = "ragnarok_bm25"
+    k1: float = 1.2
+    b: float = 0.75
+    flush_docs: int = 10_000
+    max_segments: int = 8
+    # Damping constant of the reciprocal rank fusion in hybrid search.
+    rrf_k: int = 60
+
+
+class QueryConfig(BaseModel):
+    # Query embeddings kept in memory, least recently used evicted first.
+    embedding_cache_size: int = 10_000
+    # Query results kept in memory for result_ttl seconds, and until the next
+    # insert or delete.
+    result_cache_size: int = 10_000
+    result_ttl: float = 300.0
+
+
+class JournalConfig(BaseModel):
+    path: str = "ragnarok_journal"
+    # Rows per vector store insert, and seconds to wait for a full batch.
+    flush_rows: int = 10_000
+    flush_interval: float = 0.5
+    # Unwritten rows before inserts block.
+    max_pending_rows: int = 100_000
+    segment_bytes: int = 64 * 1024 * 1024
+    sync: bool = True
+    max_retries: int = 3
+    retry_backoff: float = 0.5
+    max_retry_backoff: float = 30.0
+    # Seconds `RAGnarok.close` waits for an unavailable vector store before
+    # leaving the remaining rows for the next run.
+    close_timeout: Optional[float] = 60.0
+
+
 class RAGnarokConfig(BaseModel):
     log_level: str = "INFO"
     log_file: Optional[str] = None
     chunker: Optional[Union[ChunkerConfig, Callable[[str], List[str]]]] = Field(
-        default=lambda: ChunkerConfig(
+        default_factory=lambda: ChunkerConfig(
             chunker_type="fixed_size", config={"chunk_size": 1000, "overlap": 200}
         )
     )
     crawler: Optional[CrawlerConfig] = None
-    embedder: EmbedderConfig
-    vectorstore: VectorStoreConfig
+    pipeline: Optional[PipelineConfig] = None
+    incremental: Optional[IncrementalConfig] = None
+    dedup: Optional[DedupConfig] = None
+    # BM25 index of the chunk texts, for lexical and hybrid search.
+    lexical: Optional[LexicalConfig] = None
+    query: Optional[QueryConfig] = None
+    journal: Optional[JournalConfig] = None
+    # May be omitted when an embedder or vector store instance is passed to
+    # RAGnarok directly.
+    embedder: Optional[EmbedderConfig] = None
+    vectorstore: Optional[VectorStoreConfig] = None
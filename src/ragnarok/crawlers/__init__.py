@@ -1,4 +1,4 @@
-from .base import BaseCrawler
+from .base import BaseCrawler, CrawlResult
 from typing import Dict, Any
 
 def get_crawler(type: str, config: Dict[str, Any]) -> BaseCrawler:
@@ -11,5 +11,6 @@ def get_crawler(type: str, config: Dict[str, Any]) -> BaseCrawler:
 
 __all__ = [
     'BaseCrawler',
+    'CrawlResult',
     'get_crawler',
 ]
\ No newline at end of file
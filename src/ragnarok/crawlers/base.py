@@ -1,7 +1,53 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from typing import Iterable, List, Dict, Any, Optional, Set
+
+from ..utils.aio import run_in_thread
+
+
+class CrawlResult(list):
+    """
+    The pages of a crawl, with what the crawl could not tell about the
+    others: `failed` holds the URLs that could not be fetched, `gone` those
+    that answered 404 or 410, and `aborted` is set if the crawl stopped
+    before its queue was empty.
+    """
+
+    def __init__(
+        self,
+        pages: Iterable[Any] = (),
+        failed: Optional[Set[str]] = None,
+        gone: Optional[Set[str]] = None,
+        aborted: bool = False,
+    ):
+        super().__init__(pages)
+        self.failed = failed if failed is not None else set()
+        self.gone = gone if gone is not None else set()
+        self.aborted = aborted
+
+    @property
+    def complete(self) -> bool:
+        """
+        Whether every reachable page was fetched, so a page missing from
+        the crawl is no longer linked.
+        """
+        return not self.failed and not self.aborted
+
 
 class BaseCrawler(ABC):
+    # Set by RAGnarok to a PipelineMetrics instance to record per-page metrics.
+    metrics = None
+
     @abstractmethod
     def crawl(self, url: str, depth: int) -> List[Dict[str, Any]]:
-        pass
\ No newline at end of file
+        """
+        Crawl from `url` to `depth` links deep. Crawlers that can tell which
+        pages failed or are gone return a CrawlResult.
+        """
+        pass
+
+    async def acrawl(self, url: str, depth: int) -> List[Dict[str, Any]]:
+        """
+        Async counterpart of `crawl`. The default implementation runs `crawl`
+        in a worker thread.
+        """
+        return await run_in_thread(self.crawl, url, depth=depth)
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import logging
 import random
@@ -11,12 +12,18 @@ import psutil
 from bs4 import BeautifulSoup
 from langdetect import detect
 from markdownify import MarkdownConverter
+from playwright.async_api import async_playwright
 from playwright.sync_api import sync_playwright
 from tqdm import tqdm
 
 from ..extractors.base import ExtractorOutput
 from ..logger import RAGnarokLogger
-from .base import BaseCrawler
+from ..metrics import StageEvent
+from ..utils.aio import run_in_thread
+from .base import BaseCrawler, CrawlResult
+
+# Statuses of pages that no longer exist, as opposed to failed fetches.
+GONE_STATUSES = (404, 410)
 
 
 class PlaywrightCrawler(BaseCrawler):
@@ -33,6 +40,22 @@ class PlaywrightCrawler(BaseCrawler):
         process = psutil.Process()
         memory_info = process.memory_info()
         self.logger.info(f"Memory usage: {memory_info.rss / 1024 / 1024:.2f} MB")
+        if self.metrics is not None:
+            self.metrics.set_gauge("memory_rss_bytes", memory_info.rss)
+
+    def record_page(self, started, content, attempts):
+        if self.metrics is None:
+            return
+        self.metrics.record(
+            StageEvent(
+                "crawl",
+                wall_time=time.perf_counter() - started,
+                items=1 if content is not None else 0,
+                bytes=len(content.encode("utf-8")) if content is not None else 0,
+                retries=attempts - 1,
+                errors=1 if content is None else 0,
+            )
+        )
         
     def save_checkpoint(self, results, queue, visited):
         checkpoint = {
@@ -66,16 +89,21 @@ class PlaywrightCrawler(BaseCrawler):
         return round(words / wpm)
 
     def crawl_url(self, page, url, max_retries=3, retry_delay=5):
+        started = time.perf_counter()
         for attempt in range(max_retries):
             try:
-                page.goto(url)
+                response = page.goto(url)
+                if response is not None and response.status in GONE_STATUSES:
+                    self.logger.info(f"{url} is gone ({response.status})")
+                    return None, None, response.status
                 page.wait_for_load_state("networkidle", timeout=10000)
                 content = page.content()
 
                 if not content or len(content.strip()) < 50:
                     raise ValueError("Empty or too short content")
 
-                return content
+                self.record_page(started, content, attempt + 1)
+                return content, (response.headers if response else {}), (response.status if response else None)
             except Exception as e:
                 if attempt < max_retries - 1:
                     self.logger.warning(
@@ -86,7 +114,37 @@ class PlaywrightCrawler(BaseCrawler):
                     self.logger.error(
                         f"Failed to crawl {url} after {max_retries} attempts: {e}"
                     )
-                    return None
+                    self.record_page(started, None, max_retries)
+                    return None, None, None
+
+    async def acrawl_url(self, page, url, max_retries=3, retry_delay=5):
+        started = time.perf_counter()
+        for attempt in range(max_retries):
+            try:
+                response = await page.goto(url)
+                if response is not None and response.status in GONE_STATUSES:
+                    self.logger.info(f"{url} is gone ({response.status})")
+                    return None, None, response.status
+                await page.wait_for_load_state("networkidle", timeout=10000)
+                content = await page.content()
+
+                if not content or len(content.strip()) < 50:
+                    raise ValueError("Empty or too short content")
+
+                self.record_page(started, content, attempt + 1)
+                return content, (response.headers if response else {}), (response.status if response else None)
+            except Exception as e:
+                if attempt < max_retries - 1:
+                    self.logger.warning(
+                        f"Error crawling {url} (attempt {attempt + 1}/{max_retries}): {e}. Retrying in {retry_delay} seconds..."
+                    )
+                    await asyncio.sleep(retry_delay)
+                else:
+                    self.logger.error(
+                        f"Failed to crawl {url} after {max_retries} attempts: {e}"
+                    )
+                    self.record_page(started, None, max_retries)
+                    return None, None, None
 
     def is_valid_url(self, base_url, url):
         base_parsed = urlparse(base_url)
@@ -97,26 +155,98 @@ class PlaywrightCrawler(BaseCrawler):
             return current_path != base_path and not parsed.fragment
         return False
 
+    def get_browser_type(self, p):
+        if self.browser not in ("firefox", "chromium", "webkit"):
+            raise ValueError(f"Invalid browser: {self.browser}")
+        return getattr(p, self.browser)
+
+    def parse_page(self, url, content, headers=None):
+        soup = BeautifulSoup(content, "html.parser")
+
+        title = soup.title.string if soup.title else "No title"
+        markdown_content = self.clean_content(
+            self.md(
+                soup,
+                strip=["a", "img", "code"],
+                autolinks=False,
+                heading_style="ATX",
+                newline_style="BACKSLASH",
+            )
+        )
+
+        meta_description = soup.find("meta", attrs={"name": "description"})
+        meta_description = (
+            meta_description["content"] if meta_description else None
+        )
+
+        headings = [
+            h.text
+            for h in soup.find_all(["h1", "h2", "h3", "h4", "h5", "h6"])
+        ]
+        word_count = len(markdown_content.split())
+        character_count = len(markdown_content)
+        images_alt_text = [
+            img.get("alt", "")
+            for img in soup.find_all("img")
+            if img.get("alt")
+        ]
+
+        try:
+            language = detect(markdown_content)
+        except:
+            language = "unknown"
+
+        reading_time = self.estimate_reading_time(markdown_content)
+
+        metadata = {
+            "url": url,
+            "title": title,
+            "meta_description": meta_description,
+            "headings": headings,
+            "word_count": word_count,
+            "character_count": character_count,
+            "images_alt_text": images_alt_text,
+            "language": language,
+            "reading_time_minutes": reading_time,
+        }
+        # Let incremental ingestion tell whether a page changed.
+        if headers:
+            for header in ("etag", "last-modified"):
+                if headers.get(header):
+                    metadata[header.replace("-", "_")] = headers[header]
+
+        return ExtractorOutput(text=markdown_content, metadata=metadata), soup
+
+    def enqueue_links(self, base_url, url, soup, current_depth, queue, visited):
+        new_links = 0
+        queue_urls = set(url for url, _ in queue)
+        for link in soup.find_all("a", href=True):
+            full_url = urljoin(url, link["href"])
+            full_url_without_fragment = full_url.split("#")[0]
+
+            if (
+                self.is_valid_url(base_url, full_url)
+                and full_url_without_fragment not in visited
+                and full_url_without_fragment not in queue_urls
+            ):
+                queue.append((full_url, current_depth + 1))
+                queue_urls.add(full_url_without_fragment)
+                new_links += 1
+        return new_links
+
     def crawl(self, base_url, depth, save_checkpoint=False) -> List[ExtractorOutput]:
         self.logger.info(f"Starting crawl of {base_url} with depth {depth}")
         visited = set()
         queue = deque([(base_url, 0)])
-        results = []
+        results = CrawlResult()
         total_urls = 1
 
         with sync_playwright() as p:
             proxy = self.get_random_proxy()
-            if self.browser == "firefox":
-                browser = p.firefox.launch(headless=True, proxy=proxy)
-            elif self.browser == "chromium":
-                browser = p.chromium.launch(headless=True, proxy=proxy)
-            elif self.browser == "webkit":
-                browser = p.webkit.launch(headless=True, proxy=proxy)
-            else:
-                raise ValueError(f"Invalid browser: {self.browser}")
+            browser = self.get_browser_type(p).launch(headless=True, proxy=proxy)
             page = browser.new_page()
 
-            page.route(re.compile(r"(\.png$)|(\.jpg$)|(\.gif$)|(\.svg$)|(\.ico$)|"), lambda route: route.abort())
+            page.route(re.compile(r"(\.png$)|(\.jpg$)|(\.gif$)|(\.svg$)|(\.ico$)"), lambda route: route.abort())
 
             with tqdm(total=total_urls, desc="Crawling", unit="URL") as pbar:
                 try:
@@ -133,62 +263,16 @@ class PlaywrightCrawler(BaseCrawler):
                         visited.add(url_without_fragment)
                         self.logger.info(f"Crawling: {url}")
 
-                        content = self.crawl_url(page, url)
+                        content, headers, status = self.crawl_url(page, url)
+                        if status in GONE_STATUSES:
+                            results.gone.add(url)
+                            continue
                         if content is None:
+                            results.failed.add(url)
                             continue
 
-                        soup = BeautifulSoup(content, "html.parser")
-
-                        title = soup.title.string if soup.title else "No title"
-                        markdown_content = self.clean_content(
-                            self.md(
-                                soup,
-                                strip=["a", "img", "code"],
-                                autolinks=False,
-                                heading_style="ATX",
-                                newline_style="BACKSLASH",
-                            )
-                        )
-
-                        meta_description = soup.find("meta", attrs={"name": "description"})
-                        meta_description = (
-                            meta_description["content"] if meta_description else None
-                        )
-
-                        headings = [
-                            h.text
-                            for h in soup.find_all(["h1", "h2", "h3", "h4", "h5", "h6"])
-                        ]
-                        word_count = len(markdown_content.split())
-                        character_count = len(markdown_content)
-                        images_alt_text = [
-                            img.get("alt", "")
-                            for img in soup.find_all("img")
-                            if img.get("alt")
-                        ]
-
-                        try:
-                            language = detect(markdown_content)
-                        except:
-                            language = "unknown"
-
-                        reading_time = self.estimate_reading_time(markdown_content)
-
-                        metadata = {
-                            "url": url,
-                            "title": title,
-                            "meta_description": meta_description,
-                            "headings": headings,
-                            "word_count": word_count,
-                            "character_count": character_count,
-                            "images_alt_text": images_alt_text,
-                            "language": language,
-                            "reading_time_minutes": reading_time,
-                        }
-
-                        results.append(
-                            ExtractorOutput(text=markdown_content, metadata=metadata)
-                        )
+                        result, soup = self.parse_page(url, content, headers)
+                        results.append(result)
 
                         if len(results) % 10 == 0:
                             self.log_memory_usage()
@@ -197,28 +281,70 @@ class PlaywrightCrawler(BaseCrawler):
                                 self.save_checkpoint(results, queue, visited)
 
                         if current_depth < depth:
-                            new_links = 0
-                            queue_urls = set(url for url, _ in queue)
-                            for link in soup.find_all("a", href=True):
-                                full_url = urljoin(url, link["href"])
-                                full_url_without_fragment = full_url.split("#")[0]
-
-                                if (
-                                    self.is_valid_url(base_url, full_url)
-                                    and full_url_without_fragment not in visited
-                                    and full_url_without_fragment not in queue_urls
-                                ):
-                                    queue.append((full_url, current_depth + 1))
-                                    queue_urls.add(full_url_without_fragment)
-                                    new_links += 1
-
-                            total_urls += new_links
+                            total_urls += self.enqueue_links(
+                                base_url, url, soup, current_depth, queue, visited
+                            )
                             pbar.total = total_urls
                             pbar.refresh()
 
                         pbar.update(1)
                 except Exception as e:
                     self.logger.error(f"Unexpected error during crawling: {e}")
+                    results.aborted = True
                 finally:
                     browser.close()
                     return results
+
+    async def acrawl(self, base_url, depth, save_checkpoint=False) -> List[ExtractorOutput]:
+        self.logger.info(f"Starting crawl of {base_url} with depth {depth}")
+        visited = set()
+        queue = deque([(base_url, 0)])
+        results = CrawlResult()
+
+        async with async_playwright() as p:
+            proxy = self.get_random_proxy()
+            browser = await self.get_browser_type(p).launch(headless=True, proxy=proxy)
+            page = await browser.new_page()
+
+            await page.route(re.compile(r"(\.png$)|(\.jpg$)|(\.gif$)|(\.svg$)|(\.ico$)"), lambda route: route.abort())
+
+            try:
+                while queue:
+                    url, current_depth = queue.popleft()
+                    url_without_fragment = url.split("#")[0]
+
+                    if current_depth > depth:
+                        break
+
+                    if url_without_fragment in visited:
+                        continue
+
+                    visited.add(url_without_fragment)
+                    self.logger.info(f"Crawling: {url}")
+
+                    content, headers, status = await self.acrawl_url(page, url)
+                    if status in GONE_STATUSES:
+                        results.gone.add(url)
+                        continue
+                    if content is None:
+                        results.failed.add(url)
+                        continue
+
+                    # Parsing is CPU-bound, keep it off the event loop.
+                    result, soup = await run_in_thread(self.parse_page, url, content, headers)
+                    results.append(result)
+
+                    if len(results) % 10 == 0:
+                        self.log_memory_usage()
+                        if save_checkpoint:
+                            self.logger.info(f"Saving checkpoint...")
+                            self.save_checkpoint(results, queue, visited)
+
+                    if current_depth < depth:
+                        self.enqueue_links(base_url, url, soup, current_depth, queue, visited)
+            except Exception as e:
+                self.logger.error(f"Unexpected error during crawling: {e}")
+                results.aborted = True
+            finally:
+                await browser.close()
+        return results
@@ -0,0 +1,342 @@
+import hashlib
+import re
+import threading
+import unicodedata
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .chunkers import ChunkOutput
+from .utils.serializable import JSONSerializable
+
+_WORD = re.compile(r"\w+")
+# Largest 32-bit prime, so hash permutations stay exact in uint64 arithmetic.
+_PRIME = np.uint64(4294967291)
+
+
+def normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+def shingles(text: str, size: int) -> List[str]:
+    """
+    Overlapping runs of `size` lowercase words. Texts shorter than `size`
+    words are a single shingle.
+    """
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return [" ".join(words)]
+    return [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+
+def lsh_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """
+    Choose the number of bands and rows per band for MinHash LSH, so that
+    the similarity at which a pair becomes likely to share a bucket,
+    (1 / bands) ** (1 / rows), is as close as possible to `threshold`.
+    """
+    best = None
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        error = abs((1 / bands) ** (1 / rows) - threshold)
+        if best is None or error < best[0]:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+
+class MinHashIndex:
+    """
+    MinHash signatures of word shingles in a banded LSH index. Candidates
+    from shared buckets are confirmed by their estimated Jaccard similarity.
+    """
+
+    def __init__(self, num_perm: int = 128, threshold: float = 0.9, shingle_size: int = 3, seed: int = 1):
+        self.num_perm = num_perm
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.bands, self.rows = lsh_bands(num_perm, threshold)
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, int(_PRIME), size=(num_perm, 1), dtype=np.uint64)
+        self._b = rng.randint(0, int(_PRIME), size=(num_perm, 1), dtype=np.uint64)
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(self.bands)]
+        self._signatures: List[np.ndarray] = []
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = np.array(
+            [zlib.crc32(shingle.encode("utf-8")) for shingle in shingles(text, self.shingle_size)],
+            dtype=np.uint64,
+        )
+        # One universal hash per permutation, for all shingles at once.
+        permuted = (self._a * hashes[np.newaxis, :] + self._b) % _PRIME
+        return permuted.min(axis=1).astype(np.uint32)
+
+    def query(self, signature: np.ndarray) -> Tuple[Optional[int], float]:
+        """
+        Returns:
+            Tuple[Optional[int], float]: The most similar indexed item at or
+                above the threshold, or None, and its estimated similarity.
+        """
+        candidates = set()
+        for band, buckets in enumerate(self._buckets):
+            key = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            candidates.update(buckets.get(key, ()))
+        if not candidates:
+            return None, 0.0
+        candidates = sorted(candidates)
+        similarities = (np.stack([self._signatures[i] for i in candidates]) == signature).mean(axis=1)
+        best = int(np.argmax(similarities))
+        if similarities[best] >= self.threshold:
+            return candidates[best], float(similarities[best])
+        return None, 0.0
+
+    def add(self, item: int, signature: np.ndarray) -> None:
+        assert item == len(self._signatures)
+        self._signatures.append(signature)
+        for band, buckets in enumerate(self._buckets):
+            key = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            buckets.setdefault(key, []).append(item)
+
+
+class SimHashIndex:
+    """
+    64-bit SimHash fingerprints of word shingles. By the pigeonhole principle,
+    fingerprints within `max_distance` bits agree exactly on at least one of
+    `max_distance + 1` blocks, which are used as LSH buckets.
+    """
+
+    def __init__(self, max_distance: int = 3, shingle_size: int = 3):
+        self.max_distance = max_distance
+        self.shingle_size = shingle_size
+        self.blocks = max_distance + 1
+        bounds = np.linspace(0, 64, self.blocks + 1).astype(int)
+        self._masks = [
+            ((1 << int(end)) - 1) ^ ((1 << int(start)) - 1) for start, end in zip(bounds[:-1], bounds[1:])
+        ]
+        self._buckets: List[Dict[int, List[int]]] = [{} for _ in range(self.blocks)]
+        self._fingerprints: List[int] = []
+
+    def signature(self, text: str) -> int:
+        digests = b"".join(
+            hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest()
+            for shingle in shingles(text, self.shingle_size)
+        )
+        bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8)).reshape(-1, 64)
+        # Each bit votes +1 or -1 per shingle.
+        votes = (2 * bits.astype(np.int32) - 1).sum(axis=0)
+        return int.from_bytes(np.packbits(votes > 0).tobytes(), "big")
+
+    def query(self, fingerprint: int) -> Tuple[Optional[int], float]:
+        candidates = set()
+        for block, mask in enumerate(self._masks):
+            candidates.update(self._buckets[block].get(fingerprint & mask, ()))
+        best, best_distance = None, self.max_distance + 1
+        for candidate in sorted(candidates):
+            distance = bin(self._fingerprints[candidate] ^ fingerprint).count("1")
+            if distance < best_distance:
+                best, best_distance = candidate, distance
+        if best is None:
+            return None, 0.0
+        return best, 1.0 - best_distance / 64
+
+    def add(self, item: int, fingerprint: int) -> None:
+        assert item == len(self._fingerprints)
+        self._fingerprints.append(fingerprint)
+        for block, mask in enumerate(self._masks):
+            self._buckets[block].setdefault(fingerprint & mask, []).append(item)
+
+
+class DuplicateChunk(JSONSerializable):
+    """
+    A chunk dropped by `ChunkDeduplicator`, and the chunk that was kept in
+    its place.
+    """
+
+    def __init__(
+        self,
+        chunk_hash: str,
+        survivor_hash: str,
+        kind: str,
+        similarity: float,
+        metadata: Dict[str, Any],
+        text: Optional[str] = None,
+    ):
+        self.chunk_hash = chunk_hash
+        self.survivor_hash = survivor_hash
+        self.kind = kind
+        self.similarity = similarity
+        self.metadata = metadata
+        # Kept so the chunk can be embedded if the kept one fails.
+        self.text = text
+
+
+class ChunkDeduplicator:
+    """
+    Drops exact and near-duplicate chunks across an ingestion run, e.g. the
+    navigation, cookie banners and footers repeated on every crawled page.
+
+    Exact duplicates are found by the hash of the whitespace-normalized text,
+    near duplicates with MinHash (Jaccard similarity of word shingles) or
+    SimHash (Hamming distance), both looked up in an LSH index.
+
+    Kept chunks get their text hash as `chunk_hash` metadata. Every dropped
+    chunk is recorded in `duplicates` with the hash of the chunk that was kept
+    in its place; once that chunk is inserted, `survivor_id` resolves it to
+    its vector store ID. If the kept chunk never got an ID, `requeue` returns
+    one of its duplicates to embed instead. `reset` starts a new run.
+
+    Args:
+        method (str): "minhash", "simhash" or "exact" to only drop exact
+            duplicates.
+        threshold (float): Minimum estimated Jaccard similarity of MinHash
+            near duplicates.
+        num_perm (int): MinHash permutations.
+        max_distance (int): Maximum Hamming distance of SimHash near
+            duplicates.
+        shingle_size (int): Words per shingle.
+    """
+
+    def __init__(
+        self,
+        method: str = "minhash",
+        threshold: float = 0.9,
+        num_perm: int = 128,
+        max_distance: int = 3,
+        shingle_size: int = 3,
+    ):
+        if method == "minhash":
+            self.index = MinHashIndex(num_perm=num_perm, threshold=threshold, shingle_size=shingle_size)
+        elif method == "simhash":
+            self.index = SimHashIndex(max_distance=max_distance, shingle_size=shingle_size)
+        elif method == "exact":
+            self.index = None
+        else:
+            raise ValueError(f"Unknown dedup method: {method}")
+        self.method = method
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Forget every chunk seen so far, so the next run starts empty.
+        """
+        with self._lock:
+            if isinstance(self.index, MinHashIndex):
+                self.index = MinHashIndex(
+                    num_perm=self.index.num_perm, threshold=self.index.threshold, shingle_size=self.index.shingle_size
+                )
+            elif isinstance(self.index, SimHashIndex):
+                self.index = SimHashIndex(max_distance=self.index.max_distance, shingle_size=self.index.shingle_size)
+            self.seen = 0
+            self.exact_duplicates = 0
+            self.near_duplicates = 0
+            self.duplicates: List[DuplicateChunk] = []
+            self._hashes: Dict[str, int] = {}
+            self._survivors: List[str] = []
+            self._vector_ids: Dict[str, str] = {}
+
+    def filter(self, chunks: List[ChunkOutput]) -> List[ChunkOutput]:
+        """
+        Drop the chunks that duplicate a chunk seen earlier in the run.
+
+        Returns:
+            List[ChunkOutput]: The chunks to embed, in input order.
+        """
+        kept = []
+        for chunk in chunks:
+            text = normalize_text(chunk.text)
+            chunk_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+            # Signatures are computed outside the lock; only lookups and
+            # index updates are serialized.
+            signature = self.index.signature(text) if self.index is not None else None
+
+            with self._lock:
+                self.seen += 1
+                survivor = self._hashes.get(chunk_hash)
+                if survivor is not None:
+                    self.exact_duplicates += 1
+                    self._drop(chunk, chunk_hash, survivor, "exact", 1.0)
+                    continue
+
+                if self.index is not None:
+                    survivor, similarity = self.index.query(signature)
+                    if survivor is not None:
+                        self.near_duplicates += 1
+                        self._drop(chunk, chunk_hash, survivor, "near", similarity)
+                        continue
+
+                item = len(self._survivors)
+                self._survivors.append(chunk_hash)
+                self._hashes[chunk_hash] = item
+                if self.index is not None:
+                    self.index.add(item, signature)
+
+            kept.append(ChunkOutput(text=chunk.text, metadata={**chunk.metadata, "chunk_hash": chunk_hash}))
+        return kept
+
+    def record_ids(self, metadatas: List[Dict[str, Any]], vector_ids: List[Optional[str]]) -> None:
+        """
+        Remember the vector store IDs of inserted chunks, so `survivor_id`
+        can resolve duplicates to them.
+        """
+        with self._lock:
+            for metadata, vector_id in zip(metadatas, vector_ids):
+                chunk_hash = (metadata or {}).get("chunk_hash")
+                if chunk_hash is not None and vector_id is not None:
+                    self._vector_ids[chunk_hash] = vector_id
+
+    def survivor_id(self, duplicate: DuplicateChunk) -> Optional[str]:
+        with self._lock:
+            return self._vector_ids.get(duplicate.survivor_hash)
+
+    def requeue(self) -> List[ChunkOutput]:
+        """
+        Duplicates to embed in place of kept chunks that have no vector
+        store ID, because their embedding or insert failed: one per such
+        chunk. Each becomes the kept chunk of the remaining duplicates of the
+        failed one, so a later call can requeue another if it fails too.
+
+        Returns:
+            List[ChunkOutput]: The chunks to embed and insert.
+        """
+        with self._lock:
+            replacements: Dict[str, str] = {}
+            chunks = []
+            remaining = []
+            for duplicate in self.duplicates:
+                survivor = duplicate.survivor_hash
+                if survivor in self._vector_ids:
+                    remaining.append(duplicate)
+                elif survivor in replacements:
+                    duplicate.survivor_hash = replacements[survivor]
+                    remaining.append(duplicate)
+                elif duplicate.text is not None:
+                    replacements[survivor] = duplicate.chunk_hash
+                    chunks.append(
+                        ChunkOutput(text=duplicate.text, metadata={**duplicate.metadata, "chunk_hash": duplicate.chunk_hash})
+                    )
+                else:
+                    remaining.append(duplicate)
+            self.duplicates = remaining
+            return chunks
+
+    @property
+    def embeddings_saved(self) -> int:
+        return self.exact_duplicates + self.near_duplicates
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "seen": self.seen,
+                "kept": len(self._survivors),
+                "exact_duplicates": self.exact_duplicates,
+                "near_duplicates": self.near_duplicates,
+                "embeddings_saved": self.embeddings_saved,
+            }
+
+    def _drop(self, chunk: ChunkOutput, chunk_hash: str, survivor: int, kind: str, similarity: float) -> None:
+        self.duplicates.append(
+            DuplicateChunk(chunk_hash, self._survivors[survivor], kind, similarity, dict(chunk.metadata), chunk.text)
+        )
@@ -1,7 +1,12 @@
+import asyncio
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
 
+import numpy as np
+
+from ..utils.aio import AsyncLimiter, run_in_thread
 from ..utils.serializable import JSONSerializable
+from .quantization import vector_type
 
 
 class EmbeddingOutput(JSONSerializable):
@@ -11,22 +16,284 @@ class EmbeddingOutput(JSONSerializable):
         self.metadata = metadata
 
 
+class EmbeddingRow:
+    """
+    View of one row of an EmbeddingBatch. `vector` is a view into the
+    batch's matrix, not a copy.
+    """
+
+    __slots__ = ("batch", "index")
+
+    def __init__(self, batch: "EmbeddingBatch", index: int):
+        self.batch = batch
+        self.index = index
+
+    @property
+    def vector(self) -> np.ndarray:
+        return self.batch.vectors[self.index]
+
+    @property
+    def text(self) -> str:
+        return self.batch.texts[self.index]
+
+    @property
+    def metadata(self) -> Optional[dict]:
+        return self.batch.metadata[self.index]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"vector": self.vector.tolist(), "text": self.text, "metadata": self.metadata}
+
+
+class EmbeddingBatch:
+    """
+    Columnar batch of embeddings: one contiguous matrix with a row per text,
+    and parallel lists of texts and metadata. The matrix is float32, or the
+    int8 or packed binary (uint8) output of EmbeddingQuantizer.
+
+    Iterating or indexing yields `EmbeddingRow` views with the same
+    `vector`, `text` and `metadata` attributes as EmbeddingOutput; slicing
+    yields a batch that shares the matrix.
+    """
+
+    __slots__ = ("vectors", "texts", "metadata")
+
+    def __init__(self, vectors: np.ndarray, texts: List[str], metadata: Optional[List[Optional[dict]]] = None):
+        vectors = np.asarray(vectors)
+        if vectors.dtype not in (np.int8, np.uint8):
+            vectors = vectors.astype(np.float32, copy=False)
+        if vectors.ndim != 2:
+            vectors = vectors.reshape(len(texts), -1)
+        if len(vectors) != len(texts):
+            raise ValueError(f"Got {len(vectors)} vectors for {len(texts)} texts")
+        self.vectors = vectors
+        self.texts = texts
+        self.metadata = metadata if metadata is not None else [None] * len(texts)
+
+    @property
+    def vector_type(self) -> str:
+        """
+        "float", "int8" or "binary".
+        """
+        return vector_type(self.vectors)
+
+    @property
+    def dimension(self) -> int:
+        # Binary vectors hold eight components per byte.
+        return self.vectors.shape[1] * (8 if self.vector_type == "binary" else 1)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __iter__(self) -> Iterator[EmbeddingRow]:
+        return (EmbeddingRow(self, index) for index in range(len(self.texts)))
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[EmbeddingRow, "EmbeddingBatch"]:
+        if isinstance(index, slice):
+            return EmbeddingBatch(self.vectors[index], self.texts[index], self.metadata[index])
+        if index < 0:
+            index += len(self.texts)
+        if not 0 <= index < len(self.texts):
+            raise IndexError("EmbeddingBatch index out of range")
+        return EmbeddingRow(self, index)
+
+    def to_outputs(self) -> List[EmbeddingOutput]:
+        return [
+            EmbeddingOutput(vector=vector, text=text, metadata=metadata)
+            for vector, text, metadata in zip(self.vectors.tolist(), self.texts, self.metadata)
+        ]
+
+    @classmethod
+    def from_outputs(cls, embeddings: Iterable[Any]) -> "EmbeddingBatch":
+        """
+        Build a batch from anything with `vector`, `text` and `metadata`
+        attributes, such as EmbeddingOutputs or the rows of other batches.
+        Consecutive rows of a single batch are sliced without copying.
+        """
+        if isinstance(embeddings, EmbeddingBatch):
+            return embeddings
+        embeddings = list(embeddings)
+        if not embeddings:
+            return cls(np.zeros((0, 0), dtype=np.float32), [], [])
+
+        first = embeddings[0]
+        if isinstance(first, EmbeddingRow) and all(
+            isinstance(row, EmbeddingRow) and row.batch is first.batch and row.index == first.index + i
+            for i, row in enumerate(embeddings)
+        ):
+            return first.batch[first.index:first.index + len(embeddings)]
+
+        return cls(
+            np.stack([np.asarray(embedding.vector) for embedding in embeddings]),
+            [embedding.text for embedding in embeddings],
+            [embedding.metadata for embedding in embeddings],
+        )
+
+    @classmethod
+    def concat(cls, batches: List["EmbeddingBatch"]) -> "EmbeddingBatch":
+        batches = [batch for batch in batches if len(batch)]
+        if not batches:
+            return cls(np.zeros((0, 0), dtype=np.float32), [], [])
+        if len(batches) == 1:
+            return batches[0]
+        return cls(
+            np.concatenate([batch.vectors for batch in batches]),
+            [text for batch in batches for text in batch.texts],
+            [metadata for batch in batches for metadata in batch.metadata],
+        )
+
+
 class BaseEmbedder(ABC):
+    # Defaults used to size requests in embed_batch. Subclasses and configs
+    # override them with the limits of the actual backend.
+    max_batch_size: int = 256
+    max_batch_tokens: int = 100_000
+    # Requests retried so far; embedders that retry keep it up to date.
+    retries: int = 0
+
     def __init__(self, config: dict):
-        self.config = config
+        self.config = config or {}
+        self.max_batch_size = self.config.get("batch_size", self.max_batch_size)
+        self.max_batch_tokens = self.config.get("batch_tokens", self.max_batch_tokens)
+        # Bounds the number of requests the async methods keep in flight.
+        self.limiter = AsyncLimiter(self.config.get("concurrency", 4))
 
     @abstractmethod
-    def embed(self, texts: List[str]) -> List[float]:
+    def embed(self, text: str) -> List[float]:
+        """
+        Embed a single text into its vector representation.
+
+        Args:
+            text (str): The text to embed.
+
+        Returns:
+            List[float]: The vector representation of the text.
+        """
+        pass
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
         """
         Embed a list of texts into a list of vector representations.
 
+        The default implementation calls `embed` once per text. Backends that
+        accept several inputs per request should override it and send one
+        request per batch from `iter_batches`.
+
         Args:
             texts (List[str]): A list of texts to embed.
 
         Returns:
-            List[List[float]]: A list of vector representations.
+            List[List[float]]: A list of vector representations, in input order.
         """
-        pass
+        return [self.embed(text) for text in texts]
+
+    def embed_matrix(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed texts into a float32 matrix with one row per text, the format
+        of EmbeddingBatch.
+
+        The default implementation converts the output of `embed_batch`.
+        Backends that can produce arrays directly should override it.
+
+        Args:
+            texts (List[str]): The texts to embed.
+
+        Returns:
+            np.ndarray: A (len(texts), dimension) float32 matrix.
+        """
+        return np.asarray(self.embed_batch(texts), dtype=np.float32).reshape(len(texts), -1)
+
+    async def aembed_matrix(self, texts: List[str]) -> np.ndarray:
+        """
+        Async counterpart of `embed_matrix`. The default implementation
+        converts the output of `aembed_batch`.
+        """
+        return np.asarray(await self.aembed_batch(texts), dtype=np.float32).reshape(len(texts), -1)
+
+    async def aembed(self, text: str) -> List[float]:
+        """
+        Async counterpart of `embed`. The default implementation runs `embed`
+        in a worker thread.
+        """
+        async with self.limiter:
+            return await run_in_thread(self.embed, text)
+
+    async def aembed_batch(self, texts: List[str]) -> List[List[float]]:
+        """
+        Async counterpart of `embed_batch`. The default implementation runs
+        each batch from `iter_batches` in a worker thread, with up to
+        `concurrency` batches in flight.
+        """
+
+        async def embed_one(batch: List[str]) -> List[List[float]]:
+            async with self.limiter:
+                return await run_in_thread(self.embed_batch, batch)
+
+        results = await asyncio.gather(*(embed_one(batch) for batch in self.iter_batches(texts)))
+        return [vector for vectors in results for vector in vectors]
+
+    def close(self) -> None:
+        """
+        Release clients, thread pools and other resources. The default
+        implementation does nothing.
+        """
+
+    async def aclose(self) -> None:
+        """
+        Async counterpart of `close`, for embedders whose async clients must
+        be closed on the event loop they ran on. The default implementation
+        calls `close`.
+        """
+        self.close()
+
+    def cache_key(self) -> Dict[str, Any]:
+        """
+        Settings that determine the vectors, which namespace the entries of
+        a CachedEmbedder. Subclasses return only what changes their output,
+        so that tuning timeouts, quotas or batch sizes keeps the cache. The
+        default implementation returns the whole config.
+        """
+        return dict(self.config)
+
+    def count_tokens(self, text: str) -> int:
+        """
+        Estimate the number of tokens in a text, used to size batches.
+
+        Args:
+            text (str): The text to measure.
+
+        Returns:
+            int: The estimated token count.
+        """
+        # Roughly four characters per token for English text.
+        return len(text) // 4 + 1
+
+    def iter_batches(self, texts: List[str]) -> Iterator[List[str]]:
+        """
+        Split texts into consecutive batches bounded by both item count and
+        token budget. A single text larger than the token budget is sent on
+        its own.
+
+        Args:
+            texts (List[str]): The texts to batch.
+
+        Yields:
+            List[str]: Consecutive batches of texts.
+        """
+        batch = []
+        batch_tokens = 0
+        for text in texts:
+            tokens = self.count_tokens(text)
+            if batch and (
+                len(batch) >= self.max_batch_size
+                or batch_tokens + tokens > self.max_batch_tokens
+            ):
+                yield batch
+                batch = []
+                batch_tokens = 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch:
+            yield batch
 
     @classmethod
     @abstractmethod
@@ -0,0 +1,231 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import unicodedata
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from ..logger import RAGnarokLogger
+from .base import BaseEmbedder
+
+# Keys that hold credentials, left out of cache namespaces, along
+# with any key ending in one of SECRET_SUFFIXES.
+SECRET_KEYS = {"token", "secret", "password", "credentials", "headers"}
+SECRET_SUFFIXES = ("_key", "_token", "_secret", "_password")
+
+
+class CachedEmbedder(BaseEmbedder):
+    """
+    Wraps an embedder with a persistent, content-addressed cache.
+
+    Vectors are stored as float32 blobs in a local SQLite database, keyed on a
+    hash of the namespace and the normalized text, so unchanged chunks are
+    never embedded twice. Unless one is given, the namespace follows the
+    wrapped embedder's `cache_key`, so settings that change the vectors,
+    such as a refit IDF, never reuse stale entries. The least recently used entries are evicted
+    once the cache holds more than `max_entries` vectors.
+
+    Config keys:
+        embedder_type (str): Embedder to wrap, only used by `from_config`.
+        embedder_config (dict): Config of the wrapped embedder, only used by
+            `from_config`.
+        path (str): SQLite database file. Defaults to "ragnarok_embeddings.db".
+        max_entries (int): Maximum number of cached vectors. Defaults to 1,000,000.
+    """
+
+    def __init__(self, embedder: BaseEmbedder, config: dict, namespace: Optional[str] = None):
+        super().__init__(config)
+        self.embedder = embedder
+        self._namespace = namespace
+        self.max_batch_size = embedder.max_batch_size
+        self.max_batch_tokens = embedder.max_batch_tokens
+        self.limiter = embedder.limiter
+        self.path = self.config.get("path", "ragnarok_embeddings.db")
+        self.max_entries = self.config.get("max_entries", 1_000_000)
+        self.logger = RAGnarokLogger.get_logger()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+        )
+        self._conn.commit()
+        self._size, self._clock = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(MAX(last_used), 0) FROM embeddings"
+        ).fetchone()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+    @property
+    def namespace(self) -> str:
+        if self._namespace is not None:
+            return self._namespace
+        return self.namespace_for(type(self.embedder).__name__, self.embedder.cache_key())
+
+    def key(self, text: str, namespace: Optional[str] = None) -> str:
+        payload = f"{namespace or self.namespace}\0{self.normalize(text)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def embed(self, text: str) -> List[float]:
+        return self.embed_batch([text])[0]
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_matrix(texts).tolist()
+
+    def embed_matrix(self, texts: List[str]) -> np.ndarray:
+        keys, vectors, missing = self._lookup(texts)
+        if missing:
+            computed = self.embedder.embed_matrix(list(missing.values()))
+            self._store(keys, vectors, missing, computed)
+        return self._stack(vectors)
+
+    async def aembed(self, text: str) -> List[float]:
+        return (await self.aembed_batch([text]))[0]
+
+    async def aembed_batch(self, texts: List[str]) -> List[List[float]]:
+        return (await self.aembed_matrix(texts)).tolist()
+
+    async def aembed_matrix(self, texts: List[str]) -> np.ndarray:
+        keys, vectors, missing = self._lookup(texts)
+        if missing:
+            computed = await self.embedder.aembed_matrix(list(missing.values()))
+            self._store(keys, vectors, missing, computed)
+        return self._stack(vectors)
+
+    def count_tokens(self, text: str) -> int:
+        return self.embedder.count_tokens(text)
+
+    def cache_key(self) -> Dict:
+        return self.embedder.cache_key()
+
+    @property
+    def retries(self) -> int:
+        return self.embedder.retries
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": self._size,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+        self.embedder.close()
+
+    async def aclose(self) -> None:
+        with self._lock:
+            self._conn.close()
+        await self.embedder.aclose()
+
+    def _lookup(self, texts: List[str]):
+        """
+        Resolve cached vectors. Returns the key of every text, the vectors
+        with `None` for misses, and the distinct missing texts by key.
+        """
+        namespace = self.namespace
+        keys = [self.key(text, namespace) for text in texts]
+        found = {}
+        with self._lock:
+            unique = list(set(keys))
+            # Stay below SQLite's limit on the number of bound parameters.
+            for start in range(0, len(unique), 500):
+                part = unique[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})",
+                    part,
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+            if found:
+                self._clock += 1
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(self._clock, key) for key in found],
+                )
+                self._conn.commit()
+
+        vectors: List[Optional[np.ndarray]] = []
+        missing = {}
+        for key, text in zip(keys, texts):
+            vector = found.get(key)
+            vectors.append(vector)
+            if vector is None:
+                missing.setdefault(key, text)
+
+        with self._lock:
+            misses = sum(1 for vector in vectors if vector is None)
+            self.misses += misses
+            self.hits += len(vectors) - misses
+        return keys, vectors, missing
+
+    def _store(self, keys, vectors, missing, computed) -> None:
+        by_key = dict(zip(missing.keys(), computed))
+        for i, key in enumerate(keys):
+            if vectors[i] is None:
+                vectors[i] = by_key[key]
+
+        with self._lock:
+            self._clock += 1
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes(), self._clock) for key, vector in by_key.items()],
+            )
+            self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if self._size > self.max_entries:
+                excess = self._size - self.max_entries
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                )
+                self.evictions += excess
+                self._size -= excess
+                self.logger.debug(f"Evicted {excess} entries from the embedding cache")
+            self._conn.commit()
+
+    @staticmethod
+    def _stack(vectors: List[np.ndarray]) -> np.ndarray:
+        if not vectors:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack(vectors)
+
+    @staticmethod
+    def namespace_for(embedder_type: str, cache_key: Optional[dict]) -> str:
+        """
+        Cache namespace of an embedder: its type, model and a hash of its
+        `cache_key`, secrets left out. Embedders that produce different
+        vectors never share cache entries.
+        """
+        config = {
+            key: value
+            for key, value in (cache_key or {}).items()
+            if key.lower() not in SECRET_KEYS and not key.lower().endswith(SECRET_SUFFIXES)
+        }
+        digest = hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        return f"{embedder_type}:{config.get('model', '')}:{digest[:16]}"
+
+    @classmethod
+    def from_config(cls, config: dict) -> "CachedEmbedder":
+        from . import get_embedder
+
+        embedder_type = config["embedder_type"]
+        embedder_config = config.get("embedder_config") or {}
+        return cls(get_embedder(embedder_type, embedder_config), config)
@@ -0,0 +1,222 @@
+import hashlib
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .base import BaseEmbedder
+
+_MULTIPLIER = np.uint64(0x100000001B3)
+# Multiplicative inverse of _MULTIPLIER modulo 2^64.
+_INVERSE = np.uint64(pow(0x100000001B3, 2 ** 63 - 1, 2 ** 64))
+_MIX = np.uint64(0xFF51AFD7ED558CCD)
+_SEPARATOR = 0xFF
+# Bytes that belong to words: ASCII letters and digits, and every byte of
+# a multi-byte UTF-8 character.
+_WORD_BYTES = np.zeros(256, dtype=bool)
+_WORD_BYTES[[ord(c) for c in "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"]] = True
+_WORD_BYTES[0x80:0xFF] = True
+
+
+class HashingEmbedder(BaseEmbedder):
+    """
+    Embeds text without model weights or network access by hashing its word
+    or character n-grams into a fixed number of signed buckets. Optionally the
+    bucket counts are weighted by inverse document frequency learned with
+    `fit`, which gives a TF-IDF vector in the hashed space.
+
+    A whole batch is hashed at once: the UTF-8 bytes of all texts are
+    concatenated into one array, word and n-gram hashes are computed over it
+    with NumPy, and the buckets of every text are counted with one
+    `bincount` per n-gram size. Vectors are L2-normalized, so inner products
+    are cosine similarities.
+
+    Config keys:
+        dimension (int): Vector size. Defaults to 512.
+        analyzer (str): "word" (default) for n-grams of words, or "char"
+            for n-grams of UTF-8 bytes.
+        ngram_range (List[int]): Smallest and largest n-gram size. Defaults
+            to [1, 2] words or [3, 5] bytes.
+        lowercase (bool): Lowercase texts first. Defaults to True.
+        sublinear_tf (bool): Use 1 + log(count) instead of raw counts.
+            Defaults to True.
+        idf_path (str): `.npy` file with document frequencies saved by
+            `save_idf`, loaded if it exists.
+        batch_size (int): Texts hashed at once. Defaults to 4096.
+    """
+
+    # Batches are bounded by memory rather than by an API limit.
+    max_batch_size = 4096
+    max_batch_tokens = 10_000_000
+
+    def __init__(self, config: dict):
+        super().__init__(config)
+        self.dimension = self.config.get("dimension", 512)
+        self.analyzer = self.config.get("analyzer", "word")
+        if self.analyzer not in ("word", "char"):
+            raise ValueError(f"Unknown analyzer: {self.analyzer}")
+        default_range = (1, 2) if self.analyzer == "word" else (3, 5)
+        self.ngram_range = tuple(self.config.get("ngram_range", default_range))
+        self.lowercase = self.config.get("lowercase", True)
+        self.sublinear_tf = self.config.get("sublinear_tf", True)
+        self.idf_path = self.config.get("idf_path")
+        if self.dimension <= 0:
+            raise ValueError("dimension must be greater than 0")
+        if not 0 < self.ngram_range[0] <= self.ngram_range[1]:
+            raise ValueError("ngram_range must be two increasing positive sizes")
+
+        # Document frequency of every bucket, and the number of documents.
+        self.document_frequency: Optional[np.ndarray] = None
+        self.documents = 0
+        self.idf: Optional[np.ndarray] = None
+        self._idf_digest: Optional[str] = None
+        self._power_table = np.zeros(0, dtype=np.uint64)
+        self._inverse_power_table = np.zeros(0, dtype=np.uint64)
+        if self.idf_path and os.path.exists(self.idf_path):
+            self.load_idf(self.idf_path)
+
+    def cache_key(self) -> Dict[str, Any]:
+        # The IDF weights change the vectors too, so a refit or reloaded IDF
+        # gets a new namespace.
+        return {
+            "dimension": self.dimension,
+            "analyzer": self.analyzer,
+            "ngram_range": list(self.ngram_range),
+            "lowercase": self.lowercase,
+            "sublinear_tf": self.sublinear_tf,
+            "idf": self._idf_digest,
+        }
+
+    def embed(self, text: str) -> List[float]:
+        return self.embed_matrix([text])[0].tolist()
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_matrix(texts).tolist()
+
+    def embed_matrix(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed texts into a float32 matrix with one row per text.
+        """
+        matrix = np.empty((len(texts), self.dimension), dtype=np.float32)
+        start = 0
+        for batch in self.iter_batches(texts):
+            counts = self.hash_counts(batch)
+            if self.sublinear_tf:
+                counts = np.sign(counts) * np.log1p(np.abs(counts))
+            if self.idf is not None:
+                counts *= self.idf
+            norms = np.linalg.norm(counts, axis=1, keepdims=True)
+            matrix[start:start + len(batch)] = counts / np.maximum(norms, 1e-12)
+            start += len(batch)
+        return matrix
+
+    def hash_counts(self, texts: List[str]) -> np.ndarray:
+        """
+        Signed counts of the hashed n-grams of every text.
+
+        Returns:
+            np.ndarray: A (len(texts), dimension) float32 matrix.
+        """
+        if self.lowercase:
+            texts = [text.lower() for text in texts]
+        # 0xFF never occurs in UTF-8, so it separates texts unambiguously.
+        data = np.frombuffer(b"\xff".join(text.encode("utf-8") for text in texts), dtype=np.uint8)
+        # Twice the index of the text of every byte. Separators get the odd
+        # number in between, so no n-gram that contains one is valid.
+        separators = data == _SEPARATOR
+        rows = 2 * np.cumsum(separators, dtype=np.int64) - separators
+
+        if self.analyzer == "word":
+            hashes, rows = self._word_hashes(data, rows)
+        else:
+            hashes = data.astype(np.uint64)
+
+        indexes, signs = [], []
+        ngrams = hashes
+        low, high = self.ngram_range
+        for n in range(1, min(high, len(hashes)) + 1):
+            if n > 1:
+                ngrams = ngrams[:-1] * _MULTIPLIER + hashes[n - 1:]
+            if n < low:
+                continue
+            # Only n-grams within a single text.
+            valid = rows[:len(ngrams)] == rows[n - 1:]
+            mixed = self._mix(ngrams[valid] + np.uint64(n))
+            buckets = (mixed >> np.uint64(1)) % np.uint64(self.dimension)
+            indexes.append((rows[:len(ngrams)][valid] >> 1) * self.dimension + buckets.astype(np.int64))
+            signs.append(1.0 - 2.0 * (mixed & np.uint64(1)))
+
+        size = len(texts) * self.dimension
+        if not indexes:
+            return np.zeros((len(texts), self.dimension), dtype=np.float32)
+        counts = np.bincount(np.concatenate(indexes), weights=np.concatenate(signs), minlength=size)
+        return counts.reshape(len(texts), self.dimension).astype(np.float32)
+
+    def _word_hashes(self, data: np.ndarray, rows: np.ndarray):
+        """
+        Hash every word, a run of letters, digits or non-ASCII bytes.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The hash and the text of every word.
+        """
+        is_word = _WORD_BYTES[data]
+        edges = np.flatnonzero(np.diff(is_word, prepend=False, append=False))
+        starts, ends = edges[0::2], edges[1::2]
+
+        # Polynomial hashes of all words from one prefix sum: with
+        # prefix[i] = sum(data[j] * M^-j for j < i), the hash of data[s:e] is
+        # (prefix[e] - prefix[s]) * M^(e-1), all modulo 2^64.
+        powers, inverse_powers = self._powers(len(data))
+        prefix = np.zeros(len(data) + 1, dtype=np.uint64)
+        np.cumsum(data.astype(np.uint64) * inverse_powers, out=prefix[1:])
+        hashes = (prefix[ends] - prefix[starts]) * powers[ends - 1]
+        return hashes, rows[starts]
+
+    def _powers(self, size: int):
+        if len(self._power_table) < size:
+            length = max(size, 2 * len(self._power_table), 1024)
+            powers = np.cumprod(np.full(length, _MULTIPLIER, dtype=np.uint64))
+            inverse_powers = np.cumprod(np.full(length, _INVERSE, dtype=np.uint64))
+            # Shift so that index j holds M^j and M^-j.
+            powers = np.concatenate(([np.uint64(1)], powers[:-1]))
+            inverse_powers = np.concatenate(([np.uint64(1)], inverse_powers[:-1]))
+            self._power_table, self._inverse_power_table = powers, inverse_powers
+        return self._power_table[:size], self._inverse_power_table[:size]
+
+    @staticmethod
+    def _mix(hashes: np.ndarray) -> np.ndarray:
+        # Final avalanche step of MurmurHash3, so similar n-grams spread
+        # over all buckets.
+        hashes = hashes ^ (hashes >> np.uint64(33))
+        hashes = hashes * _MIX
+        return hashes ^ (hashes >> np.uint64(33))
+
+    def fit(self, texts: List[str]) -> "HashingEmbedder":
+        """
+        Add texts to the document frequencies used for IDF weighting. Can be
+        called repeatedly, e.g. once per batch of a corpus.
+        """
+        if self.document_frequency is None:
+            self.document_frequency = np.zeros(self.dimension, dtype=np.int64)
+        for batch in self.iter_batches(texts):
+            self.document_frequency += (self.hash_counts(batch) != 0).sum(axis=0)
+            self.documents += len(batch)
+        self._update_idf()
+        return self
+
+    def save_idf(self, path: str) -> None:
+        np.save(path, np.append(self.document_frequency, self.documents))
+
+    def load_idf(self, path: str) -> None:
+        values = np.load(path)
+        self.document_frequency, self.documents = values[:-1], int(values[-1])
+        self._update_idf()
+
+    def _update_idf(self) -> None:
+        # Smoothed IDF, as in scikit-learn's TfidfTransformer.
+        self.idf = (np.log((1 + self.documents) / (1 + self.document_frequency)) + 1).astype(np.float32)
+        self._idf_digest = hashlib.sha256(self.idf.tobytes()).hexdigest()[:16]
+
+    @classmethod
+    def from_config(cls, config: dict) -> "HashingEmbedder":
+        return cls(config)
@@ -1,37 +1,241 @@
+import asyncio
+import base64
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
-from typing import List
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from ..logger import RAGnarokLogger
+from ..utils.ratelimit import RequestScheduler, RetryDecision, parse_retry_after
 from .base import BaseEmbedder
-from openai import OpenAI
+import openai
+from openai import AsyncOpenAI, OpenAI
 
 class ModelEnum(Enum):
     text_embedding_3_small = "text-embedding-3-small"
     text_embedding_3_large = "text-embedding-3-large"
     text_embedding_ada_002 = "text-embedding-ada-002"
 
+# Output size of each model, and whether it accepts `dimensions`.
+MODEL_DIMENSIONS = {
+    ModelEnum.text_embedding_3_small: (1536, True),
+    ModelEnum.text_embedding_3_large: (3072, True),
+    ModelEnum.text_embedding_ada_002: (1536, False),
+}
+
+# Transient server errors worth retrying.
+RETRYABLE_STATUS = {408, 409, 500, 502, 503, 504}
+
 class OpenAIEmbedder(BaseEmbedder):
+    """
+    Embeds with the OpenAI embeddings API.
+
+    Requests go through a RequestScheduler that keeps within the account's
+    requests and tokens per minute, adapts the number of concurrent requests
+    to the observed latency and rate limit errors, and retries rate limits
+    and transient errors, honoring `Retry-After`. Batches of `embed_matrix`
+    are sent concurrently from a thread pool; all requests share the
+    connection pool of one client.
+
+    Config keys:
+        api_key (str): API key.
+        model (str): Embedding model.
+        dimensions (int): Output size. The text-embedding-3 models return
+            the first `dimensions` components of their full vector,
+            renormalized. Defaults to the model's full size.
+        base_url (str): API endpoint, e.g. a proxy or a local stand-in.
+        timeout (float): Seconds per request. Defaults to 60.
+        requests_per_minute (int): Request quota. Unlimited by default.
+        tokens_per_minute (int): Token quota. Unlimited by default.
+        concurrency (int): Initial concurrent requests. Defaults to 4.
+        max_concurrency (int): Maximum concurrent requests. Defaults to 64.
+        max_retries (int): Retries per request. Defaults to 6.
+    """
+
+    # The API accepts up to 2048 inputs and 300k tokens per request; the token
+    # budget leaves headroom for the approximate count in `count_tokens`.
+    max_batch_size = 2048
+    max_batch_tokens = 200_000
+
     def __init__(self, config: dict):
         super().__init__(config)
-        self.client = OpenAI(api_key=config["api_key"])
+        # Retries are left to the scheduler, which shares backoff across
+        # requests.
+        client_kwargs = {
+            "api_key": config["api_key"],
+            "base_url": config.get("base_url"),
+            "timeout": config.get("timeout", 60.0),
+            "max_retries": 0,
+        }
+        self.client = OpenAI(**client_kwargs)
+        self.async_client = AsyncOpenAI(**client_kwargs)
         self.model = ModelEnum(config["model"])
+        self.dimensions = config.get("dimensions")
+        full_dimension, shortenable = MODEL_DIMENSIONS[self.model]
+        if self.dimensions is not None and not shortenable:
+            raise ValueError(f"{self.model.value} does not support `dimensions`")
+        if self.dimensions is not None and not 0 < self.dimensions <= full_dimension:
+            raise ValueError(f"dimensions must be between 1 and {full_dimension}")
+        self.dimension = self.dimensions or full_dimension
+        self.max_concurrency = config.get("max_concurrency", 64)
+        self.scheduler = RequestScheduler(
+            requests_per_minute=config.get("requests_per_minute"),
+            tokens_per_minute=config.get("tokens_per_minute"),
+            concurrency=config.get("concurrency", 4),
+            max_concurrency=self.max_concurrency,
+            max_retries=config.get("max_retries", 6),
+            classify=self.classify,
+        )
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Event loop the async client's connections belong to, once used.
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.logger = RAGnarokLogger.get_logger()
+
+    def cache_key(self) -> Dict[str, Any]:
+        return {"model": self.model.value, "dimensions": self.dimensions}
 
     def embed(self, input_text: str) -> List[float]:
-        response = self.client.embeddings.create(
-            input=input_text,
-            model=self.model.value
+        return self.embed_matrix([input_text])[0].tolist()
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_matrix(texts).tolist()
+
+    def embed_matrix(self, texts: List[str]) -> np.ndarray:
+        batches = list(self.iter_batches(texts))
+        if len(batches) <= 1:
+            return self._stack([self._embed_one(batch) for batch in batches], len(texts))
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrency, thread_name_prefix="ragnarok-openai"
+            )
+        return self._stack(list(self._executor.map(self._embed_one, batches)), len(texts))
+
+    def _embed_one(self, batch: List[str]) -> np.ndarray:
+        # Vectors are requested as base64 float32, which decodes straight
+        # into the matrix without a Python float per dimension.
+        response = self.scheduler.call(
+            lambda: self.client.embeddings.create(
+                input=batch,
+                encoding_format="base64",
+                **self._model_kwargs()
+            ),
+            tokens=sum(self.count_tokens(text) for text in batch),
         )
-        return response.data[0].embedding
+        return self._decode(response, len(batch))
+
+    async def aembed(self, input_text: str) -> List[float]:
+        return (await self.aembed_matrix([input_text]))[0].tolist()
+
+    async def aembed_batch(self, texts: List[str]) -> List[List[float]]:
+        return (await self.aembed_matrix(texts)).tolist()
+
+    async def aembed_matrix(self, texts: List[str]) -> np.ndarray:
+        self._async_loop = asyncio.get_running_loop()
+
+        async def embed_one(batch: List[str]) -> np.ndarray:
+            response = await self.scheduler.acall(
+                lambda: self.async_client.embeddings.create(
+                    input=batch,
+                    encoding_format="base64",
+                    **self._model_kwargs()
+                ),
+                tokens=sum(self.count_tokens(text) for text in batch),
+            )
+            return self._decode(response, len(batch))
+
+        batches = await asyncio.gather(*(embed_one(batch) for batch in self.iter_batches(texts)))
+        return self._stack(batches, len(texts))
+
+    def _model_kwargs(self) -> dict:
+        if self.dimensions is None:
+            return {"model": self.model.value}
+        return {"model": self.model.value, "dimensions": self.dimensions}
+
+    @staticmethod
+    def classify(exc: BaseException) -> Optional[RetryDecision]:
+        """
+        Decide whether a failed request is retried, see RequestScheduler.
+        """
+        if isinstance(exc, openai.RateLimitError):
+            # An exhausted balance is reported as a rate limit too, but
+            # waiting does not help.
+            if getattr(exc, "code", None) == "insufficient_quota":
+                return None
+            return True, parse_retry_after(exc.response.headers)
+        if isinstance(exc, openai.APIStatusError):
+            if exc.status_code in RETRYABLE_STATUS or exc.status_code >= 500:
+                return False, parse_retry_after(exc.response.headers)
+            return None
+        if isinstance(exc, openai.APIConnectionError):
+            return False, None
+        return None
+
+    @property
+    def retries(self) -> int:
+        return self.scheduler.retries
+
+    def stats(self) -> dict:
+        return self.scheduler.stats()
+
+    def close(self) -> None:
+        """
+        Close both clients and the thread pool. The async client is closed
+        on the event loop it was used on; from async code, prefer `aclose`.
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        self.client.close()
+        self._close_async_client()
+
+    async def aclose(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        self.client.close()
+        self._async_loop = None
+        await self.async_client.close()
+
+    def _close_async_client(self) -> None:
+        loop, self._async_loop = self._async_loop, None
+        if loop is None:
+            # Never used, so it holds no connections.
+            return
+        try:
+            if loop.is_closed():
+                # Open connections can no longer be closed cleanly; this
+                # releases the pool, and aclose avoids the case.
+                asyncio.run(self.async_client.close())
+            elif not loop.is_running():
+                loop.run_until_complete(self.async_client.close())
+            else:
+                future = asyncio.run_coroutine_threadsafe(self.async_client.close(), loop)
+                try:
+                    running = asyncio.get_running_loop()
+                except RuntimeError:
+                    running = None
+                # Blocking on the loop's own thread would deadlock it.
+                if running is not loop:
+                    future.result(timeout=30)
+        except Exception as e:
+            self.logger.warning(
+                f"Failed to close the async OpenAI client: {e}. "
+                "Call `aclose` before the event loop it was used on ends."
+            )
+
+    @staticmethod
+    def _decode(response, count: int) -> np.ndarray:
+        data = sorted(response.data, key=lambda item: item.index)
+        vectors = [np.frombuffer(base64.b64decode(item.embedding), dtype=np.float32) for item in data]
+        return np.stack(vectors) if vectors else np.zeros((count, 0), dtype=np.float32)
+
+    @staticmethod
+    def _stack(batches: List[np.ndarray], count: int) -> np.ndarray:
+        if not batches:
+            return np.zeros((count, 0), dtype=np.float32)
+        return np.concatenate(batches) if len(batches) > 1 else batches[0]
 
     @classmethod
     def from_config(cls, config: dict) -> 'OpenAIEmbedder':
         return cls(config)
-
-# Example usage
-# config = EmbedderConfig(
-#     embedder_type="openai",
-#     embedder_model="text-embedding-3-small",
-#     api_key="your-api-key-here",
-#     openai_config={}  # Add any OpenAI-specific config here if needed
-# )
-# embedder = OpenAIEmbedder.from_config(config)
-# vector = embedder.embed("Your text string goes here")
-# print(vector)
\ No newline at end of file
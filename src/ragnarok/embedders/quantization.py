@@ -0,0 +1,97 @@
+import math
+from typing import Optional
+
+import numpy as np
+
+VECTOR_TYPES = ("float", "int8", "binary")
+# int8 values cover this many standard deviations of a component of a
+# random unit vector; the rare larger components are clipped.
+INT8_SIGMAS = 4.0
+
+
+def vector_type(vectors: np.ndarray) -> str:
+    """
+    Storage type of a matrix produced by EmbeddingQuantizer: "float",
+    "int8", or "binary" for sign bits packed eight per uint8.
+    """
+    if vectors.dtype == np.int8:
+        return "int8"
+    if vectors.dtype == np.uint8:
+        return "binary"
+    return "float"
+
+
+class EmbeddingQuantizer:
+    """
+    Shrinks embeddings before they are stored.
+
+    Vectors are optionally truncated to their first `dimensions` components
+    (for Matryoshka-trained models whose API cannot do it), renormalized to
+    unit length, and stored as float32, as int8 or as one sign bit per
+    component. int8 takes a quarter and binary a thirty-second of the space
+    of float32; search on them trades some recall for less memory and
+    faster distance computations, see `benchmarks/quantization.py`.
+
+    int8 values are the components times a fixed `int8_scale`, so vectors
+    quantized in different runs stay comparable. By default the scale maps
+    four standard deviations of a component of a unit vector to 127.
+
+    Config keys:
+        type (str): "float" (default), "int8" or "binary".
+        dimensions (int): Keep only the first `dimensions` components.
+        normalize (bool): Renormalize vectors to unit length. Defaults to
+            True. Binary vectors only keep signs and are not affected.
+        int8_scale (float): Factor applied before rounding to int8.
+    """
+
+    def __init__(self, config: Optional[dict] = None):
+        self.config = config or {}
+        self.type = self.config.get("type", "float")
+        self.dimensions = self.config.get("dimensions")
+        self.normalize = self.config.get("normalize", True)
+        self.int8_scale = self.config.get("int8_scale")
+        if self.type not in VECTOR_TYPES:
+            raise ValueError(f"Unknown quantization type: {self.type}")
+        if self.dimensions is not None and self.dimensions <= 0:
+            raise ValueError("dimensions must be greater than 0")
+
+    def quantize(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Truncate, renormalize and quantize a matrix of embeddings. Query
+        vectors must go through the same quantizer as the stored ones.
+
+        Args:
+            vectors (np.ndarray): A (n, dimension) float matrix.
+
+        Returns:
+            np.ndarray: A float32 or int8 matrix, or for binary a uint8 matrix
+                of `ceil(dimension / 8)` bytes per row.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.dimensions is not None:
+            vectors = vectors[:, :self.dimensions]
+        if self.type == "binary":
+            return np.packbits(vectors > 0, axis=1)
+
+        if self.normalize:
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.maximum(norms, 1e-12)
+        if self.type == "float":
+            return np.ascontiguousarray(vectors)
+        scale = self.int8_scale or 127 * math.sqrt(vectors.shape[1]) / INT8_SIGMAS
+        return np.clip(np.rint(vectors * scale), -127, 127).astype(np.int8)
+
+    def dimension(self, dimension: int) -> int:
+        """
+        Dimension of the quantized vectors of an embedder with `dimension`
+        components; for binary, the number of bits.
+        """
+        if self.dimensions is not None:
+            dimension = min(dimension, self.dimensions)
+        if self.type == "binary":
+            return -(-dimension // 8) * 8
+        return dimension
+
+    @classmethod
+    def from_config(cls, config: dict) -> "EmbeddingQuantizer":
+        return cls(config)
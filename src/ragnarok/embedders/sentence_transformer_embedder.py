@@ -0,0 +1,133 @@
+import threading
+from typing import Any, Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from ..logger import RAGnarokLogger
+from .base import BaseEmbedder
+
+
+class SentenceTransformerEmbedder(BaseEmbedder):
+    """
+    Embeds locally with a sentence-transformers model, on CPU by default.
+
+    The model is loaded on first use. Inputs are sorted by length and cut
+    into batches whose padded size (batch length times the longest input)
+    stays within `batch_tokens`, so short texts are not padded to the length
+    of long ones and batches of short texts are larger.
+
+    Config keys:
+        model (str): Model name or local path. Defaults to
+            "sentence-transformers/all-MiniLM-L6-v2".
+        device (str): Torch device. Defaults to "cpu".
+        backend (str): "torch" (default), or "onnx" or "openvino" to run the
+            model with ONNX Runtime or OpenVINO.
+        threads (int): Intra-op threads used by torch. Defaults to torch's
+            own setting.
+        normalize (bool): Normalize vectors to unit length. Defaults to True.
+        cache_folder (str): Where downloaded models are stored.
+        batch_size (int): Maximum texts per batch. Defaults to 64.
+        batch_tokens (int): Maximum padded tokens per batch. Defaults to 16,384.
+    """
+
+    max_batch_size = 64
+    max_batch_tokens = 16_384
+
+    def __init__(self, config: dict):
+        super().__init__(config)
+        self.model_name = self.config.get("model", "sentence-transformers/all-MiniLM-L6-v2")
+        self.device = self.config.get("device", "cpu")
+        self.backend = self.config.get("backend", "torch")
+        self.threads = self.config.get("threads")
+        self.normalize = self.config.get("normalize", True)
+        self.cache_folder = self.config.get("cache_folder")
+        self.logger = RAGnarokLogger.get_logger()
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self._load()
+        return self._model
+
+    @property
+    def dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def cache_key(self) -> Dict[str, Any]:
+        return {"model": self.model_name, "normalize": self.normalize, "backend": self.backend}
+
+    def _load(self):
+        try:
+            import torch
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise ImportError(
+                "sentence-transformers is not installed. Please install it with "
+                "`pip install ragnarok[sentence_transformers]`."
+            )
+
+        if self.threads:
+            torch.set_num_threads(self.threads)
+        self.logger.info(f"Loading embedding model {self.model_name} on {self.device} ...")
+        kwargs = {"device": self.device, "cache_folder": self.cache_folder}
+        if self.backend != "torch":
+            kwargs["backend"] = self.backend
+        return SentenceTransformer(self.model_name, **kwargs)
+
+    def embed(self, text: str) -> List[float]:
+        return self.embed_batch([text])[0]
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_matrix(texts).tolist()
+
+    def embed_matrix(self, texts: List[str]) -> np.ndarray:
+        matrix = None
+        for indexes, batch in self.iter_length_buckets(texts):
+            embeddings = self.model.encode(
+                batch,
+                batch_size=len(batch),
+                convert_to_numpy=True,
+                normalize_embeddings=self.normalize,
+                show_progress_bar=False,
+            )
+            if matrix is None:
+                matrix = np.empty((len(texts), embeddings.shape[1]), dtype=np.float32)
+            matrix[indexes] = embeddings
+        if matrix is None:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        return matrix
+
+    def iter_length_buckets(self, texts: List[str]) -> Iterator[Tuple[List[int], List[str]]]:
+        """
+        Group texts of similar length into batches, longest first, bounded
+        by `max_batch_size` texts and `max_batch_tokens` padded tokens.
+
+        Yields:
+            Tuple[List[int], List[str]]: The input positions and texts of
+                each batch.
+        """
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        indexes: List[int] = []
+        longest = 0
+        for i in order:
+            tokens = self.count_tokens(texts[i])
+            if indexes and (
+                len(indexes) >= self.max_batch_size
+                # Every text in the batch is padded to the longest, the first.
+                or (len(indexes) + 1) * longest > self.max_batch_tokens
+            ):
+                yield indexes, [texts[j] for j in indexes]
+                indexes = []
+            if not indexes:
+                longest = tokens
+            indexes.append(i)
+        if indexes:
+            yield indexes, [texts[j] for j in indexes]
+
+    @classmethod
+    def from_config(cls, config: dict) -> "SentenceTransformerEmbedder":
+        return cls(config)
@@ -1,6 +1,7 @@
 from abc import ABC, abstractmethod
 from typing import Any, Dict
 
+from ..utils.aio import run_in_thread
 from ..utils.serializable import JSONSerializable
 
 
@@ -32,6 +33,13 @@ class BaseExtractor(ABC):
         """
         pass
 
+    async def aextract(self, source: Any, *args, **kwargs) -> ExtractorOutput:
+        """
+        Async counterpart of `extract`. The default implementation runs
+        `extract` in a worker thread.
+        """
+        return await run_in_thread(self.extract, source, *args, **kwargs)
+
     @classmethod
     @abstractmethod
     def from_config(cls, config: dict) -> "BaseExtractor":
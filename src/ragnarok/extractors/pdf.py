@@ -17,6 +17,15 @@ class PDFExtractor(BaseExtractor):
     def from_config(cls, config: dict) -> "PDFExtractor":
         return cls(config)
 
+    def iter_pages(self, file):
+        """
+        Lazily yield the text of each page, e.g. to feed
+        `RAGnarok.chunk_stream` while the document is still being parsed.
+        """
+        with fitz.open(file, filetype="pdf") as doc:
+            for page in doc:
+                yield page.get_text()
+
     def extract_pdf(self, file):
         metadata = {}
         text = ""
@@ -13,6 +13,13 @@ class URLExtractor(BaseExtractor):
         else:
             return crawler.crawl(source, depth=depth)
 
+    async def aextract(self, source: Any, crawler: BaseCrawler, **kwargs) -> ExtractorOutput:
+        depth = kwargs.get("depth", 0)
+        if depth < 0:
+            raise ValueError("Depth must be greater than or equal to 0")
+        else:
+            return await crawler.acrawl(source, depth=depth)
+
     @classmethod
     def from_config(cls, config: dict) -> "URLExtractor":
         return cls(config)
\ No newline at end of file
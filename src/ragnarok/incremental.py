@@ -0,0 +1,200 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def hash_chunk(text: str, metadata: Optional[dict] = None) -> str:
+    """
+    Identity of a chunk in the ingest state: its text and, if the chunker
+    recorded them, its `chunk_start` and `chunk_end` offsets. A chunk that
+    moved within its document is therefore written again with its new
+    offsets rather than kept with stale ones.
+    """
+    metadata = metadata or {}
+    if metadata.get("chunk_start") is None:
+        return hash_text(text)
+    return hash_text(f"{metadata['chunk_start']}:{metadata.get('chunk_end')}\0{text}")
+
+
+def hash_file(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class SourceFingerprint:
+    def __init__(
+        self,
+        content_hash: str,
+        size: Optional[int] = None,
+        mtime: Optional[float] = None,
+        etag: Optional[str] = None,
+    ):
+        self.content_hash = content_hash
+        self.size = size
+        self.mtime = mtime
+        self.etag = etag
+
+
+class IngestState:
+    """
+    Records what has been ingested, so unchanged sources and chunks can be
+    skipped on the next run and stale chunks removed from the vector store.
+
+    For every document it keeps a fingerprint (content hash, plus the ETag
+    for web pages) and the vector store ID of every chunk, keyed by the hash
+    of the chunk text. Documents extracted from a crawl are recorded under
+    their page URL with the crawl root as parent, and the items of a file
+    under the file path. Every file also has a fingerprint of its own
+    (content hash, size and modification time), recorded only once all its
+    items are synced.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                document TEXT PRIMARY KEY,
+                parent TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                size INTEGER,
+                mtime REAL,
+                etag TEXT,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS documents_parent ON documents (parent);
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                size INTEGER,
+                mtime REAL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                document TEXT NOT NULL,
+                chunk_hash TEXT NOT NULL,
+                vector_id TEXT NOT NULL,
+                PRIMARY KEY (document, chunk_hash)
+            );
+            """
+        )
+        self._conn.commit()
+
+    def get_fingerprint(self, document: str) -> Optional[SourceFingerprint]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content_hash, size, mtime, etag FROM documents WHERE document = ?",
+                (document,),
+            ).fetchone()
+        return SourceFingerprint(*row) if row else None
+
+    def is_file_unchanged(self, path: str) -> Tuple[bool, SourceFingerprint]:
+        """
+        Check a file against its recorded fingerprint. The content is only
+        hashed when its size or modification time changed.
+
+        Returns:
+            Tuple[bool, SourceFingerprint]: Whether the content is unchanged,
+                and the current fingerprint of the file.
+        """
+        stat = os.stat(path)
+        previous = self.get_file_fingerprint(path)
+        if previous and previous.size == stat.st_size and previous.mtime == stat.st_mtime:
+            return True, previous
+
+        fingerprint = SourceFingerprint(hash_file(path), size=stat.st_size, mtime=stat.st_mtime)
+        unchanged = previous is not None and previous.content_hash == fingerprint.content_hash
+        if unchanged:
+            # Content is the same, remember the new mtime to skip hashing next time.
+            self.set_file_fingerprint(path, fingerprint)
+        return unchanged, fingerprint
+
+    def get_file_fingerprint(self, path: str) -> Optional[SourceFingerprint]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content_hash, size, mtime FROM files WHERE path = ?", (path,)
+            ).fetchone()
+        return SourceFingerprint(*row) if row else None
+
+    def set_file_fingerprint(self, path: str, fingerprint: SourceFingerprint) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (path, content_hash, size, mtime, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (path, fingerprint.content_hash, fingerprint.size, fingerprint.mtime, time.time()),
+            )
+            self._conn.commit()
+
+    def remove_file(self, path: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM files WHERE path = ?", (path,))
+            self._conn.commit()
+
+    def set_fingerprint(self, document: str, parent: str, fingerprint: SourceFingerprint) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents "
+                "(document, parent, content_hash, size, mtime, etag, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    document,
+                    parent,
+                    fingerprint.content_hash,
+                    fingerprint.size,
+                    fingerprint.mtime,
+                    fingerprint.etag,
+                    time.time(),
+                ),
+            )
+            self._conn.commit()
+
+    def get_chunks(self, document: str) -> Dict[str, str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk_hash, vector_id FROM chunks WHERE document = ?", (document,)
+            ).fetchall()
+        return dict(rows)
+
+    def add_chunks(self, document: str, vector_ids: Dict[str, str]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (document, chunk_hash, vector_id) VALUES (?, ?, ?)",
+                [(document, chunk_hash, str(vector_id)) for chunk_hash, vector_id in vector_ids.items()],
+            )
+            self._conn.commit()
+
+    def remove_chunks(self, document: str, chunk_hashes: List[str]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM chunks WHERE document = ? AND chunk_hash = ?",
+                [(document, chunk_hash) for chunk_hash in chunk_hashes],
+            )
+            self._conn.commit()
+
+    def get_documents(self, parent: str) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT document FROM documents WHERE parent = ?", (parent,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def remove_document(self, document: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks WHERE document = ?", (document,))
+            self._conn.execute("DELETE FROM documents WHERE document = ?", (document,))
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,147 @@
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .chunkers import BaseChunker, ChunkOutput, get_chunker
+from .config import ChunkerConfig, CrawlerConfig
+from .crawlers import BaseCrawler, get_crawler
+from .extractors import get_extractor
+from .logger import RAGnarokLogger
+from .metrics import StageEvent, text_bytes
+from .utils import get_source_type
+from .utils.serializable import JSONSerializable
+
+Chunker = Union[BaseChunker, Callable[[str], List[str]], None]
+
+
+class SourceReport(JSONSerializable):
+    """
+    Outcome of ingesting a single source with `RAGnarok.process_many` or
+    `RAGnarok.process_incremental`.
+    """
+
+    def __init__(
+        self,
+        source: str,
+        status: str = "pending",
+        chunk_count: int = 0,
+        inserted_count: int = 0,
+        skipped_count: int = 0,
+        deleted_count: int = 0,
+        timings: Optional[Dict[str, float]] = None,
+        error: Optional[str] = None,
+    ):
+        self.source = source
+        self.status = status
+        self.chunk_count = chunk_count
+        self.inserted_count = inserted_count
+        self.skipped_count = skipped_count
+        self.deleted_count = deleted_count
+        self.timings = timings if timings is not None else {}
+        self.error = error
+
+
+def build_chunker(
+    chunker_config: Union[ChunkerConfig, Callable[[str], List[str]], None], embedder=None
+) -> Chunker:
+    if isinstance(chunker_config, Callable):
+        return chunker_config
+    elif chunker_config is None:
+        return None
+    else:
+        return get_chunker(chunker_config.chunker_type, chunker_config.config, embedder=embedder)
+
+
+def chunk_text(chunker: Chunker, text: str, metadata: Dict[str, Any]) -> List[ChunkOutput]:
+    if isinstance(chunker, Callable):
+        return [ChunkOutput(text=chunk, metadata=metadata) for chunk in chunker(text)]
+    elif chunker is None:
+        return [ChunkOutput(text=text, metadata=metadata)]
+    else:
+        return list(with_offsets(chunker.iter_chunks(text), metadata))
+
+
+def with_offsets(
+    chunks: Iterable[Tuple[str, Optional[int], Optional[int]]], metadata: Dict[str, Any]
+) -> Iterator[ChunkOutput]:
+    """
+    Wrap chunks from `BaseChunker.iter_chunks` or `chunk_stream` in
+    ChunkOutputs, recording their character offsets in the source text as
+    `chunk_start` and `chunk_end` metadata.
+    """
+    for text, start, end in chunks:
+        chunk_metadata = dict(metadata)
+        if start is not None:
+            chunk_metadata["chunk_start"] = start
+            chunk_metadata["chunk_end"] = end
+        yield ChunkOutput(text=text, metadata=chunk_metadata)
+
+
+# Per-process state of extraction workers, set up once by `init_worker`.
+_worker_chunker: Chunker = None
+_worker_chunk: bool = True
+_worker_crawler_config: Optional[CrawlerConfig] = None
+_worker_crawler: Optional[BaseCrawler] = None
+
+
+def init_worker(
+    chunker_config: Union[ChunkerConfig, Callable[[str], List[str]], None],
+    crawler_config: Optional[CrawlerConfig],
+    chunk: bool = True,
+) -> None:
+    """
+    Set up an extraction worker. With `chunk` False, workers only extract
+    and leave chunking to the caller, e.g. for chunkers that need the
+    caller's embedder.
+    """
+    global _worker_chunker, _worker_chunk, _worker_crawler_config, _worker_crawler
+    _worker_chunk = chunk
+    _worker_chunker = build_chunker(chunker_config) if chunk else None
+    _worker_crawler_config = crawler_config
+    _worker_crawler = None
+
+
+def extract_and_chunk(source: str, kwargs: Dict[str, Any]) -> Tuple[List[ChunkOutput], List[StageEvent]]:
+    """
+    Extract and chunk one source inside an extraction worker process.
+
+    Returns:
+        Tuple[List[ChunkOutput], List[StageEvent]]: The chunks of every
+            document extracted from the source, or one unchunked item per
+            document if the worker does not chunk, and the metrics of the
+            extract and chunk steps.
+    """
+    global _worker_crawler
+    logger = RAGnarokLogger.get_logger()
+
+    started = time.perf_counter()
+    source_type = get_source_type(source)
+    logger.info(f"Extracting {source}: {source_type} ...")
+    extractor = get_extractor(source_type)
+    if source_type == "url":
+        if _worker_crawler is None:
+            crawler_config = _worker_crawler_config or CrawlerConfig()
+            _worker_crawler = get_crawler(crawler_config.type, crawler_config.config)
+        extracted = extractor.extract(source, crawler=_worker_crawler, **kwargs)
+    else:
+        extracted = extractor.extract(source, **kwargs)
+    extract_event = StageEvent(
+        "extract",
+        wall_time=time.perf_counter() - started,
+        items=len(extracted),
+        bytes=text_bytes(item.text for item in extracted),
+    )
+    if not _worker_chunk:
+        return [ChunkOutput(text=item.text, metadata=item.metadata) for item in extracted], [extract_event]
+
+    started = time.perf_counter()
+    chunks = []
+    for item in extracted:
+        chunks.extend(chunk_text(_worker_chunker, item.text, item.metadata))
+    chunk_event = StageEvent(
+        "chunk",
+        wall_time=time.perf_counter() - started,
+        items=len(chunks),
+        bytes=text_bytes(chunk.text for chunk in chunks),
+    )
+
+    return chunks, [extract_event, chunk_event]
@@ -0,0 +1,384 @@
+import json
+import os
+import random
+import struct
+import threading
+import time
+import uuid
+import zlib
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .embedders import EmbeddingBatch
+from .logger import RAGnarokLogger
+from .vectorstores.base import VectorStoreOutput
+
+# Record header: magic, payload length, CRC32 of the payload.
+_RECORD = struct.Struct("<4sII")
+_MAGIC = b"RWAL"
+_HEADER_LENGTH = struct.Struct("<I")
+
+
+def encode_record(first: int, batch: EmbeddingBatch) -> bytes:
+    """
+    One journal record: a JSON header with the sequence number of the first
+    row, the texts and the metadata, followed by the raw vector matrix.
+    """
+    header = json.dumps({
+        "first": first,
+        "dtype": batch.vectors.dtype.str,
+        "shape": list(batch.vectors.shape),
+        "texts": batch.texts,
+        "metadata": batch.metadata,
+    }, default=str).encode("utf-8")
+    payload = _HEADER_LENGTH.pack(len(header)) + header + np.ascontiguousarray(batch.vectors).tobytes()
+    return _RECORD.pack(_MAGIC, len(payload), zlib.crc32(payload)) + payload
+
+
+def decode_record(payload: bytes) -> Tuple[int, EmbeddingBatch]:
+    (length,) = _HEADER_LENGTH.unpack_from(payload)
+    header = json.loads(payload[_HEADER_LENGTH.size:_HEADER_LENGTH.size + length])
+    vectors = np.frombuffer(payload, dtype=np.dtype(header["dtype"]), offset=_HEADER_LENGTH.size + length)
+    batch = EmbeddingBatch(vectors.reshape(header["shape"]), header["texts"], header["metadata"])
+    return header["first"], batch
+
+
+def read_records(path: str) -> Tuple[List[Tuple[int, EmbeddingBatch]], int]:
+    """
+    The records of a journal file, and the length of its intact prefix.
+    Reading stops at the first torn or corrupt record.
+    """
+    records = []
+    with open(path, "rb") as f:
+        data = f.read()
+    offset = 0
+    while offset + _RECORD.size <= len(data):
+        magic, length, crc = _RECORD.unpack_from(data, offset)
+        start = offset + _RECORD.size
+        payload = data[start:start + length]
+        if magic != _MAGIC or len(payload) != length or zlib.crc32(payload) != crc:
+            break
+        records.append(decode_record(payload))
+        offset = start + length
+    return records, offset
+
+
+class WriteAheadJournal:
+    """
+    Durable buffer between embedding and the vector store. `append` writes
+    embedded rows to an append-only local journal and returns; a background
+    thread drains the journal to the vector store in batches of
+    `flush_rows`, and only then acknowledges them. Rows that were not
+    acknowledged are written again after a restart.
+
+    Every row gets a journal key in its metadata. `write` is called with
+    `rewrite=True` for rows that may already be in the store, from an
+    interrupted run or a failed attempt, and must first delete the rows with
+    those keys; writing the journal again is then idempotent.
+
+    While the vector store is unavailable, batches are retried with
+    exponential backoff up to `max_retry_backoff` seconds apart and
+    `append` blocks once `max_pending_rows` rows are waiting, so embedding
+    runs at full speed through short outages and slow inserts, and pauses
+    in long ones. Rows that the store rejects while others in their batch
+    succeed are retried `max_retries` times and then dropped with an error.
+
+    Config keys:
+        path (str): Directory of the journal. Defaults to "ragnarok_journal".
+        key_field (str): Metadata field of the journal key. Defaults to
+            "journal_key".
+        flush_rows (int): Rows per vector store insert. Defaults to 10,000.
+        flush_interval (float): Seconds to wait for a full batch before
+            writing a partial one. Defaults to 0.5.
+        max_pending_rows (int): Unacknowledged rows before `append` blocks.
+            Defaults to 100,000.
+        segment_bytes (int): Size at which a new journal file is started;
+            files are deleted once all their rows are acknowledged. Defaults
+            to 64 MiB.
+        sync (bool): fsync every append. Defaults to True.
+        max_retries (int): Retries of rejected rows. Defaults to 3.
+        retry_backoff (float): Base delay between retries, in seconds.
+            Defaults to 0.5.
+        max_retry_backoff (float): Longest delay between retries, in
+            seconds. Defaults to 30.
+    """
+
+    def __init__(self, config: Optional[dict] = None):
+        self.config = config or {}
+        self.path = self.config.get("path", "ragnarok_journal")
+        self.key_field = self.config.get("key_field", "journal_key")
+        self.flush_rows = self.config.get("flush_rows", 10_000)
+        self.flush_interval = self.config.get("flush_interval", 0.5)
+        self.max_pending_rows = self.config.get("max_pending_rows", 100_000)
+        self.segment_bytes = self.config.get("segment_bytes", 64 * 1024 * 1024)
+        self.sync = self.config.get("sync", True)
+        self.max_retries = self.config.get("max_retries", 3)
+        self.retry_backoff = self.config.get("retry_backoff", 0.5)
+        self.max_retry_backoff = self.config.get("max_retry_backoff", 30.0)
+        self.logger = RAGnarokLogger.get_logger()
+
+        self.written_rows = 0
+        self.dropped_rows = 0
+        self.retries = 0
+        self._condition = threading.Condition()
+        # Batches waiting to be written, with the sequence number of their
+        # first row and whether they may already be in the store.
+        self._pending: Deque[Tuple[int, EmbeddingBatch, bool]] = deque()
+        self._pending_rows = 0
+        self._writing_rows = 0
+        self._thread: Optional[threading.Thread] = None
+        self._write: Optional[Callable[[EmbeddingBatch, bool], List[VectorStoreOutput]]] = None
+        self._closing = False
+        self._file = None
+        os.makedirs(self.path, exist_ok=True)
+        self._open()
+
+    def _open(self) -> None:
+        state_path = os.path.join(self.path, "state.json")
+        if os.path.exists(state_path):
+            with open(state_path) as f:
+                state = json.load(f)
+        else:
+            state = {"id": uuid.uuid4().hex, "acknowledged": -1}
+        self.journal_id = state["id"]
+        self._acknowledged = state["acknowledged"]
+        self._save_state()
+
+        # Journal files with the sequence number of their last row.
+        self._segments: List[Tuple[str, int]] = []
+        self._next_seq = self._acknowledged + 1
+        for name in sorted(name for name in os.listdir(self.path) if name.endswith(".wal")):
+            path = os.path.join(self.path, name)
+            records, intact = read_records(path)
+            if intact < os.path.getsize(path):
+                self.logger.warning(f"Truncating torn journal record in {path}")
+                with open(path, "r+b") as f:
+                    f.truncate(intact)
+            last = self._acknowledged
+            for first, batch in records:
+                last = first + len(batch) - 1
+                if last <= self._acknowledged:
+                    continue
+                skip = max(0, self._acknowledged + 1 - first)
+                self._pending.append((first + skip, batch[skip:], True))
+                self._pending_rows += len(batch) - skip
+            self._next_seq = max(self._next_seq, last + 1)
+            self._segments.append((path, last))
+        self._next_segment = int(self._segments[-1][0][-12:-4]) + 1 if self._segments else 0
+        self._remove_acknowledged_segments()
+        if self._pending_rows:
+            self.logger.info(f"Replaying {self._pending_rows} unacknowledged rows from {self.path}")
+
+    def start(self, write: Callable[[EmbeddingBatch, bool], List[VectorStoreOutput]]) -> None:
+        """
+        Start draining the journal with `write(batch, rewrite)`, which
+        inserts a batch into the vector store and returns the result of
+        every row.
+        """
+        self._write = write
+        self._thread = threading.Thread(target=self._run, name="ragnarok-journal", daemon=True)
+        self._thread.start()
+
+    def __len__(self) -> int:
+        return self._pending_rows + self._writing_rows
+
+    def stats(self) -> Dict[str, int]:
+        with self._condition:
+            return {
+                "pending_rows": len(self),
+                "written_rows": self.written_rows,
+                "dropped_rows": self.dropped_rows,
+                "retries": self.retries,
+                "files": len(self._segments),
+            }
+
+    def append(self, embeddings: EmbeddingBatch) -> List[VectorStoreOutput]:
+        """
+        Durably journal embedded rows. Blocks while `max_pending_rows` rows
+        are waiting for the vector store.
+
+        Returns:
+            List[VectorStoreOutput]: One "queued" output per row, with the
+                journal key as ID.
+        """
+        if not len(embeddings):
+            return []
+        with self._condition:
+            while (
+                self._pending_rows
+                and len(self) + len(embeddings) > self.max_pending_rows
+                and not self._closing
+            ):
+                self._condition.wait()
+            if self._closing:
+                raise RuntimeError("The journal is closed")
+            first = self._next_seq
+            keys = [self.key(first + i) for i in range(len(embeddings))]
+            metadata = [dict(meta or {}, **{self.key_field: key}) for meta, key in zip(embeddings.metadata, keys)]
+            batch = EmbeddingBatch(embeddings.vectors, list(embeddings.texts), metadata)
+            self._write_record(encode_record(first, batch), first + len(batch) - 1)
+            self._next_seq += len(batch)
+            self._pending.append((first, batch, False))
+            self._pending_rows += len(batch)
+            self._condition.notify_all()
+        return [
+            VectorStoreOutput(text=text, metadata=meta, vector=vector, id=key, status="queued")
+            for text, meta, vector, key in zip(batch.texts, batch.metadata, batch.vectors, keys)
+        ]
+
+    def key(self, seq: int) -> str:
+        return f"{self.journal_id}:{seq}"
+
+    def _write_record(self, record: bytes, last: int) -> None:
+        if self._file is None or self._file.tell() >= self.segment_bytes:
+            if self._file is not None:
+                self._file.close()
+            path = os.path.join(self.path, f"{self._next_segment:08d}.wal")
+            self._next_segment += 1
+            self._file = open(path, "ab")
+            self._segments.append((path, last))
+        self._file.write(record)
+        self._file.flush()
+        if self.sync:
+            os.fsync(self._file.fileno())
+        self._segments[-1] = (self._segments[-1][0], last)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every journaled row has been written to the vector store.
+
+        Returns:
+            bool: False if rows were still waiting after `timeout` seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while len(self) and self._thread is not None and self._thread.is_alive():
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            return not len(self)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """
+        Write the remaining rows and stop the flusher. While the vector store
+        is unavailable, waits at most `timeout` seconds; rows still
+        unacknowledged then are replayed when the journal is opened again.
+        """
+        self.flush(timeout)
+        with self._condition:
+            self._closing = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                # Waits briefly for a full batch, so a steady trickle of small
+                # appends is written in large inserts.
+                deadline = time.monotonic() + self.flush_interval
+                while not self._closing and self._pending_rows < self.flush_rows:
+                    remaining = deadline - time.monotonic()
+                    if self._pending_rows and remaining <= 0:
+                        break
+                    self._condition.wait(remaining if self._pending_rows else None)
+                if not self._pending:
+                    return
+                batches = []
+                rows = 0
+                while self._pending and rows < self.flush_rows:
+                    batches.append(self._pending.popleft())
+                    rows += len(batches[-1][1])
+                self._pending_rows -= rows
+                self._writing_rows = rows
+            first = batches[0][0]
+            batch = EmbeddingBatch.concat([batch for _, batch, _ in batches])
+            rewrite = any(replayed for _, _, replayed in batches)
+            if not self._drain(batch, rewrite):
+                # The store stayed unavailable until close; the rows are
+                # replayed on the next start.
+                with self._condition:
+                    self._pending.extendleft(reversed(batches))
+                    self._pending_rows += rows
+                    self._writing_rows = 0
+                    self._condition.notify_all()
+                return
+            self._acknowledge(first + rows - 1)
+            with self._condition:
+                self._writing_rows = 0
+                self.written_rows += rows
+                self._condition.notify_all()
+
+    def _drain(self, batch: EmbeddingBatch, rewrite: bool) -> bool:
+        """
+        Write a batch until every row succeeded or was dropped. Returns
+        False if the journal was closed while the store was unavailable.
+        """
+        attempt = 0
+        rejections = 0
+        while len(batch):
+            raised = False
+            try:
+                results = self._write(batch, rewrite)
+                failed = [index for index, result in enumerate(results) if result.status != "success"]
+                failed += list(range(len(results), len(batch)))
+                error = results[failed[0]].error if failed and failed[0] < len(results) else "No result"
+            except Exception as e:
+                failed = list(range(len(batch)))
+                error = str(e)
+                raised = True
+            if not failed:
+                return True
+            # Rows that failed may have reached the store.
+            rewrite = True
+            # Once only rejected rows are left, they are still rejections
+            # when they fail on their own; an exception is an outage.
+            if len(failed) < len(batch) or (rejections and not raised):
+                rejections += 1
+                if rejections > self.max_retries:
+                    self.logger.error(f"Dropping {len(failed)} journaled rows the vector store rejected: {error}")
+                    with self._condition:
+                        self.dropped_rows += len(failed)
+                    return True
+                batch = EmbeddingBatch(
+                    batch.vectors[failed], [batch.texts[i] for i in failed], [batch.metadata[i] for i in failed]
+                )
+            with self._condition:
+                if self._closing:
+                    return False
+                self.retries += 1
+                # The exponent is capped so that long outages cannot overflow it.
+                delay = random.uniform(0, min(self.max_retry_backoff, self.retry_backoff * 2 ** min(attempt, 32)))
+                self.logger.warning(f"Writing {len(batch)} journaled rows failed, retrying in {delay:.2f}s: {error}")
+                self._condition.wait(delay)
+            attempt += 1
+        return True
+
+    def _acknowledge(self, last: int) -> None:
+        self._acknowledged = last
+        self._save_state()
+        self._remove_acknowledged_segments()
+
+    def _save_state(self) -> None:
+        state_path = os.path.join(self.path, "state.json")
+        with open(state_path + ".tmp", "w") as f:
+            json.dump({"id": self.journal_id, "acknowledged": self._acknowledged}, f)
+            f.flush()
+            if self.sync:
+                os.fsync(f.fileno())
+        os.replace(state_path + ".tmp", state_path)
+
+    def _remove_acknowledged_segments(self) -> None:
+        with self._condition:
+            current = self._file.name if self._file is not None else None
+            done = [path for path, last in self._segments if last <= self._acknowledged and path != current]
+            self._segments = [segment for segment in self._segments if segment[0] not in done]
+        for path in done:
+            os.remove(path)
@@ -0,0 +1,549 @@
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .logger import RAGnarokLogger
+from .vectorstores.base import VectorStoreOutput
+from .vectorstores.local_store import filter_clause
+
+# Words, and identifiers joined by dots, dashes, slashes or colons, such as
+# "os.path.join", "ERR-404" or "v1.2.3".
+_TOKEN = re.compile(r"\w+(?:[.\-/:]\w+)*")
+_PART = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase terms of a text. An identifier is kept whole, so exact
+    matches score highest, and is also split into its parts at separators,
+    underscores and camelCase humps: "getUserById" yields "getuserbyid",
+    "get", "user", "by" and "id".
+    """
+    tokens = []
+    for match in _TOKEN.finditer(text):
+        token = match.group()
+        lowered = token.lower()
+        tokens.append(lowered)
+        parts = {part.lower() for part in _PART.findall(token)}
+        parts.discard(lowered)
+        tokens.extend(sorted(parts))
+    return tokens
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[List[VectorStoreOutput]], k: int, rrf_k: int = 60, weights: Optional[Sequence[float]] = None
+) -> List[VectorStoreOutput]:
+    """
+    Merge ranked result lists by reciprocal rank fusion: a result scores
+    the sum of `weight / (rrf_k + rank)` over the lists it appears in, so
+    results ranked well by several retrievers rise to the top, whatever the
+    scale of each retriever's scores.
+
+    Args:
+        rankings (Sequence[List[VectorStoreOutput]]): Results of each
+            retriever, best first. Results are matched by `id`.
+        k (int): Number of results to return.
+        rrf_k (int): Damping constant; larger values flatten the rank
+            weights. Defaults to 60.
+        weights (Optional[Sequence[float]]): Weight of each list. Defaults
+            to 1 for all.
+
+    Returns:
+        List[VectorStoreOutput]: The best k results, with the fused score as
+            `score`. Text and metadata are taken from the first list that has
+            them.
+    """
+    weights = weights or [1.0] * len(rankings)
+    scores: Dict[str, float] = {}
+    outputs: Dict[str, VectorStoreOutput] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, hit in enumerate(ranking, start=1):
+            key = str(hit.id)
+            scores[key] = scores.get(key, 0.0) + weight / (rrf_k + rank)
+            if key not in outputs:
+                outputs[key] = VectorStoreOutput(
+                    text=hit.text, metadata=hit.metadata, vector=hit.vector, id=hit.id, status=hit.status
+                )
+            else:
+                output = outputs[key]
+                output.text = output.text if output.text is not None else hit.text
+                output.metadata = output.metadata or hit.metadata
+                output.vector = output.vector if output.vector is not None else hit.vector
+    best = sorted(scores, key=lambda key: -scores[key])[:k]
+    for key in best:
+        outputs[key].score = scores[key]
+    return [outputs[key] for key in best]
+
+
+class PostingSegment:
+    """
+    Immutable inverted index of a set of documents, as flat arrays: the
+    postings of term `terms[t]` are `docs[offsets[t]:offsets[t + 1]]` with
+    term frequencies `tfs[...]`; `lengths` holds the token count of each
+    document and `keys` its ID. On disk, the arrays are `.npy` files that
+    are memory-mapped, and the terms and keys JSON lists.
+    """
+
+    FILES = ("terms.json", "keys.json", "offsets.npy", "docs.npy", "tfs.npy", "lengths.npy")
+
+    def __init__(self, terms: List[str], keys: List[str], offsets, docs, tfs, lengths, name: Optional[str] = None):
+        self.name = name
+        self.term_list = terms
+        self.terms = {term: index for index, term in enumerate(terms)}
+        self.keys = keys
+        self.offsets = offsets
+        self.docs = docs
+        self.tfs = tfs
+        self.lengths = lengths
+        self.deleted: Optional[np.ndarray] = None
+        self.deleted_length = 0
+        self.total_length = int(np.asarray(lengths).sum(dtype=np.int64))
+        self._positions: Optional[Dict[str, int]] = None
+
+    @classmethod
+    def build(cls, keys: List[str], token_lists: Iterable[List[str]]) -> "PostingSegment":
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        lengths = []
+        for doc, tokens in enumerate(token_lists):
+            lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                docs, tfs = postings.setdefault(term, ([], []))
+                docs.append(doc)
+                tfs.append(tf)
+        terms = sorted(postings)
+        counts = [len(postings[term][0]) for term in terms]
+        return cls(
+            terms,
+            list(keys),
+            np.concatenate([[0], np.cumsum(counts, dtype=np.int64)]).astype(np.int64),
+            np.array([doc for term in terms for doc in postings[term][0]], dtype=np.uint32),
+            np.minimum([tf for term in terms for tf in postings[term][1]], 65_535).astype(np.uint16),
+            np.array(lengths, dtype=np.uint32),
+        )
+
+    @classmethod
+    def load(cls, directory: str, name: str) -> "PostingSegment":
+        base = os.path.join(directory, name)
+        with open(f"{base}.terms.json") as f:
+            terms = json.load(f)
+        with open(f"{base}.keys.json") as f:
+            keys = json.load(f)
+        arrays = [
+            np.load(f"{base}.{suffix}.npy", mmap_mode="r") for suffix in ("offsets", "docs", "tfs", "lengths")
+        ]
+        return cls(terms, keys, *arrays, name=name)
+
+    def save(self, directory: str, name: str) -> None:
+        base = os.path.join(directory, name)
+        with open(f"{base}.terms.json", "w") as f:
+            json.dump(self.term_list, f)
+        with open(f"{base}.keys.json", "w") as f:
+            json.dump(self.keys, f)
+        for suffix in ("offsets", "docs", "tfs", "lengths"):
+            np.save(f"{base}.{suffix}.npy", getattr(self, suffix))
+        self.name = name
+
+    def paths(self, directory: str) -> List[str]:
+        return [os.path.join(directory, f"{self.name}.{suffix}") for suffix in self.FILES]
+
+    def position(self, key: str) -> Optional[int]:
+        if self._positions is None:
+            self._positions = {key: doc for doc, key in enumerate(self.keys)}
+        return self._positions.get(key)
+
+    def tombstone(self, docs: Sequence[int]) -> None:
+        # Copy on write, so searches that hold the old mask are not affected.
+        deleted = np.zeros(len(self.keys), dtype=bool) if self.deleted is None else self.deleted.copy()
+        docs = np.asarray(docs, dtype=np.int64)
+        docs = docs[~deleted[docs]]
+        deleted[docs] = True
+        self.deleted = deleted
+        self.deleted_length += int(np.asarray(self.lengths)[docs].sum())
+
+    @property
+    def live(self) -> int:
+        return len(self.keys) - (int(self.deleted.sum()) if self.deleted is not None else 0)
+
+    @property
+    def live_length(self) -> int:
+        return self.total_length - self.deleted_length
+
+    def postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        index = self.terms.get(term)
+        if index is None:
+            return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.uint16)
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return self.docs[start:end], self.tfs[start:end]
+
+    @classmethod
+    def merge(cls, segments: List["PostingSegment"]) -> "PostingSegment":
+        """
+        Merge segments into one, without their deleted documents.
+        """
+        vocabulary = sorted({term for segment in segments for term in segment.term_list})
+        term_ids = {term: index for index, term in enumerate(vocabulary)}
+        keys, lengths, all_terms, all_docs, all_tfs = [], [], [], [], []
+        for segment in segments:
+            live = np.ones(len(segment.keys), dtype=bool) if segment.deleted is None else ~segment.deleted
+            remap = np.full(len(segment.keys), -1, dtype=np.int64)
+            remap[live] = len(keys) + np.arange(int(live.sum()))
+            keys.extend(key for key, keep in zip(segment.keys, live) if keep)
+            lengths.append(np.asarray(segment.lengths)[live])
+
+            local = np.array([term_ids[term] for term in segment.term_list], dtype=np.int64)
+            terms = np.repeat(local, np.diff(segment.offsets))
+            docs = remap[np.asarray(segment.docs)]
+            keep = docs >= 0
+            all_terms.append(terms[keep])
+            all_docs.append(docs[keep])
+            all_tfs.append(np.asarray(segment.tfs)[keep])
+
+        terms = np.concatenate(all_terms) if all_terms else np.zeros(0, dtype=np.int64)
+        docs = np.concatenate(all_docs) if all_docs else np.zeros(0, dtype=np.int64)
+        tfs = np.concatenate(all_tfs) if all_tfs else np.zeros(0, dtype=np.uint16)
+        order = np.lexsort((docs, terms))
+        counts = np.bincount(terms, minlength=len(vocabulary))
+        # Terms that only occurred in deleted documents are dropped.
+        used = counts > 0
+        return cls(
+            [term for term, keep in zip(vocabulary, used) if keep],
+            keys,
+            np.concatenate([[0], np.cumsum(counts[used])]).astype(np.int64),
+            docs[order].astype(np.uint32),
+            tfs[order].astype(np.uint16),
+            np.concatenate(lengths).astype(np.uint32) if lengths else np.zeros(0, dtype=np.uint32),
+        )
+
+
+class BM25Index:
+    """
+    Persistent BM25 index of chunk texts, for lexical retrieval next to the
+    vector store: exact identifiers, error codes and API names that vector
+    search misses.
+
+    New documents are buffered, and their text kept in an SQLite database
+    with their metadata, so they are searchable and durable right away.
+    Every `flush_docs` documents, the buffer is written out as an immutable
+    PostingSegment of compact arrays that are memory-mapped for search.
+    Deleted documents are tombstoned; once there are more than
+    `max_segments` segments, they are merged into one without them.
+
+    Documents are keyed by their vector store ID, so lexical results can be
+    fused with vector search results (see `reciprocal_rank_fusion`).
+
+    Config keys:
+        path (str): Directory of the index. Defaults to "ragnarok_bm25".
+        k1 (float): Term frequency saturation. Defaults to 1.2.
+        b (float): Document length normalization. Defaults to 0.75.
+        flush_docs (int): Buffered documents written out as a segment.
+            Defaults to 10,000.
+        max_segments (int): Segments before they are merged. Defaults to 8.
+    """
+
+    def __init__(self, config: Optional[dict] = None):
+        self.config = config or {}
+        self.path = self.config.get("path", "ragnarok_bm25")
+        self.k1 = self.config.get("k1", 1.2)
+        self.b = self.config.get("b", 0.75)
+        self.flush_docs = self.config.get("flush_docs", 10_000)
+        self.max_segments = self.config.get("max_segments", 8)
+        self.logger = RAGnarokLogger.get_logger()
+
+        os.makedirs(self.path, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(os.path.join(self.path, "documents.db"), check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS segments (name TEXT PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS documents (
+                key TEXT PRIMARY KEY,
+                id TEXT NOT NULL,
+                text TEXT,
+                metadata TEXT,
+                segment TEXT
+            );
+            CREATE INDEX IF NOT EXISTS documents_segment ON documents (segment);
+            CREATE TABLE IF NOT EXISTS tombstones (key TEXT PRIMARY KEY, segment TEXT NOT NULL);
+            """
+        )
+        self._conn.commit()
+        self._open()
+
+    def _open(self) -> None:
+        row = self._conn.execute("SELECT value FROM settings WHERE key = 'next_segment'").fetchone()
+        self._next_segment = int(row[0]) if row else 0
+        names = [name for (name,) in self._conn.execute("SELECT name FROM segments ORDER BY name")]
+        self._segments: List[PostingSegment] = [PostingSegment.load(self.path, name) for name in names]
+        by_name = {segment.name: segment for segment in self._segments}
+        tombstones: Dict[str, List[int]] = {}
+        for key, name in self._conn.execute("SELECT key, segment FROM tombstones"):
+            segment = by_name.get(name)
+            position = segment.position(key) if segment is not None else None
+            if position is not None:
+                tombstones.setdefault(name, []).append(position)
+        for name, positions in tombstones.items():
+            by_name[name].tombstone(positions)
+
+        self._buffer: Dict[str, List[str]] = {}
+        for key, text in self._conn.execute("SELECT key, text FROM documents WHERE segment IS NULL"):
+            self._buffer[key] = tokenize(text or "")
+        self._buffer_segment: Optional[PostingSegment] = None
+
+        # Files of segments that an interrupted flush or merge wrote or replaced.
+        known = {os.path.basename(path) for segment in self._segments for path in segment.paths(self.path)}
+        for name in os.listdir(self.path):
+            if name.endswith(PostingSegment.FILES) and name not in known:
+                os.remove(os.path.join(self.path, name))
+
+    def __len__(self) -> int:
+        return sum(segment.live for segment in self._segments) + len(self._buffer)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "documents": len(self),
+                "buffered": len(self._buffer),
+                "segments": len(self._segments),
+                "terms": sum(len(segment.term_list) for segment in self._segments),
+            }
+
+    def add(self, ids: Sequence[Any], texts: Sequence[str], metadata: Optional[Sequence[Optional[dict]]] = None) -> None:
+        """
+        Index documents under their vector store IDs. Re-adding an ID
+        replaces its document.
+        """
+        metadata = metadata if metadata is not None else [None] * len(ids)
+        rows = [
+            (str(id), json.dumps(id), text, json.dumps(meta, default=str))
+            for id, text, meta in zip(ids, texts, metadata)
+            if id is not None
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self.delete([key for key, _, _, _ in rows])
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO documents (key, id, text, metadata, segment) VALUES (?, ?, ?, ?, NULL)",
+                    rows,
+                )
+            for key, _, text, _ in rows:
+                self._buffer[key] = tokenize(text or "")
+            self._buffer_segment = None
+            if len(self._buffer) >= self.flush_docs:
+                self.flush()
+
+    def flush(self) -> None:
+        """
+        Write the buffered documents out as a segment, and merge the segments
+        if there are more than `max_segments`.
+        """
+        with self._lock:
+            if not self._buffer:
+                return
+            keys = list(self._buffer)
+            segment = PostingSegment.build(keys, (self._buffer[key] for key in keys))
+            name = f"{self._next_segment:06d}"
+            segment.save(self.path, name)
+            self._next_segment += 1
+            with self._conn:
+                self._conn.execute("INSERT INTO segments (name) VALUES (?)", (name,))
+                self._conn.executemany(
+                    "UPDATE documents SET segment = ? WHERE key = ?", [(name, key) for key in keys]
+                )
+                self._save_next_segment()
+            self._segments = self._segments + [PostingSegment.load(self.path, name)]
+            self._buffer = {}
+            self._buffer_segment = None
+            if len(self._segments) > self.max_segments:
+                self.merge()
+
+    def merge(self) -> None:
+        """
+        Merge all segments into one, dropping deleted documents.
+        """
+        with self._lock:
+            if not self._segments:
+                return
+            old = self._segments
+            merged = PostingSegment.merge(old)
+            name = f"{self._next_segment:06d}"
+            merged.save(self.path, name)
+            self._next_segment += 1
+            old_names = [(segment.name,) for segment in old]
+            with self._conn:
+                self._conn.executemany("DELETE FROM segments WHERE name = ?", old_names)
+                self._conn.execute("INSERT INTO segments (name) VALUES (?)", (name,))
+                self._conn.executemany(
+                    "UPDATE documents SET segment = ? WHERE segment = ?", [(name,) + row for row in old_names]
+                )
+                self._conn.executemany("DELETE FROM tombstones WHERE segment = ?", old_names)
+                self._save_next_segment()
+            self._segments = [PostingSegment.load(self.path, name)]
+            # Searches still holding the old segments keep their mappings
+            # until they finish.
+            for segment in old:
+                for path in segment.paths(self.path):
+                    if os.path.exists(path):
+                        os.remove(path)
+            self.logger.info(f"Merged {len(old)} BM25 segments into {name}")
+
+    def _save_next_segment(self) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO settings (key, value) VALUES ('next_segment', ?)", (str(self._next_segment),)
+        )
+
+    def delete(self, ids: Sequence[Any], filter: Optional[Union[str, Dict[str, Any]]] = None) -> None:
+        """
+        Delete documents by ID, or all documents whose metadata matches a
+        filter, see `search`.
+        """
+        if ids and filter:
+            raise ValueError("Delete by IDs or by filter, not both")
+        keys = [str(id) for id in ids]
+        if not keys and not filter:
+            return
+        with self._lock:
+            found = []
+            if filter:
+                clause, params = filter_clause(filter)
+                found = self._conn.execute(f"SELECT key, segment FROM documents WHERE {clause}", params).fetchall()
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                found += self._conn.execute(
+                    f"SELECT key, segment FROM documents WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchall()
+            if not found:
+                return
+            with self._conn:
+                self._conn.executemany("DELETE FROM documents WHERE key = ?", [(key,) for key, _ in found])
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO tombstones (key, segment) VALUES (?, ?)",
+                    [(key, name) for key, name in found if name is not None],
+                )
+            by_name = {segment.name: segment for segment in self._segments}
+            positions: Dict[str, List[int]] = {}
+            for key, name in found:
+                if name is None:
+                    self._buffer.pop(key, None)
+                    self._buffer_segment = None
+                elif name in by_name:
+                    position = by_name[name].position(key)
+                    if position is not None:
+                        positions.setdefault(name, []).append(position)
+            for name, docs in positions.items():
+                by_name[name].tombstone(docs)
+
+    def search(
+        self, text: str, k: int = 5, filter: Optional[Union[str, Dict[str, Any]]] = None
+    ) -> List[VectorStoreOutput]:
+        """
+        The k documents with the highest BM25 score for a query.
+
+        Args:
+            text (str): The query.
+            k (int): Number of results.
+            filter (Optional[Union[str, Dict[str, Any]]]): A dict of required
+                metadata values, or an SQLite condition on the `metadata`
+                JSON column, as for the local vector store.
+
+        Returns:
+            List[VectorStoreOutput]: Matching documents, best first, with
+                their BM25 score.
+        """
+        query = Counter(tokenize(text))
+        if not query:
+            return []
+        with self._lock:
+            segments = list(self._segments)
+            if self._buffer and self._buffer_segment is None:
+                keys = list(self._buffer)
+                self._buffer_segment = PostingSegment.build(keys, (self._buffer[key] for key in keys))
+            if self._buffer_segment is not None and self._buffer:
+                segments.append(self._buffer_segment)
+            allowed = self._filtered_keys(filter) if filter else None
+
+        documents = sum(segment.live for segment in segments)
+        if not documents:
+            return []
+        average_length = max(sum(segment.live_length for segment in segments) / documents, 1e-9)
+        idf = {}
+        for term in query:
+            frequency = sum(len(segment.postings(term)[0]) for segment in segments)
+            if frequency:
+                idf[term] = math.log(1 + (documents - frequency + 0.5) / (frequency + 0.5))
+
+        candidates: List[Tuple[float, str]] = []
+        for segment in segments:
+            scores = self._score(segment, query, idf, average_length)
+            if scores is None:
+                continue
+            if segment.deleted is not None:
+                scores[segment.deleted] = 0
+            if allowed is not None:
+                mask = np.zeros(len(scores), dtype=bool)
+                positions = [segment.position(key) for key in allowed]
+                mask[[position for position in positions if position is not None]] = True
+                scores[~mask] = 0
+            top = np.flatnonzero(scores > 0)
+            if len(top) > k:
+                top = top[np.argpartition(-scores[top], k - 1)[:k]]
+            candidates.extend((float(scores[doc]), segment.keys[doc]) for doc in top)
+        candidates.sort(key=lambda candidate: -candidate[0])
+        return self._outputs(candidates[:k])
+
+    def _score(self, segment: PostingSegment, query: Counter, idf: Dict[str, float], average_length: float):
+        scores = None
+        lengths = np.asarray(segment.lengths, dtype=np.float32)
+        for term, count in query.items():
+            if term not in idf:
+                continue
+            docs, tfs = segment.postings(term)
+            if not len(docs):
+                continue
+            tfs = tfs.astype(np.float32)
+            norms = self.k1 * (1 - self.b + self.b * lengths[docs] / average_length)
+            weights = idf[term] * count * tfs * (self.k1 + 1) / (tfs + norms)
+            contribution = np.bincount(docs, weights=weights, minlength=len(segment.keys))
+            scores = contribution if scores is None else scores + contribution
+        return scores
+
+    def _filtered_keys(self, filter: Union[str, Dict[str, Any]]) -> set:
+        clause, params = filter_clause(filter)
+        return {key for (key,) in self._conn.execute(f"SELECT key FROM documents WHERE {clause}", params)}
+
+    def _outputs(self, candidates: List[Tuple[float, str]]) -> List[VectorStoreOutput]:
+        keys = [key for _, key in candidates]
+        rows = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                for key, id, text, metadata in self._conn.execute(
+                    f"SELECT key, id, text, metadata FROM documents WHERE key IN ({','.join('?' * len(part))})", part
+                ):
+                    rows[key] = (json.loads(id), text, json.loads(metadata) if metadata else None)
+        outputs = []
+        for score, key in candidates:
+            if key not in rows:
+                continue
+            id, text, metadata = rows[key]
+            outputs.append(
+                VectorStoreOutput(text=text, metadata=metadata, vector=None, id=id, status="success", score=score)
+            )
+        return outputs
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    @classmethod
+    def from_config(cls, config: dict) -> "BM25Index":
+        return cls(config)
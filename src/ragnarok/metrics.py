@@ -0,0 +1,209 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from .logger import RAGnarokLogger
+from .utils.serializable import JSONSerializable
+
+
+def text_bytes(texts: Iterable[str]) -> int:
+    return sum(len(text.encode("utf-8")) for text in texts)
+
+
+class StageMetrics(JSONSerializable):
+    """
+    Running totals for one pipeline stage.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.items = 0
+        self.bytes = 0
+        self.tokens = 0
+        self.retries = 0
+        self.errors = 0
+        self.wall_time = 0.0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+
+
+class StageEvent(JSONSerializable):
+    """
+    One timed call of a stage, as passed to metric hooks. Fields other than
+    `stage` and `wall_time` are filled in by the instrumented code.
+    """
+
+    def __init__(
+        self,
+        stage: str,
+        wall_time: float = 0.0,
+        items: int = 0,
+        bytes: int = 0,
+        tokens: int = 0,
+        retries: int = 0,
+        errors: int = 0,
+        error: Optional[str] = None,
+    ):
+        self.stage = stage
+        self.wall_time = wall_time
+        self.items = items
+        self.bytes = bytes
+        self.tokens = tokens
+        self.retries = retries
+        self.errors = errors
+        self.error = error
+
+
+class PipelineMetrics:
+    """
+    Collects per-stage metrics of a RAGnarok pipeline: wall time, item,
+    byte and token counts, retries, errors and queue depths, plus free-form
+    gauges such as memory usage.
+
+    Hooks registered with `add_hook` are called with a `StageEvent` after
+    every timed call, e.g. to forward metrics to a monitoring system.
+    Totals can be exported as JSON or in the Prometheus text format.
+    """
+
+    # Prometheus name, help text and StageMetrics attribute of every counter.
+    COUNTERS = [
+        ("calls_total", "Number of calls of each pipeline stage.", "calls"),
+        ("items_total", "Items produced or processed by each pipeline stage.", "items"),
+        ("bytes_total", "UTF-8 bytes of text processed by each pipeline stage.", "bytes"),
+        ("tokens_total", "Estimated tokens processed by each pipeline stage.", "tokens"),
+        ("retries_total", "Retried operations in each pipeline stage.", "retries"),
+        ("errors_total", "Failed operations in each pipeline stage.", "errors"),
+        ("wall_seconds_total", "Wall time spent in each pipeline stage.", "wall_time"),
+    ]
+
+    def __init__(self):
+        self.logger = RAGnarokLogger.get_logger()
+        self.stages: Dict[str, StageMetrics] = {}
+        self.gauges: Dict[str, float] = {}
+        self.hooks: List[Callable[[StageEvent], None]] = []
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook: Callable[[StageEvent], None]) -> None:
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook: Callable[[StageEvent], None]) -> None:
+        self.hooks.remove(hook)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[StageEvent]:
+        """
+        Time a call of a stage. The caller fills in counts on the yielded
+        event; an exception raised inside the block is counted as an error
+        and re-raised.
+        """
+        event = StageEvent(name)
+        started = time.perf_counter()
+        try:
+            yield event
+        except BaseException as e:
+            event.errors += 1
+            event.error = str(e)
+            raise
+        finally:
+            event.wall_time = time.perf_counter() - started
+            self.record(event)
+
+    def record(self, event: StageEvent) -> None:
+        with self._lock:
+            stage = self._get_stage(event.stage)
+            stage.calls += 1
+            stage.items += event.items
+            stage.bytes += event.bytes
+            stage.tokens += event.tokens
+            stage.retries += event.retries
+            stage.errors += event.errors
+            stage.wall_time += event.wall_time
+
+        for hook in self.hooks:
+            try:
+                hook(event)
+            except Exception as e:
+                self.logger.warning(f"Metrics hook failed: {e}")
+
+    def record_queue_depth(self, name: str, depth: int) -> None:
+        with self._lock:
+            stage = self._get_stage(name)
+            stage.queue_depth = depth
+            stage.max_queue_depth = max(stage.max_queue_depth, depth)
+
+    def set_gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self.gauges[name] = value
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stages = {}
+            self.gauges = {}
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "stages": {name: dict(stage.to_dict()) for name, stage in self.stages.items()},
+                "gauges": dict(self.gauges),
+            }
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot())
+
+    def to_prometheus(self, prefix: str = "ragnarok") -> str:
+        snapshot = self.snapshot()
+        stages = snapshot["stages"]
+        lines = []
+
+        def metric(name: str, help: str, kind: str, values: List[tuple]):
+            lines.append(f"# HELP {prefix}_{name} {help}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for labels, value in values:
+                lines.append(f"{prefix}_{name}{labels} {value}")
+
+        for name, help, attribute in self.COUNTERS:
+            metric(
+                f"stage_{name}",
+                help,
+                "counter",
+                [(f'{{stage="{stage}"}}', values[attribute]) for stage, values in stages.items()],
+            )
+        queued = [(stage, values) for stage, values in stages.items() if values["max_queue_depth"]]
+        if queued:
+            metric(
+                "stage_queue_depth",
+                "Items waiting in the input queue of each pipeline stage.",
+                "gauge",
+                [(f'{{stage="{stage}"}}', values["queue_depth"]) for stage, values in queued],
+            )
+            metric(
+                "stage_queue_depth_max",
+                "Highest observed input queue depth of each pipeline stage.",
+                "gauge",
+                [(f'{{stage="{stage}"}}', values["max_queue_depth"]) for stage, values in queued],
+            )
+        for name, value in snapshot["gauges"].items():
+            metric(name, f"Gauge {name}.", "gauge", [("", value)])
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: str, format: str = "json") -> None:
+        """
+        Write the current metrics to a file, as "json" or "prometheus".
+        """
+        if format == "json":
+            content = self.to_json()
+        elif format == "prometheus":
+            content = self.to_prometheus()
+        else:
+            raise ValueError(f"Unknown metrics format: {format}")
+        with open(path, "w") as f:
+            f.write(content)
+
+    def _get_stage(self, name: str) -> StageMetrics:
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = StageMetrics(name)
+        return stage
@@ -0,0 +1,202 @@
+import queue
+import threading
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+
+from .logger import RAGnarokLogger
+from .metrics import PipelineMetrics
+
+# Marks the end of a stream on a stage's input queue.
+_DONE = object()
+
+# How long blocked queue operations wait before re-checking for cancellation.
+_POLL_INTERVAL = 0.1
+
+
+class PipelineError(Exception):
+    """
+    Raised by a streaming pipeline when one of its stages fails. The original
+    exception is available as `__cause__`.
+    """
+
+    def __init__(self, stage: str, error: BaseException):
+        super().__init__(f"Stage '{stage}' failed: {error}")
+        self.stage = stage
+        self.error = error
+
+
+class Stage:
+    """
+    A step of a `StreamingPipeline`.
+
+    Args:
+        name (str): Name used in logs and errors.
+        fn (Callable): Called with one input item, or with a list of up to
+            `batch_size` items when `batch_size` is greater than one. Returns
+            an iterable of output items for the next stage.
+        workers (int): Number of threads running `fn` concurrently.
+        batch_size (int): Maximum number of queued items handed to `fn` at
+            once. Workers never wait to fill a batch; they take what is
+            already queued.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[Any], Iterable[Any]],
+        workers: int = 1,
+        batch_size: int = 1,
+    ):
+        if workers < 1:
+            raise ValueError(f"Stage '{name}' needs at least one worker")
+        if batch_size < 1:
+            raise ValueError(f"Stage '{name}' needs a batch size of at least one")
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.batch_size = batch_size
+
+
+class StreamingPipeline:
+    """
+    Runs a chain of stages over a stream of items. Stages are connected by
+    bounded queues, so a slow stage blocks its producers instead of letting
+    work pile up in memory, and every stage runs in its own thread pool so
+    that I/O-bound stages overlap.
+
+    Output order is not preserved when a stage has more than one worker.
+
+    Args:
+        stages (List[Stage]): The stages, in order.
+        queue_size (int): Capacity of each inter-stage queue.
+        metrics (Optional[PipelineMetrics]): Receives the input queue depth
+            of every stage.
+    """
+
+    def __init__(
+        self,
+        stages: List[Stage],
+        queue_size: int = 16,
+        metrics: Optional[PipelineMetrics] = None,
+    ):
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        self.stages = stages
+        self.queue_size = queue_size
+        self.metrics = metrics
+        self.logger = RAGnarokLogger.get_logger()
+
+    def run(self, items: Iterable[Any]) -> Iterator[Any]:
+        """
+        Stream items through the pipeline, yielding the outputs of the last
+        stage as they become available.
+
+        Closing the returned generator early cancels the remaining work.
+
+        Raises:
+            PipelineError: If any stage raises.
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        cancel = threading.Event()
+        errors = []
+        threads = []
+
+        def fail(stage_name: str, error: BaseException):
+            if not errors:
+                errors.append(PipelineError(stage_name, error))
+            cancel.set()
+
+        def put(q: queue.Queue, item: Any) -> bool:
+            while not cancel.is_set():
+                try:
+                    q.put(item, timeout=_POLL_INTERVAL)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def get(q: queue.Queue) -> Any:
+            while not cancel.is_set():
+                try:
+                    return q.get(timeout=_POLL_INTERVAL)
+                except queue.Empty:
+                    continue
+            return _DONE
+
+        def feed():
+            try:
+                for item in items:
+                    if not put(queues[0], item):
+                        return
+            except BaseException as e:
+                fail("source", e)
+                return
+            put(queues[0], _DONE)
+
+        def work(stage: Stage, in_q: queue.Queue, out_q: queue.Queue, remaining: List[int], lock: threading.Lock):
+            finished = False
+            try:
+                while not finished and not cancel.is_set():
+                    item = get(in_q)
+                    if item is _DONE:
+                        break
+                    batch = [item]
+                    while len(batch) < stage.batch_size:
+                        try:
+                            item = in_q.get_nowait()
+                        except queue.Empty:
+                            break
+                        if item is _DONE:
+                            finished = True
+                            break
+                        batch.append(item)
+                    if self.metrics is not None:
+                        self.metrics.record_queue_depth(stage.name, in_q.qsize())
+
+                    outputs = stage.fn(batch if stage.batch_size > 1 else batch[0])
+                    for output in outputs or ():
+                        if not put(out_q, output):
+                            return
+            except BaseException as e:
+                self.logger.error(f"Pipeline stage '{stage.name}' failed: {e}")
+                fail(stage.name, e)
+                return
+
+            # Let sibling workers see the end of the stream, and close the
+            # next queue once the last worker of this stage is done.
+            put(in_q, _DONE)
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                put(out_q, _DONE)
+
+        threads.append(threading.Thread(target=feed, name="ragnarok-source", daemon=True))
+        for index, stage in enumerate(self.stages):
+            remaining = [stage.workers]
+            lock = threading.Lock()
+            for n in range(stage.workers):
+                threads.append(
+                    threading.Thread(
+                        target=work,
+                        args=(stage, queues[index], queues[index + 1], remaining, lock),
+                        name=f"ragnarok-{stage.name}-{n}",
+                        daemon=True,
+                    )
+                )
+
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                output = get(queues[-1])
+                if output is _DONE:
+                    break
+                yield output
+        finally:
+            cancel.set()
+            for thread in threads:
+                thread.join()
+
+        if errors:
+            raise errors[0] from errors[0].error
@@ -1,85 +1,1043 @@
-from typing import Any, Callable, Dict, List
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Union
 
-from .chunkers import ChunkOutput, get_chunker
-from .config import CrawlerConfig, RAGnarokConfig
+import numpy as np
+
+from .chunkers import BaseChunker, ChunkOutput, ParallelChunker
+from .config import CrawlerConfig, PipelineConfig, QueryConfig, RAGnarokConfig
 from .crawlers import get_crawler
-from .embedders import EmbeddingOutput, get_embedder
+from .dedup import ChunkDeduplicator
+from .embedders import (
+    BaseEmbedder,
+    CachedEmbedder,
+    EmbeddingBatch,
+    EmbeddingOutput,
+    EmbeddingQuantizer,
+    get_embedder,
+)
 from .extractors import ExtractorOutput, get_extractor
+from .incremental import IngestState, SourceFingerprint, hash_chunk, hash_text
+from .ingest import (
+    SourceReport,
+    build_chunker,
+    chunk_text,
+    extract_and_chunk,
+    init_worker,
+    with_offsets,
+)
+from .journal import WriteAheadJournal
+from .lexical import BM25Index, reciprocal_rank_fusion
 from .logger import RAGnarokLogger
-from .utils import get_source_type
-from .vectorstores import get_vectorstore
+from .metrics import PipelineMetrics, StageEvent, text_bytes
+from .pipeline import Stage, StreamingPipeline
+from .utils import get_source_type, run_in_thread
+from .utils.lru import LRUCache
+from .vectorstores import BaseVectorStore, get_vectorstore
+from .vectorstores.base import VectorStoreOutput
 
 
 class RAGnarok:
-    def __init__(self, config: RAGnarokConfig):
+    def __init__(
+        self,
+        config: RAGnarokConfig,
+        embedder: Optional[BaseEmbedder] = None,
+        vectorstore: Optional[BaseVectorStore] = None,
+    ):
+        """
+        Args:
+            config (RAGnarokConfig): The configuration.
+            embedder (Optional[BaseEmbedder]): An embedder to use instead of
+                building one from `config.embedder`.
+            vectorstore (Optional[BaseVectorStore]): A vector store to use
+                instead of building one from `config.vectorstore`.
+        """
         self.config = config
 
         # Set up logging
         RAGnarokLogger.setup_logging(level=config.log_level, file_path=config.log_file)
         self.logger = RAGnarokLogger.get_logger()
 
-        if isinstance(config.chunker, Callable):
-            self.chunker = config.chunker
-        elif config.chunker is None:
-            self.chunker = None
-        else:
-            self.chunker = get_chunker(
-                config.chunker.chunker_type, config.chunker.config
+        if embedder is None:
+            if config.embedder is None:
+                raise ValueError("RAGnarok needs an embedder config or an embedder")
+            embedder = get_embedder(
+                config.embedder.embedder_type, config.embedder.config
+            )
+        if config.embedder is not None and config.embedder.cache is not None:
+            embedder = CachedEmbedder(embedder, config.embedder.cache)
+        self.embedder = embedder
+        self.quantizer = None
+        if config.embedder is not None and config.embedder.quantization is not None:
+            self.quantizer = EmbeddingQuantizer(config.embedder.quantization)
+        self.chunker = build_chunker(config.chunker, embedder=embedder)
+        self.parallel_chunker = None
+        pipeline_config = config.pipeline or PipelineConfig()
+        if pipeline_config.chunk_processes and isinstance(self.chunker, BaseChunker):
+            self.parallel_chunker = ParallelChunker(
+                self.chunker,
+                processes=pipeline_config.chunk_processes,
+                min_size=pipeline_config.parallel_chunk_min_size,
             )
 
-        self.embedder = get_embedder(
-            config.embedder.embedder_type, config.embedder.config
-        )
-        self.vectorstore = get_vectorstore(
-            config.vectorstore.store_type, config.vectorstore.config
-        )
+        if vectorstore is None:
+            if config.vectorstore is None:
+                raise ValueError("RAGnarok needs a vector store config or a vector store")
+            vectorstore = get_vectorstore(
+                config.vectorstore.store_type, config.vectorstore.config
+            )
+        self.vectorstore = vectorstore
         self.crawler = None
         if config.crawler:
             self.crawler = get_crawler(config.crawler.type, config.crawler.config)
+        self.state = None
+        if config.incremental:
+            self.state = IngestState(config.incremental.state_path)
+        self.dedup = None
+        if config.dedup:
+            self.dedup = ChunkDeduplicator(
+                method=config.dedup.method,
+                threshold=config.dedup.threshold,
+                num_perm=config.dedup.num_perm,
+                max_distance=config.dedup.max_distance,
+                shingle_size=config.dedup.shingle_size,
+            )
+        self.lexical = None
+        if config.lexical:
+            self.lexical = BM25Index({
+                "path": config.lexical.path,
+                "k1": config.lexical.k1,
+                "b": config.lexical.b,
+                "flush_docs": config.lexical.flush_docs,
+                "max_segments": config.lexical.max_segments,
+            })
+        self._search_executor: Optional[ThreadPoolExecutor] = None
+        query_config = config.query or QueryConfig()
+        self.embedding_cache = LRUCache(query_config.embedding_cache_size)
+        self.result_cache = LRUCache(query_config.result_cache_size, ttl=query_config.result_ttl)
+        self._generation = 0
+        self.metrics = PipelineMetrics()
+        self._retries_lock = threading.Lock()
+        self._retries_seen: Dict[str, int] = {}
+        if self.crawler:
+            self.crawler.metrics = self.metrics
+        self.journal = None
+        if config.journal:
+            # Started last: replaying an interrupted run inserts right away.
+            self.journal = WriteAheadJournal(config.journal.model_dump())
+            self.journal.start(self._write_journaled)
 
     def extract(self, source: str, **kwargs) -> ExtractorOutput:
-        source_type = get_source_type(source)
-        self.logger.info(f"Extracting {source}: {source_type} ...")
+        with self.metrics.stage("extract") as event:
+            source_type = get_source_type(source)
+            self.logger.info(f"Extracting {source}: {source_type} ...")
 
-        extractor = get_extractor(source_type)
+            extractor = get_extractor(source_type)
 
-        if source_type == "url":
-            if not self.crawler:
-                self.logger.warning(
-                    "No crawler configured. Proceeding with default crawler..."
-                )
-                default_config = CrawlerConfig()
-                self.crawler = get_crawler(default_config.type, default_config.config)
-            return extractor.extract(source, crawler=self.crawler,**kwargs)
-        else:
-            return extractor.extract(source, **kwargs)
+            if source_type == "url":
+                extracted = extractor.extract(source, crawler=self.get_crawler(), **kwargs)
+            else:
+                extracted = extractor.extract(source, **kwargs)
+
+            event.items = len(extracted)
+            event.bytes = text_bytes(item.text for item in extracted)
+            return extracted
+
+    async def aextract(self, source: str, **kwargs) -> ExtractorOutput:
+        with self.metrics.stage("extract") as event:
+            source_type = get_source_type(source)
+            self.logger.info(f"Extracting {source}: {source_type} ...")
+
+            extractor = get_extractor(source_type)
+
+            if source_type == "url":
+                extracted = await extractor.aextract(source, crawler=self.get_crawler(), **kwargs)
+            else:
+                extracted = await extractor.aextract(source, **kwargs)
+
+            event.items = len(extracted)
+            event.bytes = text_bytes(item.text for item in extracted)
+            return extracted
+
+    def get_crawler(self):
+        if not self.crawler:
+            self.logger.warning(
+                "No crawler configured. Proceeding with default crawler..."
+            )
+            default_config = CrawlerConfig()
+            self.crawler = get_crawler(default_config.type, default_config.config)
+            self.crawler.metrics = self.metrics
+        return self.crawler
 
     def chunk(self, text: str, metadata: Dict[str, Any]) -> List[ChunkOutput]:
-        if isinstance(self.chunker, Callable):
-            chunks = self.chunker(text)
-        elif self.chunker is None:
-            chunks = [text]
-        else:
-            chunks = self.chunker.chunk(text)
-        return [ChunkOutput(text=chunk, metadata=metadata) for chunk in chunks]
-
-    def embed(self, chunks: List[ChunkOutput]) -> List[EmbeddingOutput]:
-        embeddings = []
-        for chunk in chunks:
-            embedding = self.embedder.embed(chunk.text)
-            embeddings.append(embedding)
-
-        return [
-            EmbeddingOutput(vector=embedding, text=chunk.text, metadata=chunk.metadata)
-            for embedding, chunk in zip(embeddings, chunks)
-        ]
+        """
+        Chunk a text. With `pipeline.chunk_processes` set, large texts are
+        chunked in a process pool, with the same result.
+        """
+        with self.metrics.stage("chunk") as event:
+            if self.parallel_chunker is not None:
+                chunks = list(with_offsets(self.parallel_chunker.iter_chunks(text), metadata))
+            else:
+                chunks = chunk_text(self.chunker, text, metadata)
+            event.items = len(chunks)
+            event.bytes = text_bytes(chunk.text for chunk in chunks)
+            return chunks
+
+    def chunk_stream(self, blocks: Iterable[str], metadata: Dict[str, Any]) -> Iterator[ChunkOutput]:
+        """
+        Lazily chunk a text that arrives as consecutive blocks, e.g. the pages
+        yielded by `PDFExtractor.iter_pages`, so chunking starts before
+        extraction finishes and the whole text is never held in memory by
+        chunkers that support streaming.
+
+        Chunks carry their character offsets in the concatenated text as
+        `chunk_start` and `chunk_end` metadata.
+        """
+        if self.chunker is None or isinstance(self.chunker, Callable):
+            yield from self.chunk("".join(blocks), metadata)
+            return
+
+        # Only time spent producing chunks is recorded, not the consumer's.
+        event = StageEvent("chunk")
+        started = time.perf_counter()
+        try:
+            for chunk in with_offsets(self.chunker.chunk_stream(blocks), metadata):
+                event.items += 1
+                event.bytes += len(chunk.text.encode("utf-8"))
+                event.wall_time += time.perf_counter() - started
+                yield chunk
+                started = time.perf_counter()
+            event.wall_time += time.perf_counter() - started
+        except Exception as e:
+            event.errors += 1
+            event.error = str(e)
+            raise
+        finally:
+            self.metrics.record(event)
+
+    async def achunk(self, text: str, metadata: Dict[str, Any]) -> List[ChunkOutput]:
+        # Chunking is CPU-bound, keep it off the event loop.
+        return await run_in_thread(self.chunk, text, metadata)
+
+    def deduplicate(self, chunks: List[ChunkOutput]) -> List[ChunkOutput]:
+        """
+        Drop chunks that duplicate, exactly or nearly, a chunk seen earlier
+        in this run. Returns the chunks unchanged unless
+        `RAGnarokConfig.dedup` is set.
+
+        `process`, `process_many` and `process_stream` each start a new run;
+        `aprocess` calls share one until `dedup.reset()`.
+        """
+        if self.dedup is None:
+            return chunks
+        with self.metrics.stage("dedup") as event:
+            kept = self.dedup.filter(chunks)
+            event.items = len(kept)
+            event.bytes = text_bytes(chunk.text for chunk in kept)
+        self.metrics.set_gauge("dedup_embeddings_saved", self.dedup.embeddings_saved)
+        return kept
+
+    def embed(self, chunks: List[ChunkOutput]) -> EmbeddingBatch:
+        if not chunks:
+            return EmbeddingBatch.from_outputs([])
+        with self.metrics.stage("embed") as event:
+            texts = [chunk.text for chunk in chunks]
+            event.items = len(texts)
+            event.bytes = text_bytes(texts)
+            event.tokens = sum(self.embedder.count_tokens(text) for text in texts)
+            try:
+                vectors = self.embedder.embed_matrix(texts)
+            finally:
+                event.retries = self._embed_retries()
+            if self.quantizer is not None:
+                vectors = self.quantizer.quantize(vectors)
+
+        return EmbeddingBatch(vectors, texts, [chunk.metadata for chunk in chunks])
+
+    async def aembed(self, chunks: List[ChunkOutput]) -> EmbeddingBatch:
+        if not chunks:
+            return EmbeddingBatch.from_outputs([])
+        with self.metrics.stage("embed") as event:
+            texts = [chunk.text for chunk in chunks]
+            event.items = len(texts)
+            event.bytes = text_bytes(texts)
+            event.tokens = sum(self.embedder.count_tokens(text) for text in texts)
+            try:
+                vectors = await self.embedder.aembed_matrix(texts)
+            finally:
+                event.retries = self._embed_retries()
+            if self.quantizer is not None:
+                vectors = self.quantizer.quantize(vectors)
+
+        return EmbeddingBatch(vectors, texts, [chunk.metadata for chunk in chunks])
+
+    def insert(self, embeddings: Iterable[EmbeddingOutput]) -> List[VectorStoreOutput]:
+        """
+        Insert embeddings into the vector store. With `RAGnarokConfig.journal`
+        they are only journaled, and written to the vector store in the
+        background; the results are then "queued", with journal keys as IDs.
+        """
+        # The streaming pipeline regroups the rows of several embed batches;
+        # consecutive rows of one batch are sliced without copying.
+        embeddings = EmbeddingBatch.from_outputs(embeddings)
+        if self.journal is not None:
+            return self._journal(embeddings)
+        return self._insert_now(embeddings)
+
+    def _insert_now(self, embeddings: EmbeddingBatch) -> List[VectorStoreOutput]:
+        with self.metrics.stage("insert") as event:
+            try:
+                results = self.vectorstore.insert(embeddings)
+            finally:
+                event.retries = self._insert_retries()
+            event.items = len(embeddings)
+            event.errors = sum(1 for result in results or () if result.status != "success")
+        self._record_inserted(embeddings, results)
+        return results
+
+    async def ainsert(self, embeddings: Iterable[EmbeddingOutput]) -> List[VectorStoreOutput]:
+        embeddings = EmbeddingBatch.from_outputs(embeddings)
+        if self.journal is not None:
+            return await run_in_thread(self._journal, embeddings)
+        with self.metrics.stage("insert") as event:
+            try:
+                results = await self.vectorstore.ainsert(embeddings)
+            finally:
+                event.retries = self._insert_retries()
+            event.items = len(embeddings)
+            event.errors = sum(1 for result in results or () if result.status != "success")
+        self._record_inserted(embeddings, results)
+        return results
+
+    def _new_retries(self, counter: str, total: int) -> int:
+        """
+        Retries counted by the embedder, vector store or journal since the
+        last stage event took them. Concurrent calls share the counters, so
+        each retry goes to exactly one event rather than to every call that
+        overlapped it.
+        """
+        with self._retries_lock:
+            new = total - self._retries_seen.get(counter, 0)
+            self._retries_seen[counter] = total
+        return max(new, 0)
+
+    def _embed_retries(self) -> int:
+        return self._new_retries("embedder", self.embedder.retries)
+
+    def _insert_retries(self) -> int:
+        # Journal retries are waits between attempts of journaled inserts.
+        retries = self._new_retries("vectorstore", self.vectorstore.retries)
+        if self.journal is not None:
+            retries += self._new_retries("journal", self.journal.retries)
+        return retries
+
+    def _journal(self, embeddings: EmbeddingBatch) -> List[VectorStoreOutput]:
+        with self.metrics.stage("journal") as event:
+            results = self.journal.append(embeddings)
+            event.items = len(results)
+        # Journaled chunks will be written, so their duplicates are not
+        # requeued; the vector store IDs replace the keys once written.
+        if self.dedup is not None:
+            self.dedup.record_ids(embeddings.metadata, [result.id for result in results])
+        self.metrics.set_gauge("journal_pending_rows", len(self.journal))
+        return results
+
+    def _write_journaled(self, embeddings: EmbeddingBatch, rewrite: bool) -> List[VectorStoreOutput]:
+        """
+        Write journaled rows to the vector store. With `rewrite`, the rows
+        may already be there from an interrupted attempt, and are deleted by
+        their journal keys first.
+        """
+        if rewrite:
+            keys = {self.journal.key_field: [metadata[self.journal.key_field] for metadata in embeddings.metadata]}
+            self.vectorstore.delete([], filter=keys)
+            if self.lexical is not None:
+                self.lexical.delete([], filter=keys)
+            self._invalidate_results()
+        results = self._insert_now(embeddings)
+        self.metrics.set_gauge("journal_pending_rows", len(self.journal))
+        return results
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until all journaled embeddings are in the vector store. Returns
+        at once without `RAGnarokConfig.journal`.
+
+        Returns:
+            bool: False if embeddings were still waiting after `timeout`
+                seconds.
+        """
+        if self.journal is None:
+            return True
+        return self.journal.flush(timeout)
+
+    def _record_inserted(self, embeddings: EmbeddingBatch, results: List[VectorStoreOutput]) -> None:
+        if not results:
+            return
+        self._invalidate_results()
+        ids = [result.id if result.status == "success" else None for result in results]
+        # Lets the deduplicator map dropped chunks to the IDs of kept ones.
+        if self.dedup is not None:
+            self.dedup.record_ids(embeddings.metadata, ids)
+        # The lexical index is keyed by vector store ID, so its results can
+        # be fused with vector search results.
+        if self.lexical is not None:
+            self.lexical.add(ids, embeddings.texts, embeddings.metadata)
+
+    def _start_dedup_run(self) -> None:
+        # Chunks of earlier runs are not duplicates, e.g. when an edited
+        # source is processed again.
+        if self.dedup is not None:
+            self.dedup.reset()
+
+    def _requeue_duplicates(self) -> List[VectorStoreOutput]:
+        """
+        Embed and insert duplicates in place of kept chunks that failed, so
+        their content is not lost.
+        """
+        if self.dedup is None:
+            return []
+        chunks = self.dedup.requeue()
+        if not chunks:
+            return []
+        self.logger.info(f"Re-queueing {len(chunks)} duplicate chunks whose kept chunk failed")
+        return self.insert(self.embed(chunks))
+
+    def _delete_vectors(self, ids: List[Any]) -> None:
+        try:
+            self.vectorstore.delete(ids)
+            if self.lexical is not None:
+                self.lexical.delete(ids)
+        finally:
+            self._invalidate_results()
+
+    def query(
+        self,
+        text: str,
+        k: int = 5,
+        filters: Optional[Union[str, Dict[str, Any]]] = None,
+        mode: Optional[str] = None,
+    ) -> List[VectorStoreOutput]:
+        """
+        Retrieve the chunks that best match a query, see `query_many`.
+        """
+        return self.query_many([text], k, filters, mode)[0]
+
+    def query_many(
+        self,
+        texts: List[str],
+        k: int = 5,
+        filters: Optional[Union[str, Dict[str, Any]]] = None,
+        mode: Optional[str] = None,
+    ) -> List[List[VectorStoreOutput]]:
+        """
+        Retrieve the chunks that best match each of several queries.
+
+        Results are cached for `QueryConfig.result_ttl` seconds, and query
+        embeddings in an LRU cache, so repeated queries skip the embedding
+        round trip and the search. Every insert and delete starts a new
+        generation of the result cache; results of earlier generations are
+        never returned. Queries that miss the caches are embedded in one
+        batch and searched with one `search_many` call.
+
+        Args:
+            texts (List[str]): The queries.
+            k (int): Results per query.
+            filters (Optional[Union[str, Dict[str, Any]]]): A dict of required
+                metadata values, or an expression in the vector store's
+                filter language. The lexical search only applies dict filters;
+                with an expression, hybrid search falls back to vector search.
+            mode (Optional[str]): "vector", "lexical" or "hybrid". Defaults to
+                "hybrid" if a lexical index is configured, else "vector".
+
+        Returns:
+            List[List[VectorStoreOutput]]: The best chunks of every query,
+                best first. `score` is the vector store's score, the BM25
+                score or the fused score.
+        """
+        mode = self._search_mode(mode, filters)
+        generation = self._generation
+        keys = [self._result_key(text, k, filters, mode, generation) for text in texts]
+        results = [self.result_cache.get(key) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            fresh = self._search_many([texts[i] for i in missing], k, filters, mode)
+            for i, result in zip(missing, fresh):
+                results[i] = result
+                # Results of a search that overlapped an insert or delete
+                # may be stale, so they are not cached.
+                if generation == self._generation:
+                    self.result_cache.put(keys[i], result)
+        self._record_query_caches()
+        return [list(result) for result in results]
+
+    async def aquery(
+        self,
+        text: str,
+        k: int = 5,
+        filters: Optional[Union[str, Dict[str, Any]]] = None,
+        mode: Optional[str] = None,
+    ) -> List[VectorStoreOutput]:
+        """
+        Async counterpart of `query`.
+        """
+        return (await self.aquery_many([text], k, filters, mode))[0]
+
+    async def aquery_many(
+        self,
+        texts: List[str],
+        k: int = 5,
+        filters: Optional[Union[str, Dict[str, Any]]] = None,
+        mode: Optional[str] = None,
+    ) -> List[List[VectorStoreOutput]]:
+        """
+        Async counterpart of `query_many`.
+        """
+        mode = self._search_mode(mode, filters)
+        generation = self._generation
+        keys = [self._result_key(text, k, filters, mode, generation) for text in texts]
+        results = [self.result_cache.get(key) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            fresh = await self._asearch_many([texts[i] for i in missing], k, filters, mode)
+            for i, result in zip(missing, fresh):
+                results[i] = result
+                if generation == self._generation:
+                    self.result_cache.put(keys[i], result)
+        self._record_query_caches()
+        return [list(result) for result in results]
+
+    def search(
+        self,
+        text: str,
+        k: int = 5,
+        filter: Optional[Union[str, Dict[str, Any]]] = None,
+        mode: Optional[str] = None,
+    ) -> List[VectorStoreOutput]:
+        """
+        Like `query`, but always searches instead of returning cached
+        results.
+
+        Hybrid search runs the vector search and the BM25 search of
+        `RAGnarokConfig.lexical` in parallel, `k` results each, and merges
+        them by reciprocal rank fusion: chunks found by both rank first, and
+        exact identifiers that the embedding blurs are still found.
+        """
+        return self._search_many([text], k, filter, self._search_mode(mode, filter))[0]
+
+    async def asearch(
+        self,
+        text: str,
+        k: int = 5,
+        filter: Optional[Union[str, Dict[str, Any]]] = None,
+        mode: Optional[str] = None,
+    ) -> List[VectorStoreOutput]:
+        """
+        Async counterpart of `search`.
+        """
+        return (await self._asearch_many([text], k, filter, self._search_mode(mode, filter)))[0]
+
+    def _search_many(self, texts: List[str], k: int, filter, mode: str) -> List[List[VectorStoreOutput]]:
+        with self.metrics.stage("search") as event:
+            event.items = len(texts)
+            if mode == "lexical":
+                return [self.lexical.search(text, k, filter) for text in texts]
+            lexical = None
+            if mode == "hybrid":
+                if self._search_executor is None:
+                    self._search_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ragnarok-search")
+                # Runs while the queries are embedded and searched here.
+                lexical = self._search_executor.submit(
+                    lambda: [self.lexical.search(text, k, filter) for text in texts]
+                )
+            vector = self.vectorstore.search_many(self._query_embeddings(texts), k, filter)
+            if lexical is None:
+                return vector
+            return [
+                reciprocal_rank_fusion([hits, lexical_hits], k, rrf_k=self.config.lexical.rrf_k)
+                for hits, lexical_hits in zip(vector, lexical.result())
+            ]
+
+    async def _asearch_many(self, texts: List[str], k: int, filter, mode: str) -> List[List[VectorStoreOutput]]:
+        with self.metrics.stage("search") as event:
+            event.items = len(texts)
+
+            def lexical_search() -> List[List[VectorStoreOutput]]:
+                return [self.lexical.search(text, k, filter) for text in texts]
+
+            async def vector_search() -> List[List[VectorStoreOutput]]:
+                vectors = await self._aquery_embeddings(texts)
+                return await self.vectorstore.asearch_many(vectors, k, filter=filter)
+
+            if mode == "lexical":
+                return await run_in_thread(lexical_search)
+            if mode == "vector":
+                return await vector_search()
+            vector, lexical = await asyncio.gather(vector_search(), run_in_thread(lexical_search))
+            return [
+                reciprocal_rank_fusion([hits, lexical_hits], k, rrf_k=self.config.lexical.rrf_k)
+                for hits, lexical_hits in zip(vector, lexical)
+            ]
+
+    def _search_mode(self, mode: Optional[str], filter: Optional[Union[str, Dict[str, Any]]]) -> str:
+        if mode is None:
+            mode = "hybrid" if self.lexical is not None else "vector"
+        if mode not in ("vector", "lexical", "hybrid"):
+            raise ValueError(f"Unknown search mode: {mode}")
+        if mode != "vector" and self.lexical is None:
+            raise ValueError(f"{mode} search needs a lexical index, set `RAGnarokConfig.lexical`")
+        if mode == "hybrid" and isinstance(filter, str):
+            return "vector"
+        return mode
+
+    @staticmethod
+    def _query_key(text: str) -> str:
+        return " ".join(text.split())
+
+    def _result_key(self, text: str, k: int, filter, mode: str, generation: int) -> tuple:
+        return generation, self._query_key(text), k, json.dumps(filter, sort_keys=True, default=str), mode
+
+    def _query_embeddings(self, texts: List[str]) -> np.ndarray:
+        vectors, missing = self._cached_query_embeddings(texts)
+        if missing:
+            self._store_query_embeddings(vectors, missing, self.embedder.embed_matrix(list(missing)))
+        return np.stack(vectors)
 
-    def insert(self, embeddings: List[EmbeddingOutput]) -> None:
-        self.vectorstore.insert(embeddings)
+    async def _aquery_embeddings(self, texts: List[str]) -> np.ndarray:
+        vectors, missing = self._cached_query_embeddings(texts)
+        if missing:
+            self._store_query_embeddings(vectors, missing, await self.embedder.aembed_matrix(list(missing)))
+        return np.stack(vectors)
 
-    def process(self, source: str) -> None:
-        extracted = self.extract(source)
+    def _cached_query_embeddings(self, texts: List[str]):
+        """
+        Cached embeddings of the queries, with `None` for misses, and the
+        distinct missing queries with the indexes they fill.
+        """
+        vectors = []
+        missing: Dict[str, List[int]] = {}
+        for i, text in enumerate(texts):
+            key = self._query_key(text)
+            vector = self.embedding_cache.get(key)
+            vectors.append(vector)
+            if vector is None:
+                missing.setdefault(key, []).append(i)
+        return vectors, missing
+
+    def _store_query_embeddings(self, vectors: list, missing: Dict[str, List[int]], computed: np.ndarray) -> None:
+        # Queries must be quantized like the stored vectors.
+        if self.quantizer is not None:
+            computed = self.quantizer.quantize(computed)
+        for (key, indexes), vector in zip(missing.items(), computed):
+            vector = np.array(vector)
+            self.embedding_cache.put(key, vector)
+            for i in indexes:
+                vectors[i] = vector
+
+    def _invalidate_results(self) -> None:
+        # Cached results of earlier generations no longer match the stores.
+        self._generation += 1
+        self.result_cache.clear()
+
+    def _record_query_caches(self) -> None:
+        self.metrics.set_gauge("query_embedding_cache_hit_rate", self.embedding_cache.stats()["hit_rate"])
+        self.metrics.set_gauge("query_result_cache_hit_rate", self.result_cache.stats()["hit_rate"])
+
+    def process(self, source: str, stream: bool = False, **kwargs) -> Optional[SourceReport]:
+        if self.state is not None and not stream:
+            return self.process_incremental(source, **kwargs)
+
+        if stream:
+            for _ in self.process_stream(source, **kwargs):
+                pass
+            return
+
+        self._start_dedup_run()
+        extracted = self.extract(source, **kwargs)
         for item in extracted:
-            chunks = self.chunk(item.text, item.metadata)
+            chunks = self.deduplicate(self.chunk(item.text, item.metadata))
             embeddings = self.embed(chunks)
             self.insert(embeddings)
+        self._requeue_duplicates()
+
+    def process_incremental(self, source: str, **kwargs) -> SourceReport:
+        """
+        Process a source, skipping what is already in the vector store.
+        Requires `RAGnarokConfig.incremental`.
+
+        Files whose size, modification time or content hash are unchanged are
+        not extracted at all. For changed files and crawled pages, only chunks
+        whose text is new are embedded and inserted, and chunks that no longer
+        exist are deleted from the vector store. Pages that answered 404 or
+        410, or that a crawl without failed pages no longer reached, are
+        deleted too; after a crawl with failures, pages it did not reach are
+        kept. A file is only skipped once all of its items were synced.
+        Chunks are not deduplicated across documents here, as deleting a
+        kept chunk would orphan its duplicates.
+
+        Args:
+            source (str): The source to process.
+            **kwargs: Passed on to `extract`.
+
+        Returns:
+            SourceReport: What was inserted, skipped and deleted.
+        """
+        if self.state is None:
+            raise ValueError("Incremental processing requires RAGnarokConfig.incremental")
+
+        report = SourceReport(source)
+        source_type = get_source_type(source)
+        file_fingerprint = None
+        if source_type != "url":
+            unchanged, file_fingerprint = self.state.is_file_unchanged(source)
+            if unchanged:
+                self.logger.info(f"Skipping unchanged source {source}")
+                report.status = "unchanged"
+                return report
+            # Recorded again once every item is synced.
+            self.state.remove_file(source)
+
+        extracted = self.extract(source, **kwargs)
+        documents = set()
+        complete = True
+        for index, item in enumerate(extracted):
+            if source_type == "url":
+                document = item.metadata.get("url", source)
+                fingerprint = SourceFingerprint(hash_text(item.text), etag=item.metadata.get("etag"))
+            else:
+                document = source if index == 0 else f"{source}#{index}"
+                fingerprint = SourceFingerprint(hash_text(item.text))
+            documents.add(document)
+
+            previous = self.state.get_fingerprint(document)
+            if previous and previous.content_hash == fingerprint.content_hash:
+                report.skipped_count += len(self.state.get_chunks(document))
+                continue
+            complete = self._sync_document(document, source, item, fingerprint, report) and complete
+
+        # A page missing from a crawl is only stale if it is gone, or if the
+        # crawl fetched every page it reached; otherwise it may just be
+        # behind a page that failed this time.
+        crawl_complete = getattr(extracted, "complete", True)
+        gone = getattr(extracted, "gone", set())
+        if not crawl_complete:
+            report.error = report.error or f"Crawl incomplete, {len(getattr(extracted, 'failed', ()))} pages failed"
+        for document in self.state.get_documents(source):
+            if document in documents:
+                continue
+            if crawl_complete or document in gone:
+                self.logger.info(f"Removing stale document {document}")
+                report.deleted_count += self._delete_document(document)
+
+        if file_fingerprint is not None and complete:
+            self.state.set_file_fingerprint(source, file_fingerprint)
+
+        report.status = "error" if report.error else "success"
+        self.logger.info(
+            f"Processed {source}: {report.inserted_count} inserted, "
+            f"{report.skipped_count} unchanged, {report.deleted_count} deleted"
+        )
+        return report
+
+    def remove_source(self, source: str) -> int:
+        """
+        Delete every chunk ingested from a source by `process_incremental`.
+
+        Returns:
+            int: The number of chunks deleted.
+        """
+        if self.state is None:
+            raise ValueError("Removing sources requires RAGnarokConfig.incremental")
+
+        documents = set(self.state.get_documents(source))
+        if self.state.get_fingerprint(source):
+            documents.add(source)
+        self.state.remove_file(source)
+        return sum(self._delete_document(document) for document in documents)
+
+    def _sync_document(
+        self,
+        document: str,
+        parent: str,
+        item: ExtractorOutput,
+        fingerprint: SourceFingerprint,
+        report: SourceReport,
+    ) -> bool:
+        """
+        Bring the chunks of a document in line with its current text.
+
+        Returns:
+            bool: Whether every new chunk was inserted.
+        """
+        existing = self.state.get_chunks(document)
+        current = {}
+        for chunk in self.chunk(item.text, item.metadata):
+            current.setdefault(hash_chunk(chunk.text, chunk.metadata), chunk)
+
+        new = [chunk_hash for chunk_hash in current if chunk_hash not in existing]
+        stale = [chunk_hash for chunk_hash in existing if chunk_hash not in current]
+        report.chunk_count += len(current)
+        report.skipped_count += len(current) - len(new)
+
+        complete = True
+        if new:
+            # The ingest state records vector store IDs, so this bypasses the
+            # journal.
+            results = self._insert_now(self.embed([current[chunk_hash] for chunk_hash in new])) or []
+            vector_ids = {}
+            for chunk_hash, result in zip(new, results):
+                if result.status == "success":
+                    vector_ids[chunk_hash] = result.id
+                else:
+                    complete = False
+                    report.error = report.error or result.error
+            self.state.add_chunks(document, vector_ids)
+            report.inserted_count += len(vector_ids)
+            complete = complete and len(results) == len(new)
+
+        if stale:
+            self._delete_vectors([existing[chunk_hash] for chunk_hash in stale])
+            self.state.remove_chunks(document, stale)
+            report.deleted_count += len(stale)
+
+        # Only a fully synced document is skipped next time; otherwise the
+        # missing chunks are retried.
+        if complete:
+            self.state.set_fingerprint(document, parent, fingerprint)
+        return complete
+
+    def _delete_document(self, document: str) -> int:
+        vector_ids = list(self.state.get_chunks(document).values())
+        if vector_ids:
+            self._delete_vectors(vector_ids)
+        self.state.remove_document(document)
+        return len(vector_ids)
+
+    async def aprocess(self, source: str, **kwargs) -> None:
+        """
+        Async counterpart of `process`. Blocking work runs off the event
+        loop, so many sources can be processed concurrently, e.g. with
+        `asyncio.gather`. Embedding concurrency is bounded by the embedder's
+        `concurrency` setting.
+        """
+        extracted = await self.aextract(source, **kwargs)
+
+        async def process_item(item: ExtractorOutput) -> None:
+            chunks = await self.achunk(item.text, item.metadata)
+            chunks = await run_in_thread(self.deduplicate, chunks)
+            embeddings = await self.aembed(chunks)
+            await self.ainsert(embeddings)
+
+        await asyncio.gather(*(process_item(item) for item in extracted))
+
+    def process_many(
+        self, sources: Iterable[str], workers: Optional[int] = None, **kwargs
+    ) -> List[SourceReport]:
+        """
+        Process many sources, extracting and chunking them in a pool of
+        worker processes so CPU-bound parsing scales across cores. Chunks are
+        embedded and inserted in this process by `pipeline.embed_workers`
+        threads as soon as each source is chunked.
+
+        A failing source does not stop the others; its error is recorded in
+        its report.
+
+        Args:
+            sources (Iterable[str]): The sources to process.
+            workers (Optional[int]): Number of extraction processes. Defaults
+                to the number of CPUs.
+            **kwargs: Passed on to the extractor for every source.
+
+        Returns:
+            List[SourceReport]: One report per source, in input order.
+        """
+        reports = [SourceReport(source) for source in sources]
+        workers = workers or os.cpu_count() or 1
+        self._start_dedup_run()
+        pipeline_config = self.config.pipeline or PipelineConfig()
+        # Bounds the number of sources held in memory between extraction and
+        # insertion, so a slow embedder applies backpressure to extraction.
+        max_in_flight = 2 * workers + pipeline_config.embed_workers
+        # Chunkers that embed sentences use this process's embedder, so the
+        # workers only extract.
+        chunk_in_workers = not getattr(self.chunker, "requires_embedder", False)
+
+        def embed_and_insert(report: SourceReport, chunks: List[ChunkOutput]) -> None:
+            try:
+                if not chunk_in_workers:
+                    started = time.perf_counter()
+                    chunks = [chunk for item in chunks for chunk in self.chunk(item.text, item.metadata)]
+                    report.timings["chunk"] = time.perf_counter() - started
+                    report.chunk_count = len(chunks)
+
+                kept = self.deduplicate(chunks)
+                report.skipped_count = len(chunks) - len(kept)
+                chunks = kept
+
+                started = time.perf_counter()
+                embeddings = self.embed(chunks)
+                report.timings["embed"] = time.perf_counter() - started
+
+                started = time.perf_counter()
+                results = self.insert(embeddings) or []
+                report.timings["insert"] = time.perf_counter() - started
+            except Exception as e:
+                self.logger.error(f"Failed to embed or insert {report.source}: {e}")
+                report.status = "error"
+                report.error = str(e)
+                return
+
+            failed = [result for result in results if result.status not in ("success", "queued")]
+            report.inserted_count = len(results) - len(failed)
+            if failed:
+                report.status = "error"
+                report.error = failed[0].error
+            else:
+                report.status = "success"
+
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=init_worker,
+            initargs=(self.config.chunker, self.config.crawler, chunk_in_workers),
+        ) as processes, ThreadPoolExecutor(
+            max_workers=pipeline_config.embed_workers
+        ) as threads:
+            remaining = iter(reports)
+            extracting = {}
+            inserting = set()
+
+            while True:
+                while len(extracting) + len(inserting) < max_in_flight:
+                    report = next(remaining, None)
+                    if report is None:
+                        break
+                    future = processes.submit(extract_and_chunk, report.source, kwargs)
+                    extracting[future] = report
+
+                if not extracting and not inserting:
+                    break
+
+                done, _ = wait(set(extracting) | inserting, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in inserting:
+                        inserting.discard(future)
+                        continue
+
+                    report = extracting.pop(future)
+                    try:
+                        chunks, events = future.result()
+                    except Exception as e:
+                        self.logger.error(f"Failed to extract {report.source}: {e}")
+                        report.status = "error"
+                        report.error = str(e)
+                        self.metrics.record(StageEvent("extract", errors=1, error=str(e)))
+                        continue
+
+                    for event in events:
+                        self.metrics.record(event)
+                        report.timings[event.stage] = event.wall_time
+                    report.chunk_count = len(chunks)
+                    inserting.add(threads.submit(embed_and_insert, report, chunks))
+
+        self._requeue_duplicates()
+        return reports
+
+    def process_stream(
+        self, sources: Union[str, Iterable[str]], **kwargs
+    ) -> Iterator[VectorStoreOutput]:
+        """
+        Process sources as a stream: extraction, chunking, embedding and
+        insertion run concurrently, each in its own worker pool, connected by
+        bounded queues as configured by `RAGnarokConfig.pipeline`.
+
+        Args:
+            sources (Union[str, Iterable[str]]): A source or an iterable of
+                sources. Iterables are consumed lazily.
+            **kwargs: Passed on to `extract` for every source.
+
+        Yields:
+            VectorStoreOutput: The insert result of each chunk, as soon as it
+                is available.
+
+        Raises:
+            PipelineError: If any stage fails. The remaining work is cancelled.
+        """
+        if isinstance(sources, str):
+            sources = [sources]
+
+        pipeline_config = self.config.pipeline or PipelineConfig()
+        stages = [
+            Stage(
+                "extract",
+                lambda source: self.extract(source, **kwargs),
+                workers=pipeline_config.extract_workers,
+            ),
+            Stage(
+                "chunk",
+                lambda item: self.chunk(item.text, item.metadata),
+                workers=pipeline_config.chunk_workers,
+            ),
+        ]
+        if self.dedup is not None:
+            stages.append(
+                Stage("dedup", self.deduplicate, batch_size=self.embedder.max_batch_size)
+            )
+        stages += [
+            Stage(
+                "embed",
+                self.embed,
+                workers=pipeline_config.embed_workers,
+                batch_size=self.embedder.max_batch_size,
+            ),
+            Stage(
+                "insert",
+                self.insert,
+                workers=pipeline_config.insert_workers,
+                batch_size=pipeline_config.insert_batch_size,
+            ),
+        ]
+        pipeline = StreamingPipeline(
+            stages,
+            queue_size=pipeline_config.queue_size,
+            metrics=self.metrics,
+        )
+        self._start_dedup_run()
+
+        def run() -> Iterator[VectorStoreOutput]:
+            yield from pipeline.run(sources)
+            yield from self._requeue_duplicates()
+
+        return run()
+
+    def close(self) -> None:
+        """
+        Write the journaled embeddings to the vector store, shut down the
+        chunking process pool, close the local incremental state database
+        and the lexical index, and release the embedder's and vector store's
+        resources.
+        """
+        if self.journal is not None:
+            self.journal.close(self.config.journal.close_timeout)
+        if self.parallel_chunker is not None:
+            self.parallel_chunker.close()
+        if self.state is not None:
+            self.state.close()
+        if self.lexical is not None:
+            self.lexical.close()
+        if self._search_executor is not None:
+            self._search_executor.shutdown()
+            self._search_executor = None
+        self.embedder.close()
+        self.vectorstore.close()
+
+    async def aclose(self) -> None:
+        """
+        Async counterpart of `close`. Closes the embedder's async clients on
+        the running event loop, then the rest off the loop.
+        """
+        await self.embedder.aclose()
+        await run_in_thread(self.close)
@@ -1,5 +1,8 @@
+from .aio import AsyncLimiter, run_in_thread
 from .source import get_source_type
 
 __all__ = [
-    "get_source_type"
-]
\ No newline at end of file
+    "AsyncLimiter",
+    "get_source_type",
+    "run_in_thread",
+]
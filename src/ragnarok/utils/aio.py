@@ -0,0 +1,44 @@
+import asyncio
+import functools
+import weakref
+from typing import Any, Callable
+
+
+async def run_in_thread(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Run a blocking callable in the event loop's default executor, so that
+    sync backends can be awaited without blocking the loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(fn, *args, **kwargs))
+
+
+class AsyncLimiter:
+    """
+    Bounds the number of concurrent operations on each running event loop.
+
+    asyncio semaphores are bound to the loop they are first used on, so one
+    semaphore is kept per loop. This lets a component be shared across loops,
+    e.g. when `asyncio.run` is called several times.
+    """
+
+    def __init__(self, limit: int):
+        if limit < 1:
+            raise ValueError("Concurrency limit must be at least 1")
+        self.limit = limit
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.limit)
+            self._semaphores[loop] = semaphore
+        return semaphore
+
+    async def __aenter__(self) -> "AsyncLimiter":
+        await self._semaphore().acquire()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._semaphore().release()
@@ -0,0 +1,354 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional, Tuple
+
+# What `classify` returns for a retryable error: whether the error was a
+# rate limit, and the delay the server asked for, if any.
+RetryDecision = Tuple[bool, Optional[float]]
+
+
+def parse_retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """
+    Read the delay requested by a server from `retry-after-ms` or
+    `retry-after` (seconds or an HTTP date).
+
+    Returns:
+        Optional[float]: The delay in seconds, or `None` if there is none.
+    """
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket that refills at `rate` per second up to
+    `capacity`.
+
+    Callers reserve what they need and wait for the returned delay, so
+    reservations are served in order and the bucket may go into debt. An
+    amount larger than the capacity waits for a full bucket.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        if rate <= 0 or capacity <= 0:
+            raise ValueError("Token bucket rate and capacity must be greater than 0")
+        self.rate = rate
+        self.capacity = capacity
+        self._level = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """
+        Take `amount` from the bucket.
+
+        Returns:
+            float: Seconds to wait before using it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = max(0.0, (min(amount, self.capacity) - self._level) / self.rate)
+            self._level -= amount
+            return wait
+
+
+class AdaptiveConcurrency:
+    """
+    Limits concurrent requests with a limit that adapts to the backend
+    (additive increase, multiplicative decrease).
+
+    While every slot is busy and the recent average latency stays within
+    `latency_tolerance` times the baseline (the lowest latency seen), the
+    limit grows by about one per round of requests. A rate limit error or a
+    rise in latency cuts it by `decrease_factor`, at most once per round:
+    requests started before the last cut do not cut it again.
+
+    Slots can be acquired from threads with `acquire` and from any event loop
+    with `aacquire`; waiters are served first come, first served.
+    """
+
+    def __init__(
+        self,
+        initial: int = 4,
+        minimum: int = 1,
+        maximum: int = 64,
+        latency_tolerance: float = 1.5,
+        decrease_factor: float = 0.5,
+    ):
+        if not 1 <= minimum <= initial <= maximum:
+            raise ValueError("Concurrency limits must satisfy 1 <= minimum <= initial <= maximum")
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_tolerance = latency_tolerance
+        self.decrease_factor = decrease_factor
+        self.baseline: Optional[float] = None
+        self.latency: Optional[float] = None
+        self.in_flight = 0
+        self._decreased_at = 0.0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    def _try_acquire(self) -> bool:
+        if not self._waiters and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return True
+        return False
+
+    def acquire(self) -> None:
+        with self._lock:
+            if self._try_acquire():
+                return
+            event = threading.Event()
+            self._waiters.append(event.set)
+        event.wait()
+
+    async def aacquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._try_acquire():
+                return
+            future = loop.create_future()
+
+            def wake() -> None:
+                loop.call_soon_threadsafe(self._grant, future)
+
+            self._waiters.append(wake)
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if wake in self._waiters:
+                    self._waiters.remove(wake)
+                    raise
+            # The slot was handed over; give it back unless `_grant` will.
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def _grant(self, future: asyncio.Future) -> None:
+        if future.cancelled():
+            self.release()
+        else:
+            future.set_result(None)
+
+    def release(self, started: Optional[float] = None, latency: Optional[float] = None, throttled: bool = False) -> None:
+        """
+        Free a slot and adapt the limit.
+
+        Args:
+            started (Optional[float]): `time.monotonic()` when the request was
+                sent. Without it, the limit is not changed.
+            latency (Optional[float]): Seconds the request took, if it succeeded.
+            throttled (bool): Whether the request hit a rate limit.
+        """
+        with self._lock:
+            if started is not None:
+                self._adapt(started, latency, throttled)
+            self.in_flight -= 1
+            wakes = []
+            while self._waiters and self.in_flight < int(self.limit):
+                self.in_flight += 1
+                wakes.append(self._waiters.popleft())
+        for wake in wakes:
+            wake()
+
+    def _adapt(self, started: float, latency: Optional[float], throttled: bool) -> None:
+        if latency is not None:
+            # A moving average, so a single slow response does not count as
+            # congestion.
+            self.latency = latency if self.latency is None else self.latency + 0.1 * (latency - self.latency)
+            # A minimum that slowly follows the latency up, so a lasting
+            # change of the backend or of request sizes becomes the new
+            # baseline.
+            if self.baseline is None or latency < self.baseline:
+                self.baseline = latency
+            else:
+                self.baseline += 0.002 * (latency - self.baseline)
+
+        slow = latency is not None and self.latency > self.latency_tolerance * self.baseline
+        if throttled or slow:
+            if started >= self._decreased_at:
+                self.limit = max(float(self.minimum), self.limit * self.decrease_factor)
+                self._decreased_at = time.monotonic()
+        elif latency is not None and self.in_flight >= int(self.limit):
+            self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+
+
+class RequestScheduler:
+    """
+    Sends requests within requests-per-minute and tokens-per-minute quotas,
+    with adaptive concurrency and retries.
+
+    Each request first takes a concurrency slot, then waits for its share of
+    both quotas. Failed requests that `classify` marks as retryable are
+    retried up to `max_retries` times after the delay the server asked for
+    (`Retry-After`), or after an exponential backoff with full jitter. A
+    requested delay pauses all requests, not just the failed one, since the
+    quota is shared.
+
+    Args:
+        requests_per_minute (Optional[float]): Request quota. Unlimited if `None`.
+        tokens_per_minute (Optional[float]): Token quota. Unlimited if `None`.
+        concurrency (int): Initial concurrency limit.
+        max_concurrency (int): Upper bound of the concurrency limit.
+        max_retries (int): Retries per request.
+        backoff (float): Base delay of the exponential backoff, in seconds.
+        max_backoff (float): Upper bound of a backoff delay, in seconds.
+        burst_seconds (float): Seconds of quota that may be used at once.
+        classify (Callable[[BaseException], Optional[RetryDecision]]): Returns
+            `None` for errors that must not be retried, else whether the error
+            was a rate limit and the delay the server asked for.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        concurrency: int = 4,
+        max_concurrency: int = 64,
+        max_retries: int = 6,
+        backoff: float = 0.5,
+        max_backoff: float = 60.0,
+        burst_seconds: float = 1.0,
+        classify: Optional[Callable[[BaseException], Optional[RetryDecision]]] = None,
+    ):
+        self.request_bucket = (
+            TokenBucket(requests_per_minute / 60, max(1.0, requests_per_minute / 60 * burst_seconds))
+            if requests_per_minute
+            else None
+        )
+        self.token_bucket = (
+            TokenBucket(tokens_per_minute / 60, tokens_per_minute / 60 * burst_seconds)
+            if tokens_per_minute
+            else None
+        )
+        self.concurrency = AdaptiveConcurrency(concurrency, maximum=max(concurrency, max_concurrency))
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.classify = classify or (lambda exc: None)
+
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def call(self, fn: Callable[[], Any], tokens: int = 0) -> Any:
+        """
+        Call `fn` within the quotas, retrying retryable errors.
+
+        Args:
+            fn (Callable[[], Any]): Sends the request.
+            tokens (int): Tokens the request uses.
+
+        Returns:
+            Any: The result of `fn`.
+        """
+        attempt = 0
+        while True:
+            self.concurrency.acquire()
+            started = None
+            try:
+                time.sleep(self._reserve(tokens))
+                started = time.monotonic()
+                result = fn()
+            except Exception as exc:
+                delay = self._failed(exc, attempt, started)
+                if delay is None:
+                    raise
+            except BaseException:
+                self.concurrency.release()
+                raise
+            else:
+                self.concurrency.release(started, time.monotonic() - started)
+                return result
+            attempt += 1
+            time.sleep(delay)
+
+    async def acall(self, fn: Callable[[], Awaitable[Any]], tokens: int = 0) -> Any:
+        """
+        Async counterpart of `call`, for an `fn` that returns an awaitable.
+        """
+        attempt = 0
+        while True:
+            await self.concurrency.aacquire()
+            started = None
+            try:
+                await asyncio.sleep(self._reserve(tokens))
+                started = time.monotonic()
+                result = await fn()
+            except Exception as exc:
+                delay = self._failed(exc, attempt, started)
+                if delay is None:
+                    raise
+            except BaseException:
+                self.concurrency.release()
+                raise
+            else:
+                self.concurrency.release(started, time.monotonic() - started)
+                return result
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def _reserve(self, tokens: int) -> float:
+        wait = 0.0
+        if self.request_bucket is not None:
+            wait = self.request_bucket.reserve(1)
+        if self.token_bucket is not None and tokens:
+            wait = max(wait, self.token_bucket.reserve(tokens))
+        with self._lock:
+            self.requests += 1
+            return max(wait, self._paused_until - time.monotonic())
+
+    def _failed(self, exc: BaseException, attempt: int, started: Optional[float]) -> Optional[float]:
+        """
+        Release the slot of a failed request. Returns the delay before
+        retrying it, or `None` if it must not be retried.
+        """
+        decision = self.classify(exc)
+        throttled = decision is not None and decision[0]
+        self.concurrency.release(started, throttled=throttled)
+        if decision is None or attempt >= self.max_retries:
+            return None
+
+        retry_after = decision[1]
+        with self._lock:
+            self.retries += 1
+            self.throttled += throttled
+            if retry_after is not None:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                # A little jitter, so paused requests do not all resume at once.
+                return retry_after + random.uniform(0, min(1.0, 0.1 * retry_after + 0.05))
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "concurrency": int(self.concurrency.limit),
+            "in_flight": self.concurrency.in_flight,
+        }
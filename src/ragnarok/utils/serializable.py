@@ -13,6 +13,11 @@ class JSONSerializable:
     def _json_default(obj: Any) -> Any:
         if isinstance(obj, JSONSerializable):
             return obj.to_dict()
+        elif hasattr(obj, "tolist"):
+            # NumPy arrays and scalars, such as rows of an EmbeddingBatch.
+            return obj.tolist()
+        elif hasattr(obj, "to_dict"):
+            return obj.to_dict()
         elif hasattr(obj, "__dict__"):
             return obj.__dict__
         else:
@@ -0,0 +1,127 @@
+import re
+from abc import ABC, abstractmethod
+from typing import Callable, Union
+
+# Pre-tokenization pattern of the cl100k_base encoding, used with BPE files
+# that are loaded without a pattern of their own.
+CL100K_PATTERN = (
+    r"""(?i:'s|'t|'re|'ve|'m|'ll|'d)|[^\r\n\p{L}\p{N}]?\p{L}+|\p{N}{1,3}"""
+    r"""| ?[^\s\p{L}\p{N}]+[\r\n]*|\s*[\r\n]+|\s+(?!\S)|\s+"""
+)
+
+
+class BaseTokenizer(ABC):
+    @abstractmethod
+    def count(self, text: str) -> int:
+        """
+        Number of tokens in a text.
+        """
+        pass
+
+    def __call__(self, text: str) -> int:
+        return self.count(text)
+
+
+class ApproximateTokenizer(BaseTokenizer):
+    """
+    Fast token estimate that needs no vocabulary: one token per run of up
+    to `chars_per_token` word characters and one per punctuation character.
+    Counts are additive, so the count of a text is the sum of the counts of
+    its whitespace-separated parts.
+
+    Config keys:
+        chars_per_token (int): Word characters per token. Defaults to 4.
+    """
+
+    _pattern = re.compile(r"\w+|[^\w\s]")
+
+    def __init__(self, config: dict = None):
+        config = config or {}
+        self.chars_per_token = config.get("chars_per_token", 4)
+
+    def count(self, text: str) -> int:
+        step = self.chars_per_token
+        return sum((len(token) + step - 1) // step for token in self._pattern.findall(text))
+
+
+class TiktokenTokenizer(BaseTokenizer):
+    """
+    Exact token counts with a tiktoken BPE encoding.
+
+    Config keys:
+        encoding (str): Name of a tiktoken encoding. Defaults to "cl100k_base".
+        bpe_file (str): Local `.tiktoken` file with the BPE ranks. When set,
+            the encoding is built from it, so nothing is downloaded.
+        pattern (str): Pre-tokenization regex used with `bpe_file`. Defaults
+            to the cl100k_base pattern.
+    """
+
+    def __init__(self, config: dict = None):
+        config = config or {}
+        try:
+            import tiktoken
+            from tiktoken.load import load_tiktoken_bpe
+        except ImportError:
+            raise ImportError(
+                "tiktoken is not installed. Please install it with `pip install tiktoken`."
+            )
+
+        name = config.get("encoding", "cl100k_base")
+        bpe_file = config.get("bpe_file")
+        if bpe_file:
+            self.encoding = tiktoken.Encoding(
+                name,
+                pat_str=config.get("pattern", CL100K_PATTERN),
+                mergeable_ranks=load_tiktoken_bpe(bpe_file),
+                special_tokens={},
+            )
+        else:
+            self.encoding = tiktoken.get_encoding(name)
+
+    def count(self, text: str) -> int:
+        return len(self.encoding.encode_ordinary(text))
+
+
+class CallableTokenizer(BaseTokenizer):
+    def __init__(self, fn: Callable[[str], int]):
+        self.fn = fn
+
+    def count(self, text: str) -> int:
+        return self.fn(text)
+
+
+TOKENIZER_MAP = {
+    "approximate": ApproximateTokenizer,
+    "tiktoken": TiktokenTokenizer,
+}
+
+
+def get_tokenizer(
+    tokenizer: Union[str, BaseTokenizer, Callable[[str], int], None], config: dict = None
+) -> BaseTokenizer:
+    """
+    Resolve a tokenizer from a name, an instance or a counting function.
+
+    Args:
+        tokenizer: "approximate", "tiktoken", a BaseTokenizer, a function
+            returning the token count of a text, or None for "approximate".
+        config (dict): Config passed to a tokenizer created by name.
+
+    Returns:
+        BaseTokenizer: The tokenizer.
+
+    Raises:
+        ValueError: If no tokenizer is available for the given name
+    """
+    if tokenizer is None:
+        tokenizer = "approximate"
+    if isinstance(tokenizer, BaseTokenizer):
+        return tokenizer
+    if isinstance(tokenizer, str):
+        tokenizer_class = TOKENIZER_MAP.get(tokenizer.lower())
+        if tokenizer_class is None:
+            raise ValueError(f"No tokenizer available for type: {tokenizer}")
+        return tokenizer_class(config)
+    if callable(tokenizer):
+        return CallableTokenizer(tokenizer)
+    raise ValueError(f"Invalid tokenizer: {tokenizer!r}")
@@ -5,6 +5,9 @@ def get_vectorstore(store_type: str, config: dict) -> BaseVectorStore:
     if store_type == "milvus":
         from .milvus_store import MilvusVectorStore
         return MilvusVectorStore.from_config(config)
+    elif store_type == "local":
+        from .local_store import LocalVectorStore
+        return LocalVectorStore.from_config(config)
     # elif store_type == "weaviate":
     #     from .weaviate import WeaviateVectorStore
     #     return WeaviateVectorStore.from_config(config)
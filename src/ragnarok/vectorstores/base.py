@@ -1,7 +1,8 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional, Dict, Any
-from ..embedders import EmbeddingOutput
+from typing import List, Optional, Dict, Any, Sequence, Union
+from ..embedders import EmbeddingBatch
 from ..config import VectorStoreConfig
+from ..utils.aio import run_in_thread
 
 
 from ..utils.serializable import JSONSerializable
@@ -12,52 +13,144 @@ class VectorStoreOutput(JSONSerializable):
     Standard output format for extractors.
     """
 
-    def __init__(self, text: str, metadata: Dict[str, Any], vector: List[float], id: str, status: str, error: str = None):
+    def __init__(
+        self,
+        text: str,
+        metadata: Dict[str, Any],
+        vector: List[float],
+        id: str,
+        status: str,
+        error: str = None,
+        score: Optional[float] = None,
+    ):
         self.text = text
         self.metadata = metadata
         self.vector = vector
         self.id = id
         self.status = status
         self.error = error
+        # Similarity or distance to the query, for search results.
+        self.score = score
 
 class BaseVectorStore(ABC):
+    # Requests retried so far; stores that retry keep it up to date.
+    retries: int = 0
+
     def __init__(self, config: VectorStoreConfig):
         self.config = config
 
     @abstractmethod
-    def insert(self, embeddings: List[EmbeddingOutput]) -> None:
+    def insert(self, embeddings: EmbeddingBatch) -> None:
         """
-        Upload a list of embeddings to the vector store.
+        Upload a batch of embeddings to the vector store.
 
         Args:
-            embeddings (List[EmbeddingOutput]): A list of embeddings to upload.
+            embeddings (EmbeddingBatch): The embeddings to upload. Iterating
+                yields rows with `vector`, `text` and `metadata` like
+                EmbeddingOutput; `embeddings.vectors` is the float32 matrix.
         """
         pass
 
     @abstractmethod
-    def search(self, query_vector: List[float], k: int = 5) -> List[EmbeddingOutput]:
+    def search(
+        self,
+        query_vector: Sequence[float],
+        k: int = 5,
+        filter: Optional[Union[str, Dict[str, Any]]] = None,
+        output_fields: Optional[List[str]] = None,
+        search_params: Optional[Dict[str, Any]] = None,
+    ) -> List[VectorStoreOutput]:
         """
         Search for the k nearest neighbors of the query vector.
 
         Args:
-            query_vector (List[float]): The query vector to search for.
+            query_vector (Sequence[float]): The query vector to search for.
             k (int): The number of nearest neighbors to return.
+            filter (Optional[Union[str, Dict[str, Any]]]): Only return
+                embeddings whose metadata matches, as a store-specific
+                expression or a dict of required metadata values.
+            output_fields (Optional[List[str]]): Additional fields to return.
+            search_params (Optional[Dict[str, Any]]): Store-specific search
+                parameters, such as `nprobe` or `ef`.
 
         Returns:
-            List[EmbeddingOutput]: A list of the k nearest neighbors.
+            List[VectorStoreOutput]: The k nearest neighbors, closest first,
+                with their `score`.
         """
         pass
 
+    def search_many(
+        self,
+        query_vectors: Sequence[Sequence[float]],
+        k: int = 5,
+        filter: Optional[Union[str, Dict[str, Any]]] = None,
+        output_fields: Optional[List[str]] = None,
+        search_params: Optional[Dict[str, Any]] = None,
+    ) -> List[List[VectorStoreOutput]]:
+        """
+        Search for the k nearest neighbors of several query vectors, see
+        `search`. The default implementation searches once per query;
+        stores that accept several queries per request override it.
+
+        Returns:
+            List[List[VectorStoreOutput]]: The neighbors of every query, in
+                query order.
+        """
+        return [
+            self.search(query_vector, k, filter, output_fields, search_params)
+            for query_vector in query_vectors
+        ]
+
     @abstractmethod
-    def delete(self, ids: List[str]) -> None:
+    def delete(self, ids: List[str], filter: Optional[Union[str, Dict[str, Any]]] = None) -> None:
         """
-        Delete embeddings from the vector store by their IDs.
+        Delete embeddings from the vector store by their IDs, or all
+        embeddings whose metadata matches a filter.
 
         Args:
             ids (List[str]): A list of IDs to delete.
+            filter (Optional[Union[str, Dict[str, Any]]]): A filter as in
+                `search`, instead of IDs. Stores that cannot delete by filter
+                raise NotImplementedError.
         """
         pass
 
+    def close(self) -> None:
+        """
+        Release connections and thread pools. The default implementation
+        does nothing.
+        """
+
+    async def ainsert(self, embeddings: EmbeddingBatch) -> None:
+        """
+        Async counterpart of `insert`. The default implementation runs
+        `insert` in a worker thread.
+        """
+        return await run_in_thread(self.insert, embeddings)
+
+    async def asearch(self, query_vector: Sequence[float], k: int = 5, **kwargs) -> List[VectorStoreOutput]:
+        """
+        Async counterpart of `search`. The default implementation runs
+        `search` in a worker thread.
+        """
+        return await run_in_thread(self.search, query_vector, k, **kwargs)
+
+    async def asearch_many(
+        self, query_vectors: Sequence[Sequence[float]], k: int = 5, **kwargs
+    ) -> List[List[VectorStoreOutput]]:
+        """
+        Async counterpart of `search_many`. The default implementation runs
+        `search_many` in a worker thread.
+        """
+        return await run_in_thread(self.search_many, query_vectors, k, **kwargs)
+
+    async def adelete(self, ids: List[str]) -> None:
+        """
+        Async counterpart of `delete`. The default implementation runs
+        `delete` in a worker thread.
+        """
+        return await run_in_thread(self.delete, ids)
+
     @classmethod
     @abstractmethod
     def from_config(cls, config: VectorStoreConfig) -> 'BaseVectorStore':
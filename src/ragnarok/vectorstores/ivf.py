@@ -0,0 +1,464 @@
+import os
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..logger import RAGnarokLogger
+
+
+def assign(vectors: np.ndarray, centroids: np.ndarray, spherical: bool, block_size: int = 8192) -> np.ndarray:
+    """
+    Index of the closest centroid of every vector: by inner product for
+    `spherical`, else by L2 distance.
+    """
+    offsets = None if spherical else 0.5 * np.einsum("ij,ij->i", centroids, centroids)
+    labels = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), block_size):
+        scores = vectors[start:start + block_size] @ centroids.T
+        if offsets is not None:
+            scores -= offsets
+        labels[start:start + block_size] = np.argmax(scores, axis=1)
+    return labels
+
+
+def kmeans(
+    vectors: np.ndarray, k: int, iterations: int = 10, spherical: bool = False, seed: int = 0
+) -> np.ndarray:
+    """
+    Lloyd's k-means, started from `k` random vectors. Empty clusters are
+    reseeded with random vectors. With `spherical`, centroids are kept at
+    unit length.
+
+    Returns:
+        np.ndarray: A (k, dimension) float32 matrix of centroids.
+    """
+    rng = np.random.default_rng(seed)
+    k = min(k, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), size=k, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        labels = assign(vectors, centroids, spherical)
+        counts = np.bincount(labels, minlength=k)
+        empty = counts == 0
+        # Sum each cluster's vectors from one sorted copy.
+        order = np.argsort(labels, kind="stable")
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[~empty]
+        centroids = np.zeros_like(centroids)
+        centroids[~empty] = np.add.reduceat(vectors[order], starts, axis=0) / counts[~empty, None]
+        if empty.any():
+            centroids[empty] = vectors[rng.choice(len(vectors), size=int(empty.sum()), replace=False)]
+        if spherical:
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+    return centroids.astype(np.float32)
+
+
+class ProductQuantizer:
+    """
+    Encodes vectors as `m` bytes: the vector is split into `m` equal
+    sub-vectors, each replaced by the closest of 256 centroids learned for
+    its subspace. Distances to a query are then approximated from one
+    lookup table per query (asymmetric distance computation).
+    """
+
+    def __init__(self, m: int, codebooks: Optional[np.ndarray] = None):
+        self.m = m
+        self.codebooks = codebooks
+
+    def train(self, vectors: np.ndarray, iterations: int = 10, seed: int = 0) -> None:
+        if vectors.shape[1] % self.m:
+            raise ValueError(f"The vector dimension {vectors.shape[1]} is not a multiple of pq_m={self.m}")
+        self.codebooks = np.stack(
+            [kmeans(part, 256, iterations, seed=seed + i) for i, part in enumerate(self._split(vectors))]
+        )
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.empty((len(vectors), self.m), dtype=np.uint8)
+        for i, part in enumerate(self._split(vectors)):
+            codes[:, i] = assign(part, self.codebooks[i], spherical=False)
+        return codes
+
+    def tables(self, query: np.ndarray, metric: str) -> np.ndarray:
+        """
+        Score of every centroid of every subspace for one query, higher is
+        closer; the approximate score of a code is the sum of its entries.
+        """
+        parts = query.reshape(self.m, -1)
+        dots = np.einsum("md,mcd->mc", parts, self.codebooks)
+        if metric != "l2":
+            return dots
+        return 2 * dots - np.einsum("mcd,mcd->mc", self.codebooks, self.codebooks) - np.einsum("md,md->m", parts, parts)[:, None]
+
+    def _split(self, vectors: np.ndarray) -> List[np.ndarray]:
+        return np.split(np.ascontiguousarray(vectors, dtype=np.float32), self.m, axis=1)
+
+
+class IVFIndex:
+    """
+    Inverted file index over the rows of a LocalVectorStore.
+
+    The vectors are partitioned into `nlist` clusters by k-means; a search
+    scores the centroids, then only the rows of the `nprobe` closest
+    clusters. With `pq_m`, rows are also stored as product quantization
+    codes of `pq_m` bytes held in memory: candidates are ranked by their
+    approximate score and only the best `rerank * k` are read from the
+    memory-mapped vectors and scored exactly. Without it, all candidates
+    are scored exactly. Larger `nprobe` and `rerank` raise recall and
+    latency, see `benchmarks/ann.py`.
+
+    The index is trained once the store holds `min_train_rows` rows, on a
+    sample of `train_size` of them, and from then on every insert adds its
+    rows to their clusters. The centroids and codebooks are saved to
+    `ivf.npz`, the cluster and code of every row to the append-only
+    `ivf.entries`. Deleted rows are skipped, and dropped from the entries
+    when the store is compacted. `LocalVectorStore.build_index` retrains
+    the index, e.g. once the corpus has grown well past its training size.
+
+    Config keys:
+        nlist (int): Clusters. Defaults to 4 * sqrt(rows) at training time.
+        nprobe (int): Clusters searched per query. Defaults to 16.
+        pq_m (int): Bytes per product quantization code; must divide the
+            vector dimension. Defaults to None (no quantization).
+        rerank (int): With `pq_m`, candidates scored exactly per result.
+            Defaults to 10.
+        min_train_rows (int): Rows needed to train. Defaults to 10,000.
+        train_size (int): Rows sampled for training. Defaults to 100,000.
+        iterations (int): k-means iterations. Defaults to 10.
+    """
+
+    def __init__(self, path: str, config: dict, metric: str):
+        self.path = path
+        self.config = config
+        self.metric = metric
+        self.nlist = config.get("nlist")
+        self.nprobe = config.get("nprobe", 16)
+        self.pq_m = config.get("pq_m")
+        self.rerank = config.get("rerank", 10)
+        self.min_train_rows = config.get("min_train_rows", 10_000)
+        self.train_size = config.get("train_size", 100_000)
+        self.iterations = config.get("iterations", 10)
+        self.logger = RAGnarokLogger.get_logger()
+
+        self.centroids: Optional[np.ndarray] = None
+        self.pq: Optional[ProductQuantizer] = None
+        self._lock = threading.RLock()
+        self._reset_entries()
+
+    @property
+    def model_path(self) -> str:
+        return os.path.join(self.path, "ivf.npz")
+
+    @property
+    def entries_path(self) -> str:
+        return os.path.join(self.path, "ivf.entries")
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def _record_dtype(self) -> np.dtype:
+        fields = [("id", "<i8"), ("list", "<i4")]
+        if self.pq is not None:
+            fields.append(("code", "u1", (self.pq.m,)))
+        return np.dtype(fields)
+
+    def _reset_entries(self) -> None:
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.lists = np.zeros(0, dtype=np.int32)
+        self.codes: Optional[np.ndarray] = None
+        self.numbers = np.zeros(0, dtype=np.int64)
+        self.positions = np.zeros(0, dtype=np.int64)
+        self.dead = np.zeros(0, dtype=bool)
+        self._pending: List[Tuple[np.ndarray, ...]] = []
+        self._order: Optional[np.ndarray] = None
+        self._offsets: Optional[np.ndarray] = None
+
+    def _prepare(self, vectors: np.ndarray, norms: Optional[np.ndarray] = None) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.metric != "cosine":
+            return vectors
+        if norms is None:
+            norms = np.linalg.norm(vectors, axis=1)
+        return vectors / np.maximum(np.asarray(norms, dtype=np.float32), 1e-12)[:, None]
+
+    def load(self, segments) -> None:
+        """
+        Load the saved index and bring it up to date with the store: rows
+        that were committed but not indexed are added, deleted rows skipped.
+        """
+        if not os.path.exists(self.model_path):
+            return
+        with np.load(self.model_path) as saved:
+            self.centroids = saved["centroids"]
+            if saved["codebooks"].size:
+                self.pq = ProductQuantizer(saved["codebooks"].shape[0], saved["codebooks"])
+        dtype = self._record_dtype()
+        records = np.zeros(0, dtype=dtype)
+        if os.path.exists(self.entries_path):
+            # A torn record at the end is from an interrupted append.
+            count = os.path.getsize(self.entries_path) // dtype.itemsize
+            records = np.fromfile(self.entries_path, dtype=dtype, count=count)
+            os.truncate(self.entries_path, count * dtype.itemsize)
+        self._reset_entries()
+        self.ids = records["id"].copy()
+        self.lists = records["list"].copy()
+        self.codes = records["code"].copy() if self.pq is not None else None
+        self.locate(segments)
+
+    def locate(self, segments) -> None:
+        """
+        Find the segment and position of every entry, after loading or a
+        compaction of the store. Entries of rows that are gone or deleted
+        are marked dead; rows without an entry are indexed.
+        """
+        with self._lock:
+            self._consolidate()
+            numbers = np.concatenate([np.full(s.rows, s.number, dtype=np.int64) for s in segments] or [np.zeros(0, np.int64)])
+            positions = np.concatenate([np.arange(s.rows, dtype=np.int64) for s in segments] or [np.zeros(0, np.int64)])
+            ids = np.concatenate([np.asarray(s.ids) for s in segments] or [np.zeros(0, np.int64)])
+            deleted = np.concatenate(
+                [s.deleted if s.deleted is not None else np.zeros(s.rows, dtype=bool) for s in segments]
+                or [np.zeros(0, bool)]
+            )
+            order = np.argsort(ids, kind="stable")
+            sorted_ids = ids[order]
+            found = np.minimum(np.searchsorted(sorted_ids, self.ids), max(len(ids) - 1, 0))
+            present = sorted_ids[found] == self.ids if len(ids) else np.zeros(len(self.ids), dtype=bool)
+            rows = order[found]
+            self.numbers = np.where(present, numbers[rows] if len(ids) else 0, -1)
+            self.positions = np.where(present, positions[rows] if len(ids) else 0, -1)
+            self.dead = ~present | (deleted[rows] if len(ids) else True)
+            self._order = None
+
+            missing = ~np.isin(ids, self.ids) & ~deleted
+            if missing.any():
+                self.logger.info(f"Indexing {int(missing.sum())} rows missing from the index of {self.path}")
+                by_number = {s.number: s for s in segments}
+                for number in np.unique(numbers[missing]):
+                    segment = by_number[int(number)]
+                    rows = positions[missing & (numbers == number)]
+                    self._add(segment.vectors[rows], segment.norms[rows], segment.ids[rows], number, rows)
+
+    def train(self, segments, vector_type: str) -> bool:
+        """
+        Train on a sample of the store's rows and index all of them.
+
+        Returns:
+            bool: Whether the index was trained; binary vectors cannot be.
+        """
+        if vector_type == "binary":
+            self.logger.warning("The IVF index does not support binary vectors, searches stay exact")
+            return False
+        with self._lock:
+            live = [(s, np.flatnonzero(~s.deleted) if s.deleted is not None else np.arange(s.rows)) for s in segments]
+            total = sum(len(rows) for _, rows in live)
+            if not total:
+                return False
+            rng = np.random.default_rng(0)
+            picks = np.sort(rng.choice(total, size=min(total, self.train_size), replace=False))
+            sample, start = [], 0
+            for segment, rows in live:
+                chosen = rows[picks[(picks >= start) & (picks < start + len(rows))] - start]
+                sample.append(self._prepare(segment.vectors[chosen], segment.norms[chosen]))
+                start += len(rows)
+            sample = np.concatenate(sample)
+
+            nlist = self.nlist or int(np.clip(4 * np.sqrt(total), 16, 65_536))
+            self.logger.info(f"Training an IVF index with {nlist} lists on {len(sample)} of {total} rows")
+            self.centroids = kmeans(sample, nlist, self.iterations, spherical=self.metric == "cosine")
+            self.pq = None
+            if self.pq_m:
+                self.pq = ProductQuantizer(self.pq_m)
+                # Codes encode the residual of a vector to its centroid,
+                # which varies much less than the vectors themselves.
+                labels = assign(sample, self.centroids, spherical=self.metric == "cosine")
+                self.pq.train(sample - self.centroids[labels], self.iterations)
+            self._save_model()
+
+            self._reset_entries()
+            if os.path.exists(self.entries_path):
+                os.remove(self.entries_path)
+            for segment, rows in live:
+                for block in range(0, len(rows), 65_536):
+                    part = rows[block:block + 65_536]
+                    self.add(segment.vectors[part], segment.norms[part], segment.ids[part], segment.number, part)
+            return True
+
+    def _save_model(self) -> None:
+        codebooks = self.pq.codebooks if self.pq is not None else np.zeros(0, dtype=np.float32)
+        temporary = self.model_path + ".tmp.npz"
+        np.savez(temporary, centroids=self.centroids, codebooks=codebooks)
+        os.replace(temporary, self.model_path)
+
+    def add(self, vectors: np.ndarray, norms: np.ndarray, ids: np.ndarray, number: int, positions: np.ndarray) -> None:
+        """
+        Add rows of one segment to their clusters and append their entries.
+        """
+        with self._lock:
+            self._add(vectors, norms, ids, number, positions)
+
+    def _add(self, vectors, norms, ids, number, positions) -> None:
+        prepared = self._prepare(vectors, norms)
+        records = np.zeros(len(prepared), dtype=self._record_dtype())
+        records["id"] = ids
+        records["list"] = assign(prepared, self.centroids, spherical=self.metric == "cosine")
+        if self.pq is not None:
+            records["code"] = self.pq.encode(prepared - self.centroids[records["list"]])
+        with open(self.entries_path, "ab") as f:
+            f.write(records.tobytes())
+        self._pending.append((
+            records["id"].copy(),
+            records["list"].copy(),
+            records["code"].copy() if self.pq is not None else None,
+            np.full(len(records), number, dtype=np.int64),
+            np.asarray(positions, dtype=np.int64),
+        ))
+        self._order = None
+
+    def remove(self, ids: np.ndarray) -> None:
+        with self._lock:
+            self._consolidate()
+            self.dead |= np.isin(self.ids, ids)
+            self._order = None
+
+    def compact(self, segments) -> None:
+        """
+        Drop the entries of deleted rows and relocate the others after the
+        store was compacted.
+        """
+        with self._lock:
+            self._consolidate()
+            self.locate(segments)
+            keep = ~self.dead
+            records = np.zeros(int(keep.sum()), dtype=self._record_dtype())
+            records["id"] = self.ids[keep]
+            records["list"] = self.lists[keep]
+            if self.pq is not None:
+                records["code"] = self.codes[keep]
+            temporary = self.entries_path + ".tmp"
+            records.tofile(temporary)
+            os.replace(temporary, self.entries_path)
+            for name in ("ids", "lists", "numbers", "positions", "dead"):
+                setattr(self, name, getattr(self, name)[keep])
+            if self.codes is not None:
+                self.codes = self.codes[keep]
+            self._order = None
+
+    def _consolidate(self) -> None:
+        """
+        Merge the entries added since the last search into the arrays, and
+        group the live entries by cluster.
+        """
+        if self._pending:
+            parts = list(zip(*self._pending))
+            self.ids = np.concatenate([self.ids, *parts[0]])
+            self.lists = np.concatenate([self.lists, *parts[1]])
+            if self.pq is not None:
+                existing = self.codes if self.codes is not None else np.zeros((0, self.pq.m), dtype=np.uint8)
+                self.codes = np.concatenate([existing, *parts[2]])
+            self.numbers = np.concatenate([self.numbers, *parts[3]])
+            self.positions = np.concatenate([self.positions, *parts[4]])
+            self.dead = np.concatenate([self.dead, np.zeros(sum(len(ids) for ids in parts[0]), dtype=bool)])
+            self._pending = []
+            self._order = None
+        if self._order is None and self.centroids is not None:
+            live = np.flatnonzero(~self.dead)
+            self._order = live[np.argsort(self.lists[live], kind="stable")]
+            counts = np.bincount(self.lists[live], minlength=len(self.centroids))
+            self._offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    def snapshot(self) -> tuple:
+        """
+        The current entries; later inserts, deletes and compactions do not
+        change them.
+        """
+        with self._lock:
+            self._consolidate()
+            return self._order, self._offsets, self.ids, self.codes, self.numbers, self.positions
+
+    def search(
+        self,
+        queries: np.ndarray,
+        query_norms: np.ndarray,
+        k: int,
+        fetch: Callable[[np.ndarray, np.ndarray], Tuple[np.ndarray, np.ndarray]],
+        score: Callable[..., np.ndarray],
+        nprobe: Optional[int] = None,
+        rerank: Optional[int] = None,
+        snapshot: Optional[tuple] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Approximate search for the k best rows of every query.
+
+        Args:
+            queries (np.ndarray): A (n, dimension) float32 matrix.
+            query_norms (np.ndarray): The norms of the queries.
+            k (int): Results per query.
+            fetch (Callable): Returns the vectors and norms of rows given their
+                segment numbers and positions.
+            score (Callable): Exact scores of (vectors, norms, queries,
+                query_norms), higher is closer.
+            nprobe (Optional[int]): Overrides the `nprobe` config key.
+            rerank (Optional[int]): Overrides the `rerank` config key.
+            snapshot (Optional[tuple]): The entries to search, from
+                `snapshot`, taken together with the segments `fetch` reads.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (n, k) scores and IDs, padded with
+                -inf scores when there are fewer than k candidates.
+        """
+        order, offsets, ids, codes, numbers, positions = snapshot or self.snapshot()
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        rerank = rerank or self.rerank
+
+        prepared = self._prepare(queries, query_norms)
+        centroid_scores = prepared @ self.centroids.T
+        if self.metric == "l2":
+            centroid_scores = 2 * centroid_scores - np.einsum("ij,ij->i", self.centroids, self.centroids)
+        probes = np.argpartition(-centroid_scores, nprobe - 1, axis=1)[:, :nprobe]
+
+        best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        best_ids = np.zeros((len(queries), k), dtype=np.int64)
+        for i, lists in enumerate(probes):
+            members = [order[offsets[l]:offsets[l + 1]] for l in lists]
+            candidates = np.concatenate(members)
+            if not len(candidates):
+                continue
+            if codes is not None and len(candidates) > rerank * k:
+                approximate = self._approximate(prepared[i], lists, members, codes, centroid_scores[i])
+                candidates = candidates[np.argpartition(-approximate, rerank * k - 1)[:rerank * k]]
+            vectors, norms = fetch(numbers[candidates], positions[candidates])
+            exact = score(vectors, norms, queries[i:i + 1], query_norms[i:i + 1])[0]
+            top = np.argsort(-exact, kind="stable")[:k]
+            best_scores[i, :len(top)] = exact[top]
+            best_ids[i, :len(top)] = ids[candidates[top]]
+        return best_scores, best_ids
+
+    def _approximate(
+        self, query: np.ndarray, lists: np.ndarray, members: List[np.ndarray], codes: np.ndarray, centroid_scores: np.ndarray
+    ) -> np.ndarray:
+        """
+        Approximate scores of the members of the probed lists from their
+        residual codes.
+        """
+        subspaces = np.arange(self.pq.m)
+        if self.metric != "l2":
+            # q . (c + r) = q . c + q . r: one table serves every list.
+            tables = self.pq.tables(query, self.metric)
+            return np.concatenate([
+                centroid_scores[l] + tables[subspaces, codes[rows]].sum(axis=1) for l, rows in zip(lists, members)
+            ])
+        return np.concatenate([
+            self.pq.tables(query - self.centroids[l], "l2")[subspaces, codes[rows]].sum(axis=1)
+            for l, rows in zip(lists, members)
+        ])
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            if not self.trained:
+                return {"trained": False, "lists": 0, "entries": 0}
+            self._consolidate()
+            return {
+                "trained": True,
+                "lists": len(self.centroids),
+                "entries": int((~self.dead).sum()),
+            }
@@ -0,0 +1,748 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from ..embedders import EmbeddingBatch
+from ..logger import RAGnarokLogger
+from .base import BaseVectorStore, VectorStoreOutput
+from .ivf import IVFIndex
+
+# Storage dtype of each vector type, see EmbeddingQuantizer.
+VECTOR_DTYPES = {"float": np.float32, "int8": np.int8, "binary": np.uint8}
+METRICS = ("cosine", "ip", "l2")
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def hamming(vectors: np.ndarray, queries: np.ndarray) -> np.ndarray:
+    """
+    Hamming distances between packed binary queries and vectors, as a
+    (queries, vectors) matrix.
+    """
+    popcount = getattr(np, "bitwise_count", None) or (lambda bits: _POPCOUNT[bits])
+    return np.stack(
+        [popcount(np.bitwise_xor(vectors, query)).sum(axis=1, dtype=np.int32) for query in queries]
+    )
+
+
+def filter_clause(filter: Optional[Union[str, Dict[str, Any]]]) -> Tuple[str, list]:
+    """
+    Turn a dict of required metadata values into an SQLite condition on the
+    `rows` table and its parameters. A value that is a list matches any of
+    its items. Strings are used as the condition unchanged and may refer to
+    the `id`, `text` and `metadata` (JSON) columns.
+    """
+    if not filter:
+        return "", []
+    if isinstance(filter, str):
+        return filter, []
+    clauses, params = [], []
+    for key, value in filter.items():
+        field = f"json_extract(metadata, '$.{json.dumps(key)}')"
+        if isinstance(value, (list, tuple, set)):
+            value = list(value)
+            clauses.append(f"{field} IN ({','.join('?' * len(value))})")
+            params.extend(value)
+        else:
+            clauses.append(f"{field} = ?")
+            params.append(value)
+    return " AND ".join(clauses), params
+
+
+class SegmentSnapshot:
+    """
+    The rows of a Segment as they were when the snapshot was taken. Inserts
+    and deletes replace the segment's arrays rather than changing them, so
+    a snapshot stays consistent while searches read it.
+    """
+
+    __slots__ = ("number", "rows", "vectors", "ids", "norms", "deleted")
+
+    def __init__(self, segment: "Segment"):
+        self.number = segment.number
+        self.rows = segment.rows
+        self.vectors = segment.vectors
+        self.ids = segment.ids
+        self.norms = segment.norms
+        self.deleted = segment.deleted
+
+
+class Segment:
+    """
+    One append-only segment: a matrix of vectors, the ID of each row and,
+    for cosine and L2 search, the norm of each row, in three flat files
+    that are memory-mapped read-only. `deleted` marks tombstoned rows.
+    """
+
+    def __init__(self, directory: str, number: int, rows: int, width: int, dtype: np.dtype):
+        self.number = number
+        self.rows = rows
+        self.width = width
+        self.dtype = np.dtype(dtype)
+        base = os.path.join(directory, f"{number:06d}")
+        self.paths = {"vectors": base + ".vectors", "ids": base + ".ids", "norms": base + ".norms"}
+        self.deleted: Optional[np.ndarray] = None
+        self.deleted_count = 0
+        self._map()
+
+    def _map(self) -> None:
+        if not self.rows:
+            self.vectors = np.zeros((0, self.width), dtype=self.dtype)
+            self.ids = np.zeros(0, dtype=np.int64)
+            self.norms = np.zeros(0, dtype=np.float32)
+            return
+        self.vectors = np.memmap(self.paths["vectors"], dtype=self.dtype, mode="r", shape=(self.rows, self.width))
+        self.ids = np.memmap(self.paths["ids"], dtype=np.int64, mode="r", shape=(self.rows,))
+        self.norms = np.memmap(self.paths["norms"], dtype=np.float32, mode="r", shape=(self.rows,))
+
+    def truncate(self) -> None:
+        """
+        Cut the files to the committed rows, dropping rows of a write that
+        was interrupted before its metadata was committed.
+        """
+        sizes = {
+            "vectors": self.rows * self.width * self.dtype.itemsize,
+            "ids": self.rows * 8,
+            "norms": self.rows * 4,
+        }
+        for name, path in self.paths.items():
+            if not os.path.exists(path):
+                open(path, "wb").close()
+            if os.path.getsize(path) != sizes[name]:
+                os.truncate(path, sizes[name])
+
+    def append(self, vectors: np.ndarray, ids: np.ndarray, norms: np.ndarray, sync: bool) -> None:
+        for name, values in (("vectors", vectors), ("ids", ids), ("norms", norms)):
+            with open(self.paths[name], "ab") as f:
+                f.write(np.ascontiguousarray(values).tobytes())
+                if sync:
+                    f.flush()
+                    os.fsync(f.fileno())
+        self.rows += len(ids)
+        self._map()
+        if self.deleted is not None:
+            self.deleted = np.concatenate([self.deleted, np.zeros(len(ids), dtype=bool)])
+
+    def snapshot(self) -> SegmentSnapshot:
+        return SegmentSnapshot(self)
+
+    def tombstone(self, positions: Sequence[int]) -> None:
+        # Copy on write, so searches that hold the old mask are not affected.
+        deleted = np.zeros(self.rows, dtype=bool) if self.deleted is None else self.deleted.copy()
+        deleted[np.asarray(positions, dtype=np.int64)] = True
+        self.deleted = deleted
+        self.deleted_count = int(deleted.sum())
+
+    @property
+    def live(self) -> int:
+        return self.rows - self.deleted_count
+
+    def remove_files(self) -> None:
+        for path in self.paths.values():
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class LocalVectorStore(BaseVectorStore):
+    """
+    Embedded vector store that needs no server: vectors live in memory-mapped
+    files in a local directory, metadata and text in an SQLite database next
+    to them.
+
+    Vectors are appended to segments of up to `segment_size` rows. Opening
+    the store only maps the segment files, so it starts instantly and the
+    operating system pages vectors in as searches touch them; the store can
+    hold more vectors than fit in memory. Search is exact: queries are scored
+    against blocks of `block_size` rows with one matrix multiply per block,
+    and the best `k` are kept with a partial sort. With a filter, only the
+    matching rows are read and scored. With an `index` config, searches
+    without a filter go through an approximate IVF index instead, see
+    IVFIndex.
+
+    Deletes mark rows as tombstones, which searches skip. Once tombstones
+    make up `compact_threshold` of the rows, the affected segments are
+    rewritten without them (see `compact`); IDs do not change.
+
+    Config keys:
+        path (str): Directory of the store. Defaults to "ragnarok_vectors".
+        metric (str): "cosine" (default), "ip" (inner product) or "l2".
+            Binary vectors are always compared by Hamming distance.
+        segment_size (int): Rows per segment. Defaults to 1,000,000.
+        block_size (int): Rows scored per matrix multiply. Defaults to 65,536.
+        compact_threshold (float): Fraction of deleted rows that triggers a
+            compaction. Defaults to 0.3; `None` disables it.
+        sync (bool): fsync vector files before committing an insert.
+            Defaults to True.
+        index (dict): Config of an IVFIndex, e.g. {"nprobe": 16, "pq_m": 48}.
+            Defaults to None (exact search only).
+    """
+
+    def __init__(self, config: dict):
+        self.config = config
+        self.path = config.get("path", "ragnarok_vectors")
+        self.metric = config.get("metric", "cosine")
+        self.segment_size = config.get("segment_size", 1_000_000)
+        self.block_size = config.get("block_size", 65_536)
+        self.compact_threshold = config.get("compact_threshold", 0.3)
+        self.sync = config.get("sync", True)
+        self.index_config = config.get("index")
+        if self.metric not in METRICS:
+            raise ValueError(f"Unknown metric: {self.metric}")
+        self.logger = RAGnarokLogger.get_logger()
+
+        os.makedirs(self.path, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(os.path.join(self.path, "metadata.db"), check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS segments (number INTEGER PRIMARY KEY, rows INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS rows (
+                id INTEGER PRIMARY KEY,
+                segment INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                text TEXT,
+                metadata TEXT
+            );
+            CREATE TABLE IF NOT EXISTS tombstones (
+                segment INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                PRIMARY KEY (segment, position)
+            );
+            """
+        )
+        self._conn.commit()
+        self._open()
+
+    def _open(self) -> None:
+        settings = dict(self._conn.execute("SELECT key, value FROM settings").fetchall())
+        self.vector_type: Optional[str] = settings.get("vector_type")
+        self.width: Optional[int] = int(settings["width"]) if "width" in settings else None
+        self._next_id = int(settings.get("next_id", 1))
+        self._next_segment = int(settings.get("next_segment", 0))
+        if "metric" in self.config and settings.get("metric", self.metric) not in (self.metric, "hamming"):
+            self.logger.warning(
+                f"Vector store {self.path} was created with metric {settings['metric']}, using it instead of {self.metric}"
+            )
+        self.metric = settings.get("metric", self.metric)
+
+        self._segments: List[Segment] = []
+        if self.vector_type is not None:
+            dtype = VECTOR_DTYPES[self.vector_type]
+            for number, rows in self._conn.execute("SELECT number, rows FROM segments ORDER BY number"):
+                segment = Segment(self.path, number, rows, self.width, dtype)
+                segment.truncate()
+                self._segments.append(segment)
+            tombstones: Dict[int, List[int]] = {}
+            for number, position in self._conn.execute("SELECT segment, position FROM tombstones"):
+                tombstones.setdefault(number, []).append(position)
+            for segment in self._segments:
+                if segment.number in tombstones:
+                    segment.tombstone(tombstones[segment.number])
+        self._remove_orphans()
+
+        self.index: Optional[IVFIndex] = None
+        if self.index_config is not None and self._index_supported():
+            self.index = IVFIndex(self.path, self.index_config, self.metric)
+            self.index.load(self._segments)
+
+    def _index_supported(self) -> bool:
+        if self.vector_type == "binary":
+            self.logger.warning(f"The IVF index does not support binary vectors, searches of {self.path} stay exact")
+            return False
+        return True
+
+    def _remove_orphans(self) -> None:
+        # Files of segments that an interrupted compaction wrote or replaced.
+        known = {os.path.basename(path) for segment in self._segments for path in segment.paths.values()}
+        for name in os.listdir(self.path):
+            if name.endswith((".vectors", ".ids", ".norms", ".tmp", ".tmp.npz")) and name not in known:
+                os.remove(os.path.join(self.path, name))
+
+    def __len__(self) -> int:
+        return sum(segment.live for segment in self._segments)
+
+    def stats(self) -> Dict[str, Any]:
+        segments = list(self._segments)
+        return {
+            "rows": sum(segment.live for segment in segments),
+            "deleted": sum(segment.deleted_count for segment in segments),
+            "segments": len(segments),
+            "vector_type": self.vector_type,
+            "metric": self.metric,
+            "index": self.index.stats() if self.index is not None else None,
+        }
+
+    def insert(self, embeddings: EmbeddingBatch = None) -> List[VectorStoreOutput]:
+        """
+        Append embeddings to the last segment, starting new segments as they
+        fill up. Vectors are written before their metadata is committed, so
+        an interrupted insert leaves no partial rows behind.
+
+        Returns:
+            List[VectorStoreOutput]: The result of every row, in input order.
+        """
+        embeddings = EmbeddingBatch.from_outputs(embeddings or [])
+        if not len(embeddings):
+            return []
+        try:
+            with self._lock:
+                ids = self._append(embeddings)
+        except Exception as e:
+            self.logger.error(f"Failed to insert {len(embeddings)} rows into {self.path}: {e}")
+            return [
+                VectorStoreOutput(text=text, metadata=metadata, vector=vector, id=None, status="error", error=str(e))
+                for vector, text, metadata in zip(embeddings.vectors, embeddings.texts, embeddings.metadata)
+            ]
+        return [
+            VectorStoreOutput(text=text, metadata=metadata, vector=vector, id=int(id), status="success")
+            for vector, text, metadata, id in zip(embeddings.vectors, embeddings.texts, embeddings.metadata, ids)
+        ]
+
+    def _append(self, embeddings: EmbeddingBatch) -> np.ndarray:
+        vectors = embeddings.vectors
+        if self.vector_type is None:
+            self.vector_type = embeddings.vector_type
+            self.width = vectors.shape[1]
+            if self.vector_type == "binary":
+                self.metric = "hamming"
+                if self.index is not None:
+                    self._index_supported()
+                    self.index = None
+        elif embeddings.vector_type != self.vector_type or vectors.shape[1] != self.width:
+            raise ValueError(
+                f"Expected {self.vector_type} vectors of width {self.width}, "
+                f"got {embeddings.vector_type} vectors of width {vectors.shape[1]}"
+            )
+
+        ids = np.arange(self._next_id, self._next_id + len(vectors), dtype=np.int64)
+        norms = np.linalg.norm(vectors.astype(np.float32, copy=False), axis=1).astype(np.float32)
+        rows = []
+        written: List[Tuple[Segment, int]] = []
+        start = 0
+        while start < len(vectors):
+            segment = self._writable_segment()
+            count = min(len(vectors) - start, self.segment_size - segment.rows)
+            end = start + count
+            segment.append(vectors[start:end], ids[start:end], norms[start:end], self.sync)
+            written.append((segment, count, start))
+            rows.extend(
+                (int(ids[i]), segment.number, segment.rows - count + i - start, embeddings.texts[i],
+                 json.dumps(embeddings.metadata[i], default=str))
+                for i in range(start, end)
+            )
+            start = end
+
+        try:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO rows (id, segment, position, text, metadata) VALUES (?, ?, ?, ?, ?)", rows
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO segments (number, rows) VALUES (?, ?)",
+                    [(segment.number, segment.rows) for segment, _, _ in written],
+                )
+                self._save_settings(next_id=self._next_id + len(vectors))
+        except Exception:
+            # Forget the appended rows; the files are cut back on the next
+            # write to the segment.
+            for segment, count, _ in written:
+                segment.rows -= count
+                segment.truncate()
+                segment._map()
+            raise
+        self._next_id += len(vectors)
+        if self.index is not None:
+            self._index_rows(written, vectors, ids, norms)
+        return ids
+
+    def _index_rows(self, written: List[Tuple[Segment, int, int]], vectors, ids, norms) -> None:
+        # The rows are committed either way; rows missing from the index are
+        # added when the store is opened again.
+        try:
+            if self.index.trained:
+                for segment, count, start in written:
+                    end = start + count
+                    positions = np.arange(segment.rows - count, segment.rows)
+                    self.index.add(vectors[start:end], norms[start:end], ids[start:end], segment.number, positions)
+            elif len(self) >= self.index.min_train_rows:
+                self.index.train(self._segments, self.vector_type)
+        except Exception as e:
+            self.logger.error(f"Failed to index {len(ids)} rows of {self.path}: {e}")
+
+    def build_index(self, config: Optional[dict] = None) -> None:
+        """
+        Train the IVF index on the current rows and index all of them,
+        replacing the existing index.
+
+        Args:
+            config (Optional[dict]): Index config, defaults to the `index`
+                config key.
+        """
+        with self._lock:
+            self.index_config = config if config is not None else self.index_config or {}
+            if not self._index_supported():
+                self.index = None
+                return
+            self.index = IVFIndex(self.path, self.index_config, self.metric)
+            self.index.train(self._segments, self.vector_type)
+
+    def _writable_segment(self) -> Segment:
+        if self._segments and self._segments[-1].rows < self.segment_size:
+            return self._segments[-1]
+        segment = self._new_segment()
+        self._segments = self._segments + [segment]
+        return segment
+
+    def _new_segment(self) -> Segment:
+        segment = Segment(self.path, self._next_segment, 0, self.width, VECTOR_DTYPES[self.vector_type])
+        self._next_segment += 1
+        for path in segment.paths.values():
+            open(path, "wb").close()
+        return segment
+
+    def _save_settings(self, **extra) -> None:
+        settings = {
+            "vector_type": self.vector_type,
+            "width": self.width,
+            "metric": self.metric,
+            "next_id": self._next_id,
+            "next_segment": self._next_segment,
+            **extra,
+        }
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+            [(key, str(value)) for key, value in settings.items()],
+        )
+
+    def search(
+        self,
+        query_vector: Sequence[float],
+        k: int = 5,
+        filter: Optional[Union[str, Dict[str, Any]]] = None,
+        output_fields: Optional[List[str]] = None,
+        search_params: Optional[Dict[str, Any]] = None,
+    ) -> List[VectorStoreOutput]:
+        return self.search_many([query_vector], k, filter, output_fields, search_params)[0]
+
+    def search_many(
+        self,
+        query_vectors: Sequence[Sequence[float]],
+        k: int = 5,
+        filter: Optional[Union[str, Dict[str, Any]]] = None,
+        output_fields: Optional[List[str]] = None,
+        search_params: Optional[Dict[str, Any]] = None,
+    ) -> List[List[VectorStoreOutput]]:
+        """
+        Exact search for the neighbors of many queries at once; each block
+        of stored vectors is read once for all queries.
+
+        Args:
+            query_vectors (Sequence[Sequence[float]]): A matrix or list of
+                query vectors, quantized like the stored vectors.
+            k (int): Neighbors per query.
+            filter (Optional[Union[str, Dict[str, Any]]]): A dict of required
+                metadata values, or an SQLite condition, see `filter_clause`.
+            output_fields (Optional[List[str]]): Add "vector" to return the
+                stored vectors.
+            search_params (Optional[Dict[str, Any]]): `nprobe` and `rerank`
+                override the index config, `block_size` the store config;
+                `exact` skips the index.
+
+        Returns:
+            List[List[VectorStoreOutput]]: The neighbors of every query,
+                closest first. `score` is the cosine similarity, inner
+                product, squared L2 distance or Hamming distance.
+        """
+        queries = self._queries(query_vectors)
+        if not len(queries):
+            return []
+        search_params = search_params or {}
+        block_size = search_params.get("block_size", self.block_size)
+        with self._lock:
+            # Searches read only the snapshots, never the live segments, so
+            # inserts and deletes that run meanwhile cannot tear a block.
+            segments = [segment.snapshot() for segment in self._segments]
+            use_index = self.index is not None and self.index.trained and not filter and not search_params.get("exact")
+            snapshot = self.index.snapshot() if use_index else None
+        query_norms = np.linalg.norm(queries.astype(np.float32, copy=False), axis=1)
+        if use_index:
+            best_scores, best_ids = self.index.search(
+                queries,
+                query_norms,
+                k,
+                fetch=lambda numbers, positions: self._fetch(segments, numbers, positions),
+                score=self._scores,
+                nprobe=search_params.get("nprobe"),
+                rerank=search_params.get("rerank"),
+                snapshot=snapshot,
+            )
+            return self._search_outputs(best_scores, best_ids, output_fields)
+
+        if filter:
+            candidates = self._filtered_candidates(filter)
+            blocks = self._candidate_blocks(segments, candidates, block_size)
+        else:
+            blocks = self._blocks(segments, block_size)
+
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_ids = np.zeros((len(queries), 0), dtype=np.int64)
+        for vectors, ids, norms, deleted in blocks:
+            scores = self._scores(vectors, norms, queries, query_norms)
+            if deleted is not None:
+                scores[:, deleted] = -np.inf
+            best_scores, best_ids = self._merge(best_scores, best_ids, scores, ids, k)
+
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_ids = np.take_along_axis(best_ids, order, axis=1)
+        return self._search_outputs(best_scores, best_ids, output_fields)
+
+    def _queries(self, query_vectors: Sequence[Sequence[float]]) -> np.ndarray:
+        queries = np.asarray(query_vectors)
+        if queries.size == 0:
+            return np.zeros((0, self.width or 0), dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries.reshape(1, -1)
+        if self.width is not None and queries.shape[1] != self.width:
+            raise ValueError(f"Expected queries of width {self.width}, got {queries.shape[1]}")
+        if self.vector_type == "binary":
+            return queries.astype(np.uint8, copy=False)
+        return queries.astype(np.float32, copy=False)
+
+    def _fetch(self, segments: List[SegmentSnapshot], numbers: np.ndarray, positions: np.ndarray):
+        """
+        Vectors and norms of rows given by segment number and position.
+        """
+        by_number = {segment.number: segment for segment in segments}
+        vectors = np.empty((len(positions), self.width), dtype=VECTOR_DTYPES[self.vector_type])
+        norms = np.empty(len(positions), dtype=np.float32)
+        for number in np.unique(numbers):
+            rows = numbers == number
+            segment = by_number[int(number)]
+            vectors[rows] = segment.vectors[positions[rows]]
+            norms[rows] = segment.norms[positions[rows]]
+        return vectors, norms
+
+    def _blocks(self, segments: List[SegmentSnapshot], block_size: int) -> Iterator[tuple]:
+        for segment in segments:
+            deleted = segment.deleted
+            for start in range(0, segment.rows, block_size):
+                end = min(start + block_size, segment.rows)
+                if deleted is not None and deleted[start:end].all():
+                    continue
+                yield (
+                    segment.vectors[start:end],
+                    np.asarray(segment.ids[start:end]),
+                    segment.norms[start:end],
+                    None if deleted is None or not deleted[start:end].any() else deleted[start:end],
+                )
+
+    def _filtered_candidates(self, filter: Union[str, Dict[str, Any]]) -> Dict[int, np.ndarray]:
+        clause, params = filter_clause(filter)
+        with self._lock:
+            rows = self._conn.execute(f"SELECT segment, position FROM rows WHERE {clause}", params).fetchall()
+        by_segment: Dict[int, List[int]] = {}
+        for number, position in rows:
+            by_segment.setdefault(number, []).append(position)
+        return {number: np.sort(np.array(positions, dtype=np.int64)) for number, positions in by_segment.items()}
+
+    @staticmethod
+    def _candidate_blocks(segments: List[SegmentSnapshot], candidates: Dict[int, np.ndarray], block_size: int) -> Iterator[tuple]:
+        # Deleted rows have no metadata row, so the candidates are all live.
+        for segment in segments:
+            positions = candidates.get(segment.number)
+            if positions is None:
+                continue
+            positions = positions[positions < segment.rows]
+            for start in range(0, len(positions), block_size):
+                part = positions[start:start + block_size]
+                yield segment.vectors[part], np.asarray(segment.ids[part]), segment.norms[part], None
+
+    def _scores(self, vectors: np.ndarray, norms: np.ndarray, queries: np.ndarray, query_norms: np.ndarray) -> np.ndarray:
+        """
+        Scores of a block, higher is closer.
+        """
+        if self.vector_type == "binary":
+            return -hamming(vectors, queries).astype(np.float32)
+        dots = queries @ vectors.astype(np.float32, copy=False).T
+        if self.metric == "cosine":
+            return dots / np.maximum(np.outer(query_norms, norms), 1e-12)
+        if self.metric == "l2":
+            return 2 * dots - np.square(norms)[None, :] - np.square(query_norms)[:, None]
+        return dots
+
+    @staticmethod
+    def _merge(best_scores: np.ndarray, best_ids: np.ndarray, scores: np.ndarray, ids: np.ndarray, k: int):
+        if scores.shape[1] > k:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            scores = np.take_along_axis(scores, top, axis=1)
+            ids = ids[top]
+        else:
+            ids = np.broadcast_to(ids, scores.shape)
+        scores = np.concatenate([best_scores, scores], axis=1)
+        ids = np.concatenate([best_ids, ids], axis=1)
+        if scores.shape[1] > k:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            scores = np.take_along_axis(scores, top, axis=1)
+            ids = np.take_along_axis(ids, top, axis=1)
+        return scores, ids
+
+    def _search_outputs(
+        self, scores: np.ndarray, ids: np.ndarray, output_fields: Optional[List[str]]
+    ) -> List[List[VectorStoreOutput]]:
+        rows = self._rows(sorted({int(id) for id in ids[scores > -np.inf]}))
+        with_vectors = "vector" in (output_fields or [])
+        segments = {segment.number: segment for segment in self._segments}
+
+        results = []
+        for row_scores, row_ids in zip(scores, ids):
+            hits = []
+            for score, id in zip(row_scores, row_ids):
+                row = rows.get(int(id))
+                if score == -np.inf or row is None:
+                    continue
+                number, position, text, metadata = row
+                vector = None
+                if with_vectors and number in segments:
+                    vector = np.array(segments[number].vectors[position])
+                hits.append(
+                    VectorStoreOutput(
+                        text=text,
+                        metadata=json.loads(metadata) if metadata else {},
+                        vector=vector,
+                        id=int(id),
+                        status="success",
+                        score=self._distance(float(score)),
+                    )
+                )
+            results.append(hits)
+        return results
+
+    def _distance(self, score: float) -> float:
+        # Internal scores are negated distances for L2 and Hamming.
+        return -score if self.metric in ("l2", "hamming") else score
+
+    def _rows(self, ids: List[int]) -> Dict[int, tuple]:
+        rows = {}
+        with self._lock:
+            # Stay below SQLite's limit on the number of bound parameters.
+            for start in range(0, len(ids), 500):
+                part = ids[start:start + 500]
+                for row in self._conn.execute(
+                    f"SELECT id, segment, position, text, metadata FROM rows WHERE id IN ({','.join('?' * len(part))})",
+                    part,
+                ):
+                    rows[row[0]] = row[1:]
+        return rows
+
+    def delete(self, ids: List[str], filter: Optional[Union[str, Dict[str, Any]]] = None) -> None:
+        """
+        Delete embeddings by ID, or all embeddings that match a filter, see
+        `search_many`. Deleted rows are tombstoned, and the store compacted
+        once tombstones make up `compact_threshold` of its rows.
+        """
+        if ids and filter:
+            raise ValueError("Delete by IDs or by filter, not both")
+        with self._lock:
+            if filter:
+                clause, params = filter_clause(filter)
+                rows = self._conn.execute(f"SELECT id, segment, position FROM rows WHERE {clause}", params).fetchall()
+            elif ids:
+                ids = [int(id) for id in ids]
+                rows = []
+                for start in range(0, len(ids), 500):
+                    part = ids[start:start + 500]
+                    rows += self._conn.execute(
+                        f"SELECT id, segment, position FROM rows WHERE id IN ({','.join('?' * len(part))})", part
+                    ).fetchall()
+            else:
+                return
+            if not rows:
+                return
+            with self._conn:
+                self._conn.executemany("DELETE FROM rows WHERE id = ?", [(id,) for id, _, _ in rows])
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO tombstones (segment, position) VALUES (?, ?)",
+                    [(number, position) for _, number, position in rows],
+                )
+            by_segment: Dict[int, List[int]] = {}
+            for _, number, position in rows:
+                by_segment.setdefault(number, []).append(position)
+            for segment in self._segments:
+                if segment.number in by_segment:
+                    segment.tombstone(by_segment[segment.number])
+            if self.index is not None and self.index.trained:
+                self.index.remove(np.array([id for id, _, _ in rows], dtype=np.int64))
+
+            total = sum(segment.rows for segment in self._segments)
+            deleted = sum(segment.deleted_count for segment in self._segments)
+            if self.compact_threshold is not None and total and deleted / total >= self.compact_threshold:
+                self.compact()
+
+    def compact(self) -> None:
+        """
+        Rewrite the segments that have tombstones without the deleted rows,
+        into new segments. The new files are written and synced before the
+        metadata switches over to them, so an interrupted compaction leaves
+        the store as it was.
+        """
+        with self._lock:
+            victims = [segment for segment in self._segments if segment.deleted_count]
+            if not victims:
+                return
+            kept = [segment for segment in self._segments if not segment.deleted_count]
+            created: List[Segment] = []
+            moves = []
+            for victim in victims:
+                live = np.flatnonzero(~victim.deleted)
+                for start in range(0, len(live), self.block_size):
+                    part = live[start:start + self.block_size]
+                    while len(part):
+                        if not created or created[-1].rows >= self.segment_size:
+                            created.append(self._new_segment())
+                        target = created[-1]
+                        take = part[:self.segment_size - target.rows]
+                        part = part[len(take):]
+                        offset = target.rows
+                        target.append(victim.vectors[take], victim.ids[take], victim.norms[take], sync=False)
+                        moves.extend(
+                            (target.number, offset + i, int(id)) for i, id in enumerate(victim.ids[take])
+                        )
+            for segment in created:
+                for path in segment.paths.values():
+                    with open(path, "rb+") as f:
+                        os.fsync(f.fileno())
+
+            with self._conn:
+                self._conn.executemany("UPDATE rows SET segment = ?, position = ? WHERE id = ?", moves)
+                self._conn.executemany("DELETE FROM segments WHERE number = ?", [(s.number,) for s in victims])
+                self._conn.executemany("DELETE FROM tombstones WHERE segment = ?", [(s.number,) for s in victims])
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO segments (number, rows) VALUES (?, ?)",
+                    [(segment.number, segment.rows) for segment in created],
+                )
+                self._save_settings()
+            # Searches still holding the old segments keep their mappings
+            # until they finish.
+            self._segments = sorted(kept + created, key=lambda segment: segment.number)
+            if self.index is not None and self.index.trained:
+                self.index.compact(self._segments)
+            for victim in victims:
+                victim.remove_files()
+            self.logger.info(
+                f"Compacted {len(victims)} segments of {self.path}, removed "
+                f"{sum(victim.deleted_count for victim in victims)} deleted rows"
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    @classmethod
+    def from_config(cls, config: dict) -> "LocalVectorStore":
+        return cls(config)
@@ -1,13 +1,118 @@
+import json
+import random
+import threading
+import time
 import uuid
-from typing import Any, Dict, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
 
-from pymilvus import MilvusClient
+import numpy as np
 
-from ..embedders import EmbeddingOutput
+import grpc
+from pymilvus import DataType, MilvusClient
+from pymilvus.exceptions import (
+    ConnectError,
+    DataNotMatchException,
+    DataTypeNotMatchException,
+    ErrorCode,
+    MilvusException,
+    MilvusUnavailableException,
+    ParamError,
+)
+
+from ..embedders import EmbeddingBatch
+from ..logger import RAGnarokLogger
 from .base import BaseVectorStore, VectorStoreOutput
 
 
+# Field type, default index, metric and index parameters of each vector
+# type, see EmbeddingQuantizer.
+VECTOR_SCHEMAS = {
+    "float": (DataType.FLOAT_VECTOR, "AUTOINDEX", "COSINE", {}),
+    "int8": (DataType.INT8_VECTOR, "HNSW", "COSINE", {"M": 16, "efConstruction": 200}),
+    "binary": (DataType.BINARY_VECTOR, "BIN_IVF_FLAT", "HAMMING", {"nlist": 1024}),
+}
+
+# Fields returned by search in addition to those asked for.
+DEFAULT_OUTPUT_FIELDS = ["text", "metadata"]
+
+# Errors in the request itself, which fail again when retried.
+NON_RETRYABLE_ERRORS = (DataNotMatchException, DataTypeNotMatchException, ParamError)
+
+# Dynamic field with a client-generated key of every row, by which rows of
+# a write that may have been committed are deleted before it is retried.
+WRITE_KEY_FIELD = "write_key"
+
+
+def is_unwritten(error: Exception) -> bool:
+    """
+    Whether an error shows that a write did not happen: the server could
+    not be reached, was unavailable or rate limited the request. Other
+    errors, timeouts in particular, may come after the rows were committed.
+    """
+    if isinstance(error, (ConnectError, MilvusUnavailableException, ConnectionRefusedError)):
+        return True
+    if isinstance(error, MilvusException):
+        return error.code in (ErrorCode.RATE_LIMIT, ErrorCode.FORCE_DENY)
+    if isinstance(error, grpc.RpcError):
+        return error.code() == grpc.StatusCode.UNAVAILABLE
+    return False
+
+
+def filter_expression(filter: Optional[Union[str, Dict[str, Any]]]) -> str:
+    """
+    Turn a dict of required metadata values into a Milvus boolean
+    expression. A value that is a list matches any of its items. Strings are
+    returned unchanged.
+
+    Example:
+        {"source": "a.pdf", "page": [1, 2]} becomes
+        'metadata["source"] == "a.pdf" and metadata["page"] in [1, 2]'
+    """
+    if not filter:
+        return ""
+    if isinstance(filter, str):
+        return filter
+    clauses = []
+    for key, value in filter.items():
+        field = f"metadata[{json.dumps(key)}]"
+        if isinstance(value, (list, tuple, set)):
+            clauses.append(f"{field} in {json.dumps(list(value))}")
+        else:
+            clauses.append(f"{field} == {json.dumps(value)}")
+    return " and ".join(clauses)
+
+
 class MilvusVectorStore(BaseVectorStore):
+    """
+    Stores embeddings in a Milvus collection.
+
+    The collection is created on the first insert if it does not exist, with
+    a vector field that matches the inserted batch: float32, int8 or binary,
+    and its dimension. The index and metric default to those in
+    `VECTOR_SCHEMAS`.
+
+    Config keys:
+        credentials (dict): Connection settings, see below.
+        collection_name (str): Defaults to "demo_collection".
+        dimension (int): Vector dimension, for `initialize_collection`.
+        vector_type (str): "float" (default), "int8" or "binary", for
+            `initialize_collection`.
+        index_type (str), metric_type (str), index_params (dict): Override
+            the defaults of the vector type.
+        batch_size (int): Rows per insert request. Defaults to 1000.
+        max_batch_bytes (int): Upper bound of the vector bytes of a request,
+            below Milvus' 64 MB message limit. Defaults to 32 MB.
+        insert_workers (int): Insert requests in flight. Defaults to 1.
+        max_retries (int): Retries of a failed request. Defaults to 3.
+        retry_backoff (float): Base delay of the exponential backoff between
+            retries, in seconds. Defaults to 0.5.
+        search_params (dict): Default search parameters, e.g. {"ef": 64}
+            for HNSW or {"nprobe": 16} for IVF indexes.
+        search_batch_size (int): Queries per search request. Defaults to
+            1024.
+    """
+
     def __init__(self, config: dict):
         self.config = config
         self.credentials = config.get("credentials", {})
@@ -58,78 +163,297 @@ class MilvusVectorStore(BaseVectorStore):
             self.client = MilvusClient(file_path)
 
         self.collection_name = config.get("collection_name", "demo_collection")
+        self.vector_type = config.get("vector_type", "float")
+        self.batch_size = config.get("batch_size", 1000)
+        self.max_batch_bytes = config.get("max_batch_bytes", 32 * 1024 * 1024)
+        self.insert_workers = config.get("insert_workers", 1)
+        self.max_retries = config.get("max_retries", 3)
+        self.retry_backoff = config.get("retry_backoff", 0.5)
+        self.search_params = config.get("search_params", {})
+        self.search_batch_size = config.get("search_batch_size", 1024)
+        self.logger = RAGnarokLogger.get_logger()
+        self._collection_ready = False
+        self._collection_lock = threading.Lock()
+        self.retries = 0
+        self._retries_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def initialize_collection(
+        self, drop_existing: bool = True, dimension: Optional[int] = None, vector_type: Optional[str] = None
+    ):
+        """
+        Create the collection.
 
-    def initialize_collection(self):
+        Args:
+            drop_existing (bool): Drop an existing collection first. If
+                False, an existing collection is kept as it is.
+            dimension (Optional[int]): Vector dimension, in bits for binary
+                vectors. Defaults to the `dimension` config key.
+            vector_type (Optional[str]): "float", "int8" or "binary".
+                Defaults to the `vector_type` config key.
+        """
         if self.client.has_collection(collection_name=self.collection_name):
+            if not drop_existing:
+                self._collection_ready = True
+                return
             self.client.drop_collection(collection_name=self.collection_name)
 
+        dimension = dimension or self.config.get("dimension")
+        if dimension is None:
+            raise ValueError("The vector dimension is unknown, set `dimension` in the vector store config")
+        vector_type = vector_type or self.vector_type
+        if vector_type not in VECTOR_SCHEMAS:
+            raise ValueError(f"Unknown vector type: {vector_type}")
+        field_type, index_type, metric_type, index_params = VECTOR_SCHEMAS[vector_type]
+
+        schema = self.client.create_schema(auto_id=True, enable_dynamic_field=True)
+        schema.add_field(field_name="id", datatype=DataType.INT64, is_primary=True)
+        schema.add_field(field_name="vector", datatype=field_type, dim=dimension)
+        index = self.client.prepare_index_params()
+        index.add_index(
+            field_name="vector",
+            index_type=self.config.get("index_type", index_type),
+            metric_type=self.config.get("metric_type", metric_type),
+            params=self.config.get("index_params", index_params),
+        )
         self.client.create_collection(
-            collection_name=self.collection_name,
-            dimension=self.config.get("dimension", 768),
+            collection_name=self.collection_name, schema=schema, index_params=index
         )
+        self.vector_type = vector_type
+        self._collection_ready = True
+
+    def _ensure_collection(self, embeddings: EmbeddingBatch) -> None:
+        if self._collection_ready:
+            return
+        # Concurrent inserts must not both try to create the collection.
+        with self._collection_lock:
+            if not self._collection_ready:
+                self.initialize_collection(
+                    drop_existing=False, dimension=embeddings.dimension, vector_type=embeddings.vector_type
+                )
+
+    @staticmethod
+    def _vector_value(vector: np.ndarray, vector_type: str):
+        # pymilvus takes binary vectors as bytes, the others as arrays.
+        if vector_type == "binary":
+            return vector.tobytes()
+        return vector
 
-    def insert(self, embeddings: List[EmbeddingOutput] = None) -> List[VectorStoreOutput]:
-        result = []
+    def insert(self, embeddings: EmbeddingBatch = None) -> List[VectorStoreOutput]:
+        """
+        Insert embeddings in batches of up to `batch_size` rows, with up to
+        `insert_workers` batches in flight. Each batch succeeds or fails as
+        a whole; failed batches are retried up to `max_retries` times and
+        the other batches are not affected. Unless the error shows that the
+        batch was not written, its rows are deleted by their write key
+        before the retry, so a retried batch is never stored twice.
+
+        Returns:
+            List[VectorStoreOutput]: The result of every row, in input order.
+        """
+        embeddings = EmbeddingBatch.from_outputs(embeddings or [])
+        if not len(embeddings):
+            return []
         try:
-            for embedding in embeddings:
-                res = self.client.insert(
-                    collection_name=self.collection_name,
-                    data=[
-                        {
-                            "vector": embedding.vector,
-                            "metadata": embedding.metadata,
-                        }
-                    ],
+            self._ensure_collection(embeddings)
+        except Exception as e:
+            self.logger.error(f"Failed to create Milvus collection {self.collection_name}: {e}")
+            return self._outputs(embeddings, None, str(e))
+        return self._write(self.client.insert, embeddings)
+
+    def _write(self, operation: Callable[..., Dict[str, Any]], embeddings: EmbeddingBatch) -> List[VectorStoreOutput]:
+        # Slices share the batch's matrix, so batching copies nothing.
+        row_bytes = max(1, embeddings.vectors.itemsize * embeddings.vectors.shape[1])
+        size = max(1, min(self.batch_size, self.max_batch_bytes // row_bytes))
+        batches = [embeddings[start:start + size] for start in range(0, len(embeddings), size)]
+
+        if self.insert_workers > 1 and len(batches) > 1:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.insert_workers, thread_name_prefix="ragnarok-milvus"
                 )
+            results = self._executor.map(lambda batch: self._write_batch(operation, batch), batches)
+        else:
+            results = (self._write_batch(operation, batch) for batch in batches)
+        return [output for outputs in results for output in outputs]
 
-                if res["status"]["code"] != 0:
-                    result.append(
-                        VectorStoreOutput(
-                            text=embedding.text,
-                            metadata=embedding.metadata,
-                            vector=embedding.vector,
-                            id=embedding.metadata.get("id", str(uuid.uuid4())),
-                            status="error",
-                            error=res["status"]["message"],
-                        )
+    def _write_batch(self, operation: Callable[..., Dict[str, Any]], batch: EmbeddingBatch) -> List[VectorStoreOutput]:
+        vector_type = batch.vector_type
+        # The text goes to a dynamic field, so it comes back with search
+        # results.
+        keys = [uuid.uuid4().hex for _ in range(len(batch))]
+        data = [
+            {"vector": self._vector_value(vector, vector_type), "text": text, "metadata": metadata, WRITE_KEY_FIELD: key}
+            for vector, text, metadata, key in zip(batch.vectors, batch.texts, batch.metadata, keys)
+        ]
+        # Whether an earlier attempt may have stored the rows; the primary
+        # key is generated by Milvus, so they are deleted by their write key
+        # first rather than stored twice.
+        maybe_written = False
+        for attempt in range(self.max_retries + 1):
+            try:
+                if maybe_written:
+                    self.client.delete(
+                        collection_name=self.collection_name, filter=f"{WRITE_KEY_FIELD} in {json.dumps(keys)}"
                     )
-                    continue
-                elif len(res["ids"]) == 0:
-                    result.append(
-                        VectorStoreOutput(
-                            text=embedding.text,
-                            metadata=embedding.metadata,
-                            vector=embedding.vector,
-                            id=embedding.metadata.get("id", str(uuid.uuid4())),
-                            status="error",
-                            error="No ID returned by Milvus",
-                        )
-                    )
-                    continue
-                else:
-                    id = res["ids"][0]
-                    result.append(
-                        VectorStoreOutput(
-                            text=embedding.text,
-                            metadata=embedding.metadata,
-                            vector=embedding.vector,
-                            id=id,
-                            status="success",
-                        )
+                res = operation(collection_name=self.collection_name, data=data)
+                break
+            except NON_RETRYABLE_ERRORS as e:
+                self.logger.error(f"Milvus rejected a batch of {len(batch)} rows: {e}")
+                return self._outputs(batch, None, str(e))
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self.logger.error(f"Failed to write a batch of {len(batch)} rows to Milvus: {e}")
+                    return self._outputs(batch, None, str(e))
+                maybe_written = maybe_written or not is_unwritten(e)
+                delay = random.uniform(0, self.retry_backoff * 2 ** attempt)
+                self.logger.warning(f"Milvus write failed, retrying in {delay:.2f}s: {e}")
+                with self._retries_lock:
+                    self.retries += 1
+                time.sleep(delay)
+        return self._outputs(batch, list(res.get("ids") or []), "No ID returned by Milvus")
+
+    @staticmethod
+    def _outputs(batch: EmbeddingBatch, ids: Optional[List[Any]], error: str) -> List[VectorStoreOutput]:
+        """
+        Map a batch response to one output per row: rows with an ID
+        succeeded, the others failed with `error`.
+        """
+        ids = ids or []
+        outputs = []
+        for index, (vector, text, metadata) in enumerate(zip(batch.vectors, batch.texts, batch.metadata)):
+            if index < len(ids):
+                outputs.append(
+                    VectorStoreOutput(text=text, metadata=metadata, vector=vector, id=ids[index], status="success")
+                )
+            else:
+                outputs.append(
+                    VectorStoreOutput(
+                        text=text,
+                        metadata=metadata,
+                        vector=vector,
+                        id=(metadata or {}).get("id", str(uuid.uuid4())),
+                        status="error",
+                        error=error,
                     )
-        except Exception as e:
-            return [
-                VectorStoreOutput(
-                    text=embedding.text,
-                    metadata=embedding.metadata,
-                    vector=embedding.vector,
-                    id=embedding.metadata.get("id", str(uuid.uuid4())),
-                    status="error",
-                    error=str(e),
                 )
-                for embedding in embeddings
-            ]
-        return result
+        return outputs
+
+    def search(
+        self,
+        query_vector: Sequence[float],
+        k: int = 5,
+        filter: Optional[Union[str, Dict[str, Any]]] = None,
+        output_fields: Optional[List[str]] = None,
+        search_params: Optional[Dict[str, Any]] = None,
+    ) -> List[VectorStoreOutput]:
+        return self.search_many([query_vector], k, filter, output_fields, search_params)[0]
+
+    def search_many(
+        self,
+        query_vectors: Sequence[Sequence[float]],
+        k: int = 5,
+        filter: Optional[Union[str, Dict[str, Any]]] = None,
+        output_fields: Optional[List[str]] = None,
+        search_params: Optional[Dict[str, Any]] = None,
+    ) -> List[List[VectorStoreOutput]]:
+        """
+        Search for the neighbors of many queries with one request per
+        `search_batch_size` queries.
+
+        Args:
+            query_vectors (Sequence[Sequence[float]]): A matrix or list of
+                query vectors, quantized like the stored vectors.
+            k (int): Neighbors per query.
+            filter (Optional[Union[str, Dict[str, Any]]]): A Milvus boolean
+                expression such as `metadata["source"] == "a.pdf"`, or a dict
+                of required metadata values, see `filter_expression`.
+            output_fields (Optional[List[str]]): Fields to return besides
+                `text` and `metadata`, e.g. "vector" or dynamic fields. Fields other than
+                `text` and `vector` are added to the metadata of the results.
+            search_params (Optional[Dict[str, Any]]): Index parameters such as
+                {"nprobe": 16} or {"ef": 64}, merged over the `search_params`
+                config key. A dict with a "params" key is passed on as is.
+
+        Returns:
+            List[List[VectorStoreOutput]]: The neighbors of every query, closest
+                first. `score` is the distance or similarity of the metric.
+        """
+        queries = self._query_data(query_vectors)
+        if not queries:
+            return []
+        fields = DEFAULT_OUTPUT_FIELDS + [field for field in output_fields or [] if field not in DEFAULT_OUTPUT_FIELDS]
+        params = search_params or {}
+        if "params" not in params:
+            params = {"params": {**self.search_params, **params}}
+
+        results = []
+        for start in range(0, len(queries), self.search_batch_size):
+            hits_per_query = self.client.search(
+                collection_name=self.collection_name,
+                data=queries[start:start + self.search_batch_size],
+                filter=filter_expression(filter),
+                limit=k,
+                output_fields=fields,
+                search_params=params,
+            )
+            results.extend([self._search_output(hit) for hit in hits] for hits in hits_per_query)
+        return results
+
+    @staticmethod
+    def _query_data(query_vectors: Sequence[Sequence[float]]) -> list:
+        vectors = np.asarray(query_vectors)
+        if vectors.size == 0:
+            return []
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+        if vectors.dtype == np.uint8:
+            return [vector.tobytes() for vector in vectors]
+        if vectors.dtype != np.int8:
+            vectors = vectors.astype(np.float32, copy=False)
+        return list(vectors)
+
+    @staticmethod
+    def _search_output(hit: Dict[str, Any]) -> VectorStoreOutput:
+        entity = dict(hit.get("entity") or {})
+        metadata = entity.pop("metadata", None)
+        metadata = dict(metadata) if metadata is not None else {}
+        text = entity.pop("text", None)
+        vector = entity.pop("vector", None)
+        # Dynamic fields asked for in output_fields.
+        entity.pop("id", None)
+        metadata.update(entity)
+        return VectorStoreOutput(
+            text=text,
+            metadata=metadata,
+            vector=vector,
+            id=hit.get("id"),
+            status="success",
+            score=hit.get("distance"),
+        )
+
+    def delete(self, ids: List[str], filter: Optional[Union[str, Dict[str, Any]]] = None) -> None:
+        """
+        Delete embeddings by ID, or all embeddings that match a filter, see
+        `search_many`.
+        """
+        if ids and filter:
+            raise ValueError("Delete by IDs or by filter, not both")
+        if filter:
+            self.client.delete(collection_name=self.collection_name, filter=filter_expression(filter))
+            return
+        if not ids:
+            return
+        # IDs round-trip through the ingest state as strings; the default
+        # primary key is INT64.
+        ids = [int(id) if isinstance(id, str) and id.isdigit() else id for id in ids]
+        self.client.delete(collection_name=self.collection_name, ids=ids)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        self.client.close()
 
     @classmethod
     def from_config(cls, config: dict) -> "MilvusVectorStore":
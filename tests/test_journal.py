@@ -0,0 +1,183 @@
+import glob
+import json
+import os
+
+import numpy as np
+import pytest
+
+from ragnarok.embedders import EmbeddingBatch
+from ragnarok.journal import WriteAheadJournal, read_records
+from ragnarok.vectorstores.base import VectorStoreOutput
+from ragnarok.vectorstores.local_store import LocalVectorStore
+
+
+def make_batch(texts):
+    vectors = np.random.default_rng(len(texts)).normal(size=(len(texts), 8)).astype(np.float32)
+    return EmbeddingBatch(vectors, list(texts), [{"n": i} for i in range(len(texts))])
+
+
+class FlakyStore:
+    """
+    Writer for WriteAheadJournal.start over a LocalVectorStore that deletes
+    rewritten rows by their journal key, like RAGnarok does. `down` makes
+    every write fail, `commit_then_fail` stores a batch and then fails, and
+    texts in `rejected` are refused row by row.
+    """
+
+    def __init__(self, path):
+        self.store = LocalVectorStore({"path": path, "sync": False, "compact_threshold": None})
+        self.down = False
+        self.commit_then_fail = 0
+        self.rejected = set()
+        self.calls = 0
+
+    def write(self, batch, rewrite):
+        self.calls += 1
+        if self.down:
+            raise ConnectionError("vector store unavailable")
+        if rewrite:
+            self.store.delete([], filter={"journal_key": [meta["journal_key"] for meta in batch.metadata]})
+        accepted = [i for i, text in enumerate(batch.texts) if text not in self.rejected]
+        rows = EmbeddingBatch(
+            batch.vectors[accepted], [batch.texts[i] for i in accepted], [batch.metadata[i] for i in accepted]
+        )
+        ids = iter(self.store.insert(rows))
+        if self.commit_then_fail:
+            self.commit_then_fail -= 1
+            raise TimeoutError("timed out after commit")
+        return [
+            next(ids) if i in accepted
+            else VectorStoreOutput(text=text, metadata=meta, vector=None, id=None, status="error", error="rejected")
+            for i, (text, meta) in enumerate(zip(batch.texts, batch.metadata))
+        ]
+
+    def texts(self):
+        rows = self.store._conn.execute("SELECT text FROM rows").fetchall()
+        return sorted(text for (text,) in rows)
+
+
+@pytest.fixture
+def config(tmp_path):
+    return {
+        "path": str(tmp_path / "journal"),
+        "flush_interval": 0.01,
+        "retry_backoff": 0.01,
+        "max_retry_backoff": 0.02,
+        "sync": False,
+    }
+
+
+def test_append_writes_rows_once(tmp_path, config):
+    store = FlakyStore(str(tmp_path / "store"))
+    journal = WriteAheadJournal(config)
+    journal.start(store.write)
+    results = journal.append(make_batch(["a", "b", "c"]))
+    assert [result.status for result in results] == ["queued"] * 3
+    assert journal.flush(timeout=10)
+    journal.close()
+    assert store.texts() == ["a", "b", "c"]
+    # Acknowledged journal files are removed once they are no longer open.
+    assert len(WriteAheadJournal(config)) == 0
+    assert not glob.glob(os.path.join(config["path"], "*.wal"))
+
+
+def test_replay_after_close_with_store_down(tmp_path, config):
+    store = FlakyStore(str(tmp_path / "store"))
+    store.down = True
+    journal = WriteAheadJournal(config)
+    journal.start(store.write)
+    journal.append(make_batch(["a", "b"]))
+    journal.append(make_batch(["c"]))
+    journal.close(timeout=0.2)
+    assert store.calls > 0
+    assert store.texts() == []
+
+    store.down = False
+    journal = WriteAheadJournal(config)
+    assert len(journal) == 3
+    journal.start(store.write)
+    assert journal.flush(timeout=10)
+    journal.close()
+    assert store.texts() == ["a", "b", "c"]
+    assert len(WriteAheadJournal(config)) == 0
+
+
+def test_replay_is_idempotent_after_committed_failure(tmp_path, config):
+    store = FlakyStore(str(tmp_path / "store"))
+    store.commit_then_fail = 1
+    journal = WriteAheadJournal(config)
+    journal.start(store.write)
+    journal.append(make_batch(["a", "b"]))
+    assert journal.flush(timeout=10)
+    journal.close()
+    # The first attempt was stored before it failed; the retry replaced it.
+    assert store.texts() == ["a", "b"]
+    assert journal.retries == 1
+
+
+def test_unacknowledged_rows_are_replayed_without_duplicates(tmp_path, config):
+    store = FlakyStore(str(tmp_path / "store"))
+    journal = WriteAheadJournal(config)
+    journal.append(make_batch(["a", "b"]))
+    journal.close()
+    # A crash after the rows reached the store but before they were
+    # acknowledged: the replay must not store them twice.
+    store.write(journal._pending[0][1], False)
+
+    journal = WriteAheadJournal(config)
+    journal.start(store.write)
+    assert journal.flush(timeout=10)
+    journal.close()
+    assert store.texts() == ["a", "b"]
+
+
+def test_torn_record_is_truncated(tmp_path, config):
+    journal = WriteAheadJournal(config)
+    journal.append(make_batch(["a", "b"]))
+    journal.append(make_batch(["c"]))
+    journal.close()
+    (path,) = glob.glob(os.path.join(config["path"], "*.wal"))
+    size = os.path.getsize(path)
+    os.truncate(path, size - 5)
+
+    journal = WriteAheadJournal(config)
+    records, intact = read_records(path)
+    assert os.path.getsize(path) == intact < size - 5
+    assert [batch.texts for _, batch in records] == [["a", "b"]]
+    assert len(journal) == 2
+
+    # Appends after the truncation continue the sequence and survive a
+    # restart.
+    journal.append(make_batch(["d"]))
+    journal.close()
+    store = FlakyStore(str(tmp_path / "store"))
+    journal = WriteAheadJournal(config)
+    journal.start(store.write)
+    assert journal.flush(timeout=10)
+    journal.close()
+    assert store.texts() == ["a", "b", "d"]
+    keys = [json.loads(metadata)["journal_key"] for (metadata,) in store.store._conn.execute("SELECT metadata FROM rows")]
+    assert len(set(keys)) == 3
+
+
+def test_partially_rejected_rows_are_dropped(tmp_path, config):
+    store = FlakyStore(str(tmp_path / "store"))
+    store.rejected = {"bad"}
+    journal = WriteAheadJournal(dict(config, max_retries=2))
+    journal.start(store.write)
+    journal.append(make_batch(["a", "bad", "c"]))
+    assert journal.flush(timeout=10)
+    journal.close()
+    assert store.texts() == ["a", "c"]
+    assert journal.stats()["dropped_rows"] == 1
+    # The first attempt and two retries of the rejected row.
+    assert store.calls == 3
+    # Dropped rows are acknowledged, not replayed.
+    assert len(WriteAheadJournal(config)) == 0
+
+
+def test_append_after_close_raises(config):
+    journal = WriteAheadJournal(config)
+    journal.close()
+    with pytest.raises(RuntimeError):
+        journal.append(make_batch(["a"]))